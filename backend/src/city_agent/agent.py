@@ -22,11 +22,15 @@ from city_agent.agent_tools.spreadsheet_analysis_tools import (
     filter_values_in_range_impl,
     get_sum_in_column_impl,
     get_sum_of_filtered_values_impl,
+    aggregate_impl,
+    group_aggregate_impl,
     purge_cached_files,
 )
 from city_agent.agent_tools.pdf_analysis_tools import (
     get_pdf_info_impl,
     extract_pdf_tables_impl,
+    extract_pdf_table_pages_impl,
+    search_pdf_impl,
 )
 from city_agent.error_codes import ErrorCode
 
@@ -189,6 +193,39 @@ async def get_sum_of_filtered_values(
     )
 
 
+async def aggregate(
+    filename: str, columns: list, stats: list, sheet_name: str = ""
+) -> str:
+    return await _run_tool(
+        "aggregate",
+        aggregate_impl,
+        filename,
+        columns,
+        stats,
+        sheet_name,
+    )
+
+
+async def group_aggregate(
+    filename: str,
+    group_by: str,
+    value_column: str,
+    stat: str = "sum",
+    top_n: int = 20,
+    sheet_name: str = "",
+) -> str:
+    return await _run_tool(
+        "group_aggregate",
+        group_aggregate_impl,
+        filename,
+        group_by,
+        value_column,
+        stat,
+        top_n,
+        sheet_name,
+    )
+
+
 async def filter_values_in_range(
     filename: str,
     column_name: str,
@@ -220,6 +257,20 @@ async def extract_pdf_tables(filename: str, page_num: int) -> str:
     )
 
 
+async def extract_pdf_table_pages(filename: str, pages: str, stitch: bool = True) -> str:
+    return await _run_tool(
+        "extract_pdf_table_pages",
+        extract_pdf_table_pages_impl,
+        filename,
+        pages,
+        stitch,
+    )
+
+
+async def search_pdf(filename: str, query: str, max_results: int = 10) -> str:
+    return await _run_tool("search_pdf", search_pdf_impl, filename, query, max_results)
+
+
 async def search_data(query: str) -> str:
     """
     Offload the (potentially) blocking retriever call to a thread so the
@@ -417,6 +468,8 @@ data_analyst = LlmAgent(
     * Anticipate acronyms. If searching for "Condition", the data might say "Cond". If searching for "Pavement Quality", it might say "PQI". Use `get_unique_values` to verify how the data is actually formatted before applying a filter.
 
     4. Smart Filtering & Tool Selection:
+    * If you need more than one statistic or more than one column -> use a single aggregate call instead of separate get_mean/get_min_in_column/get_max_in_column/get_sum_in_column calls.
+    * If the question asks for a breakdown per category (e.g. "cost per ward") -> use one group_aggregate call instead of one filtered sum per keyword.
     * If no filtering condition is present -> use get_sum_in_column.
     * If a filtering condition is present -> use get_sum_of_filtered_values WITH filter_column explicitly defined.
     * Do not use the legacy all-column fallback unless absolutely necessary.
@@ -424,7 +477,7 @@ data_analyst = LlmAgent(
     5. Tool Constraints:
     * NO REGEX. The 'keyword' argument is a simple string.
     * All tools are case-insensitive.
-    * You may only use spreadsheet tools on files ending in .csv or .xlsx.
+    * You may only use spreadsheet tools on files ending in .csv or .xlsx, or on a PDF table with sheet_name set to the "page_N_table_K" name extract_pdf_tables returned for it.
     * You may only use PDF tools on files ending in .pdf.
 
     TOOL REFERENCE (SPREADSHEETS ONLY):
@@ -434,14 +487,18 @@ data_analyst = LlmAgent(
     * count_values(filename, column_name, sheet_name=""): Frequency of values in a column.
     * get_min_in_column(filename, column_name, sheet_name="") / get_max_in_column(filename, column_name, sheet_name=""): Finds numeric extremes.
     * get_sum_in_column(filename, column_name, sheet_name=""): Sums all values in a numeric column.
+    * group_aggregate(filename, group_by, value_column, stat="sum", top_n=20, sheet_name=""): Aggregates value_column per distinct value of group_by with one of count, sum, mean, min, max or median. Returns groups sorted largest first; top_n=0 returns all groups.
+    * aggregate(filename, columns, stats, sheet_name=""): 'columns' and 'stats' MUST be lists. Computes any mix of count, sum, mean, min, max, median and percentiles (p25, p90, ...) for every listed column in one call.
     * filter_values(filename, columns, keyword, sheet_name=""): 'columns' MUST be a list.
     * filter_values_in_range(filename, column_name, min_value, max_value, sheet_name=""): Requires numeric floats.
     * get_sum_of_filtered_values(filename, column_name, keyword, filter_column="", sheet_name=""): Sums values in column_name after filtering by keyword.
-    * sheet_name guidance: for .xlsx files, set sheet_name to target a specific sheet; for .csv files, sheet_name is ignored.
+    * sheet_name guidance: for .xlsx files, set sheet_name to target a specific sheet; for .csv files, sheet_name is ignored; for .pdf files, sheet_name is required and names one table (e.g. "page_12_table_1").
 
     TOOL REFERENCE (PDF):
     * get_pdf_info(filename): Returns page_count and pages_with_tables. Use this BEFORE picking a page for table extraction.
-    * extract_pdf_tables(filename, page_num): Extracts table rows from a specific 1-indexed page.
+    * search_pdf(filename, query, max_results=10): Returns the pages whose text contains every word of query, with snippets, best matches first. Use this to find which page mentions a figure, asset or section before extracting tables.
+    * extract_pdf_tables(filename, page_num): Extracts table rows from a specific 1-indexed page. Each table has a sheet_name; pass it with the PDF filename to aggregate, group_aggregate or other spreadsheet tools instead of adding up rows yourself.
+    * extract_pdf_table_pages(filename, pages, stitch=True): Extracts tables from several pages in one call; 'pages' is a string like "12-14, 16". With stitch=True a table continuing onto the next page under the same header is returned once with all its rows. Use this instead of repeated extract_pdf_tables calls when a table spans pages.
 
     TOOL REFERENCE (DISCOVERY):
     * list_all_documents(bucket="documents"): Returns every indexed document path and last_updated metadata from Supabase.
@@ -469,8 +526,12 @@ data_analyst = LlmAgent(
         filter_values_in_range,
         get_sum_in_column,
         get_sum_of_filtered_values,
+        aggregate,
+        group_aggregate,
         get_pdf_info,
         extract_pdf_tables,
+        extract_pdf_table_pages,
+        search_pdf,
         list_all_documents,
     ],
 )
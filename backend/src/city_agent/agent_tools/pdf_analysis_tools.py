@@ -1,43 +1,19 @@
 import json
 import os
-from typing import Any, Optional, Tuple
-
-import pymupdf4llm
-
-# PyMuPDF is sometimes referred to as fitz so add a compatibility import
-try:
-	import pymupdf as fitz
-except Exception:
-	import fitz
+from typing import Any, Optional, Tuple, Union
 
+from src.pdf_table_index import extract_tables_on_pages
+from src.pdf_text_index import search_text_index, tokenize
 from src.supabase_interface import download_supabase_file
 from city_agent.error_codes import ErrorCode
+from city_agent.agent_tools.pdf_cache import (
+	get_pdf_table_index,
+	get_pdf_text_index,
+	open_pdf_document,
+)
 
-
-_PDF_CACHE: dict[str, dict[str, Any]] = {}
-_PDF_CACHE_MAX_ENTRIES = 4
-
-
-def _get_cached_pdf_entry(filename: str) -> Optional[dict[str, Any]]:
-	entry = _PDF_CACHE.get(filename)
-	if not entry:
-		return None
-	local_path = entry.get("local_path")
-	if not local_path or not os.path.exists(local_path):
-		_PDF_CACHE.pop(filename, None)
-		return None
-	return entry
-
-
-def _store_pdf_cache_entry(filename: str, local_path: str, parsed_pages: Any) -> None:
-	_PDF_CACHE[filename] = {
-		"local_path": local_path,
-		"parsed_pages": parsed_pages,
-	}
-	# Keep cache bounded to prevent unbounded memory growth.
-	while len(_PDF_CACHE) > _PDF_CACHE_MAX_ENTRIES:
-		oldest_key = next(iter(_PDF_CACHE))
-		_PDF_CACHE.pop(oldest_key, None)
+# Upper bound on pages one extract_pdf_table_pages call may read.
+PDF_MAX_PAGES_PER_CALL = max(1, int(os.getenv("PDF_MAX_PAGES_PER_CALL", "20")))
 
 
 def _normalize_for_json(value: Any) -> Any:
@@ -81,207 +57,299 @@ def _tool_error(
 	return json.dumps(_normalize_for_json(payload), ensure_ascii=True)
 
 
-def _get_pdf(filename: str) -> Tuple[Optional[dict], Optional[str]]:
-	"""Download and open a PDF with local parsers.
+def _get_pdf(filename: str, tool_name: str = "pdf") -> Tuple[Optional[dict], Optional[str]]:
+	"""Validate a PDF filename and locate its cached download.
 
 	Returns a dict that includes:
+	  - filename, version: the key of the file's entry in the PDF artifact cache
 	  - path: local file path
-	  - document: PyMuPDF document object for page-level parsing
-	  - parsed_pages: pymupdf4llm page chunks for lightweight inspection
+	Parsed artifacts (document handle, page markdown, table index) are built lazily by pdf_cache.
 	"""
 	if not filename.lower().endswith(".pdf"):
 		return None, _tool_error(
 			f"Unsupported file type for file '{filename}'. Only .pdf files are supported.",
-			tool_name="pdf",
+			tool_name=tool_name,
 			code=ErrorCode.UNSUPPORTED_FILE_TYPE.value,
 		)
 
 	try:
-		cached_entry = _get_cached_pdf_entry(filename)
-		if cached_entry:
-			local_path = cached_entry["local_path"]
-			parsed_pages = cached_entry.get("parsed_pages")
-		else:
-			db_file_info = download_supabase_file(filename, "documents")
-			local_path = db_file_info[0]
-
-			if not local_path.lower().endswith(".pdf"):
-				return None, _tool_error(
-					f"Downloaded file '{filename}' is not a supported PDF type.",
-					tool_name="pdf",
-					code=ErrorCode.UNSUPPORTED_DOWNLOADED_TYPE.value,
-				)
-
-			parsed_pages = pymupdf4llm.to_markdown(local_path, page_chunks=True)
-			_store_pdf_cache_entry(filename, local_path, parsed_pages)
-
-		document = fitz.open(local_path)
-		return {
-			"path": local_path,
-			"document": document,
-			"parsed_pages": parsed_pages,
-			"cache_key": filename,
-		}, None
+		local_path, _, _, last_updated = download_supabase_file(filename, "documents")
 	except FileNotFoundError:
 		return None, _tool_error(
 			f"File not found: {filename}. Retry with an exact filename from search_data results.",
-			tool_name="pdf",
+			tool_name=tool_name,
 			code=ErrorCode.FILE_NOT_FOUND.value,
 		)
 	except Exception as e:
 		return None, _tool_error(
 			f"Error reading file '{filename}': {str(e)}. Retry once; if it persists, try another file.",
-			tool_name="pdf",
+			tool_name=tool_name,
 			code=ErrorCode.READ_FAILURE.value,
 		)
 
+	if not local_path.lower().endswith(".pdf"):
+		return None, _tool_error(
+			f"Downloaded file '{filename}' is not a supported PDF type.",
+			tool_name=tool_name,
+			code=ErrorCode.UNSUPPORTED_DOWNLOADED_TYPE.value,
+		)
+	return {
+		"filename": filename,
+		# Fall back to the content-addressed local path when no last_updated is recorded.
+		"version": last_updated or local_path,
+		"path": local_path,
+	}, None
+
 
 def get_pdf_info_impl(filename: str) -> str:
-	"""Return basic information about a PDF including table headers and captions."""
+	"""Return basic information about a PDF including table headers and captions.
+
+	Table detection runs once per file version (normally while the file is vectorized);
+	later calls are served from the persisted table index.
+	"""
 	pdf_ctx, error = _get_pdf(filename)
 	if error:
 		return error
 
-	document = pdf_ctx["document"]
-	cache_key = pdf_ctx.get("cache_key")
 	try:
-		page_count = int(document.page_count)
-		cached_entry = _PDF_CACHE.get(cache_key) if cache_key else None
-		cached_counts = (
-			cached_entry.get("table_counts_by_page") if cached_entry else None
-		)
-		cached_samples = (
-			cached_entry.get("table_content_samples") if cached_entry else None
+		table_index = get_pdf_table_index(pdf_ctx["filename"], pdf_ctx["version"], pdf_ctx["path"])
+	except Exception as e:
+		return _tool_error(
+			f"Error reading file '{filename}': {str(e)}. Retry once; if it persists, try another file.",
+			tool_name="pdf",
+			code=ErrorCode.READ_FAILURE.value,
 		)
-		if isinstance(cached_counts, dict) and isinstance(cached_samples, dict):
-			table_counts_by_page = dict(cached_counts)
-			pages_with_tables = sorted(int(page) for page in table_counts_by_page.keys())
-			table_content_samples = dict(cached_samples)
-		else:
-			pages_with_tables = []
-			table_counts_by_page = {}
-			table_content_samples = {}
-			for page_idx in range(page_count):
-				page = document.load_page(page_idx)
-				table_finder = page.find_tables()
-				tables = list(table_finder.tables) if table_finder else []
-				table_count = len(tables)
-				if table_count > 0:
-					page_num = page_idx + 1
-					pages_with_tables.append(page_num)
-					table_counts_by_page[str(page_num)] = table_count
-
-					page_samples = []
-					for table_idx, table in enumerate(tables, start=1):
-						# Keep small, JSON-safe previews so the LLM can choose the right page.
-						try:
-							contents = table.to_pandas().head(2)
-							headers = [str(col) for col in list(contents.columns)]
-							rows = contents.fillna("").astype(str).values.tolist()
-						except Exception:
-							extracted = table.extract() or []
-							headers = [str(col) for col in (extracted[0] if extracted else [])]
-							rows = []
-							for row in extracted[1:3]:
-								rows.append([str(cell) if cell is not None else "" for cell in row])
-
-						page_samples.append(
-							{
-								"table_index": table_idx,
-								"headers": headers,
-								"rows": rows,
-							}
-						)
-
-					table_content_samples[str(page_num)] = page_samples
-			if cached_entry is not None:
-				cached_entry["table_counts_by_page"] = dict(table_counts_by_page)
-				cached_entry["table_content_samples"] = dict(table_content_samples)
-	finally:
-		document.close()
 
+	table_counts_by_page = dict(table_index["table_counts_by_page"])
+	pages_with_tables = sorted(int(page) for page in table_counts_by_page.keys())
 	return _tool_success(
 		"get_pdf_info",
 		{
 			"filename": filename,
-			"page_count": page_count,
+			"page_count": table_index["page_count"],
 			"pages_with_tables": pages_with_tables,
 			"pages_with_tables_count": len(pages_with_tables),
 			"table_counts_by_page": table_counts_by_page,
-			"table_content_samples": table_content_samples,
+			"table_content_samples": dict(table_index["table_content_samples"]),
 		},
 	)
 
 
-def _extract_table_rows(table_obj: Any) -> list[dict]:
-	"""Normalize PyMuPDF table output into list[dict]."""
-	extracted = table_obj.extract()
-	if not extracted:
-		return []
-
-	headers = extracted[0]
-	rows = extracted[1:]
-	normalized_rows: list[dict] = []
-	for row in rows:
-		row_dict = {}
-		for idx, header in enumerate(headers):
-			key = str(header).strip() if header is not None and str(header).strip() else f"column_{idx + 1}"
-			row_dict[key] = row[idx] if idx < len(row) else None
-		normalized_rows.append(row_dict)
-	return normalized_rows
-
-
 def extract_pdf_tables_impl(filename: str, page_num: int) -> str:
 	"""Extract tabular data from a specific 1-indexed PDF page."""
 	pdf_ctx, error = _get_pdf(filename)
 	if error:
 		return error
 
-	document = pdf_ctx["document"]
 	try:
-		page_count = int(document.page_count)
-		if page_num < 1 or page_num > page_count:
-			return _tool_error(
-				f"Page '{page_num}' is out of range for file '{filename}'. Valid pages are 1 to {page_count}.",
-				tool_name="extract_pdf_tables",
-				code=ErrorCode.READ_FAILURE.value,
-			)
+		with open_pdf_document(pdf_ctx["filename"], pdf_ctx["version"], pdf_ctx["path"]) as document:
+			page_count = int(document.page_count)
+			if page_num < 1 or page_num > page_count:
+				return _tool_error(
+					f"Page '{page_num}' is out of range for file '{filename}'. Valid pages are 1 to {page_count}.",
+					tool_name="extract_pdf_tables",
+					code=ErrorCode.READ_FAILURE.value,
+				)
+
+			((_, tables),) = extract_tables_on_pages(pdf_ctx["path"], [page_num - 1], document)
 
-		page = document.load_page(page_num - 1)
-		table_finder = page.find_tables()
-		tables = list(table_finder.tables) if table_finder else []
+			if not tables:
+				return _tool_error(
+					f"No tables found in file '{filename}' on page {page_num}.",
+					tool_name="extract_pdf_tables",
+					code=ErrorCode.READ_FAILURE.value,
+				)
+
+			serialized_tables = []
+			for idx, table in enumerate(tables, start=1):
+				serialized_tables.append(
+					{
+						"table_index": idx,
+						"page_num": page_num,
+						# Spreadsheet tools accept this table as sheet_name of the PDF.
+						"sheet_name": f"page_{page_num}_table_{idx}",
+						"rows": table["rows"],
+					}
+				)
 
-		if not tables:
-			return _tool_error(
-				f"No tables found in file '{filename}' on page {page_num}.",
-				tool_name="extract_pdf_tables",
-				code=ErrorCode.READ_FAILURE.value,
+			return _tool_success(
+				"extract_pdf_tables",
+				{
+					"filename": filename,
+					"page_num": page_num,
+					"table_count": len(serialized_tables),
+					"tables": serialized_tables,
+				},
 			)
+	except Exception as e:
+		return _tool_error(
+			f"Error extracting tables from file '{filename}' page {page_num}: {str(e)}",
+			tool_name="extract_pdf_tables",
+			code=ErrorCode.READ_FAILURE.value,
+		)
+
 
-		serialized_tables = []
-		for idx, table in enumerate(tables, start=1):
-			serialized_tables.append(
+def _parse_pages(pages: Union[str, int, list]) -> list[int]:
+	"""Parse "12-14, 16" (or a list of page numbers) into sorted, distinct 1-indexed pages."""
+	if isinstance(pages, (list, tuple)):
+		parts = [str(part) for part in pages]
+	else:
+		parts = str(pages).split(",")
+	page_nums = set()
+	for part in parts:
+		part = part.strip()
+		if not part:
+			continue
+		if "-" in part:
+			start, end = (int(bound) for bound in part.split("-", 1))
+			if end < start:
+				raise ValueError(f"Page range '{part}' ends before it starts.")
+		else:
+			start = end = int(part)
+		if start < 1:
+			raise ValueError(f"Page '{part}' is below 1; pages are 1-indexed.")
+		# Check the size before expanding, so a range such as 1-100000000 is never built.
+		if end - start + 1 > PDF_MAX_PAGES_PER_CALL:
+			raise ValueError(f"Page range '{part}' has more than {PDF_MAX_PAGES_PER_CALL} pages.")
+		page_nums.update(range(start, end + 1))
+		if len(page_nums) > PDF_MAX_PAGES_PER_CALL:
+			raise ValueError(f"More than {PDF_MAX_PAGES_PER_CALL} pages requested.")
+	return sorted(page_nums)
+
+
+def _stitch_tables(page_tables: list[tuple[int, list]], stitch: bool) -> list[dict]:
+	"""Number tables across pages, joining continuations when `stitch` is set.
+
+	A table continues the previous one when it is the first table on the page right
+	after the previous table's last page and has exactly the same headers.
+	"""
+	tables: list[dict] = []
+	for page_num, page_table_list in page_tables:
+		for position, table in enumerate(page_table_list):
+			previous = tables[-1] if tables else None
+			if (
+				stitch
+				and position == 0
+				and previous is not None
+				and previous["page_nums"][-1] == page_num - 1
+				and table["headers"]
+				and table["headers"] == previous["headers"]
+			):
+				previous["rows"].extend(table["rows"])
+				previous["page_nums"].append(page_num)
+				continue
+			tables.append(
 				{
-					"table_index": idx,
+					"table_index": len(tables) + 1,
 					"page_num": page_num,
-					"rows": _extract_table_rows(table),
+					"page_nums": [page_num],
+					"headers": table["headers"],
+					"rows": list(table["rows"]),
 				}
 			)
+	return tables
 
-		return _tool_success(
-			"extract_pdf_tables",
-			{
-				"filename": filename,
-				"page_num": page_num,
-				"table_count": len(serialized_tables),
-				"tables": serialized_tables,
-			},
+
+def extract_pdf_table_pages_impl(
+	filename: str, pages: Union[str, list], stitch: bool = True
+) -> str:
+	"""Extract tabular data from several 1-indexed PDF pages in one call.
+
+	Pages are extracted in parallel. With `stitch`, a table that continues onto the
+	next page under the same header is returned as one table spanning both pages.
+	"""
+	try:
+		page_nums = _parse_pages(pages)
+	except ValueError as e:
+		return _tool_error(
+			f"Invalid pages '{pages}': {str(e)}. Use page numbers and ranges such as \"12-14, 16\".",
+			tool_name="extract_pdf_table_pages",
+			code=ErrorCode.INVALID_ARGUMENT.value,
 		)
+	if not page_nums:
+		return _tool_error(
+			f"Request between 1 and {PDF_MAX_PAGES_PER_CALL} pages per call; got {len(page_nums)}.",
+			tool_name="extract_pdf_table_pages",
+			code=ErrorCode.INVALID_ARGUMENT.value,
+		)
+
+	pdf_ctx, error = _get_pdf(filename)
+	if error:
+		return error
+
+	try:
+		with open_pdf_document(pdf_ctx["filename"], pdf_ctx["version"], pdf_ctx["path"]) as document:
+			page_count = int(document.page_count)
+			out_of_range = [page_num for page_num in page_nums if page_num < 1 or page_num > page_count]
+			if out_of_range:
+				return _tool_error(
+					f"Pages {out_of_range} are out of range for file '{filename}'. Valid pages are 1 to {page_count}.",
+					tool_name="extract_pdf_table_pages",
+					code=ErrorCode.READ_FAILURE.value,
+				)
+			page_tables = extract_tables_on_pages(
+				pdf_ctx["path"], [page_num - 1 for page_num in page_nums], document
+			)
 	except Exception as e:
 		return _tool_error(
-			f"Error extracting tables from file '{filename}' page {page_num}: {str(e)}",
-			tool_name="extract_pdf_tables",
+			f"Error extracting tables from file '{filename}' pages {page_nums}: {str(e)}",
+			tool_name="extract_pdf_table_pages",
 			code=ErrorCode.READ_FAILURE.value,
 		)
-	finally:
-		document.close()
+
+	page_tables = [(page_idx + 1, tables) for page_idx, tables in page_tables]
+	tables = _stitch_tables(page_tables, bool(stitch))
+	for table in tables:
+		table.pop("headers")
+	return _tool_success(
+		"extract_pdf_table_pages",
+		{
+			"filename": filename,
+			"pages": page_nums,
+			"pages_without_tables": [page_num for page_num, found in page_tables if not found],
+			"table_count": len(tables),
+			"tables": tables,
+		},
+	)
+
+
+def search_pdf_impl(filename: str, query: str, max_results: int = 10) -> str:
+	"""Find the pages of a PDF whose text contains every word of `query`.
+
+	Returns page numbers with short snippets, best matches first, so the right page
+	can be passed straight to extract_pdf_tables.
+	"""
+	if not tokenize(str(query)):
+		return _tool_error(
+			"Query must contain at least one word or number.",
+			tool_name="search_pdf",
+			code=ErrorCode.INVALID_ARGUMENT.value,
+		)
+
+	pdf_ctx, error = _get_pdf(filename)
+	if error:
+		return error
+
+	try:
+		text_index = get_pdf_text_index(pdf_ctx["filename"], pdf_ctx["version"], pdf_ctx["path"])
+	except Exception as e:
+		return _tool_error(
+			f"Error reading file '{filename}': {str(e)}. Retry once; if it persists, try another file.",
+			tool_name="search_pdf",
+			code=ErrorCode.READ_FAILURE.value,
+		)
+
+	matches = search_text_index(text_index, str(query))
+	max_results = int(max_results) if max_results else 0
+	shown = matches[:max_results] if max_results > 0 else matches
+	return _tool_success(
+		"search_pdf",
+		{
+			"filename": filename,
+			"query": query,
+			"page_count": text_index["page_count"],
+			"matching_page_count": len(matches),
+			"matches": shown,
+			"truncated": len(shown) < len(matches),
+		},
+	)
@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+# PyMuPDF is sometimes referred to as fitz so add a compatibility import
+try:
+    import pymupdf as fitz
+except Exception:
+    import fitz
+
+from src.pdf_table_index import get_table_index
+from src.pdf_text_index import get_text_index
+
+PDF_CACHE_MAX_BYTES = max(0, int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024**2))))
+# Open handles per file version; further concurrent callers wait for one to be checked in.
+PDF_HANDLES_PER_FILE = max(1, int(os.getenv("PDF_HANDLES_PER_FILE", "4")))
+# Handles left unused for this long are closed on the next checkout or checkin.
+PDF_HANDLE_IDLE_SECONDS = float(os.getenv("PDF_HANDLE_IDLE_SECONDS", "300"))
+
+# (filename, version) -> entry, least recently used first. Each entry holds the
+# artifacts computed so far: a pool of open document handles ("idle" handles with
+# their last checkin time, plus a count of "checked_out" ones), the "table_index"
+# and the "text_index", with "bytes" estimating the memory they hold.
+_PDF_CACHE: "OrderedDict[Tuple[str, Hashable], dict[str, Any]]" = OrderedDict()
+_PDF_CACHE_LOCK = threading.Lock()
+_PDF_HANDLE_RETURNED = threading.Condition(_PDF_CACHE_LOCK)
+_pdf_cache_state = {
+    "bytes": 0,
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "handles_opened": 0,
+    "handles_reused": 0,
+    "handles_expired": 0,
+}
+
+
+def _release_handle_locked(entry: dict[str, Any]) -> None:
+    """Account for a handle that is about to be closed."""
+    if not entry["evicted"]:
+        entry["bytes"] -= entry["handle_bytes"]
+        _pdf_cache_state["bytes"] -= entry["handle_bytes"]
+
+
+def _expire_idle_handles_locked(now: float) -> list:
+    expired = []
+    for entry in _PDF_CACHE.values():
+        while entry["idle"] and now - entry["idle"][0][1] >= PDF_HANDLE_IDLE_SECONDS:
+            expired.append(entry["idle"].pop(0)[0])
+            _release_handle_locked(entry)
+            _pdf_cache_state["handles_expired"] += 1
+    return expired
+
+
+def _evict_locked(keep: Tuple[str, Hashable]) -> list:
+    """Drop least recently used entries over budget and return their idle handles to close.
+
+    Handles checked out of an evicted entry are closed when they are checked in.
+    """
+    to_close = []
+    while _pdf_cache_state["bytes"] > PDF_CACHE_MAX_BYTES and len(_PDF_CACHE) > 1:
+        oldest = next(iter(_PDF_CACHE))
+        if oldest == keep:
+            _PDF_CACHE.move_to_end(oldest)
+            continue
+        entry = _PDF_CACHE.pop(oldest)
+        _pdf_cache_state["bytes"] -= entry["bytes"]
+        _pdf_cache_state["evictions"] += 1
+        entry["evicted"] = True
+        to_close.extend(document for document, _ in entry["idle"])
+        entry["idle"].clear()
+    return to_close
+
+
+def _close_documents(documents: list) -> None:
+    for document in documents:
+        document.close()
+
+
+def _get_entry(filename: str, version: Hashable, local_path: str) -> dict[str, Any]:
+    key = (filename, version)
+    with _PDF_CACHE_LOCK:
+        entry = _PDF_CACHE.get(key)
+        if entry is not None:
+            _PDF_CACHE.move_to_end(key)
+            _pdf_cache_state["hits"] += 1
+            return entry
+        _pdf_cache_state["misses"] += 1
+        entry = {
+            "key": key,
+            "local_path": local_path,
+            "idle": [],
+            "checked_out": 0,
+            "handle_bytes": 0,
+            "table_index": None,
+            "text_index": None,
+            "bytes": 0,
+            "evicted": False,
+        }
+        _PDF_CACHE[key] = entry
+        return entry
+
+
+def _add_bytes_locked(entry: dict[str, Any], size: int) -> list:
+    if entry["evicted"]:
+        return []
+    entry["bytes"] += size
+    _pdf_cache_state["bytes"] += size
+    return _evict_locked(keep=entry["key"])
+
+
+def checkout_pdf_document(
+    filename: str, version: Hashable, local_path: str
+) -> Tuple[dict[str, Any], Any]:
+    """Take an open PyMuPDF handle of a file version out of the pool.
+
+    An idle handle is reused when there is one, so its parsed xref and page tree
+    are not read again; otherwise a new handle is opened, up to PDF_HANDLES_PER_FILE.
+    Every checkout must be followed by checkin_pdf_document.
+
+    Returns:
+        Tuple[dict, Any]: The cache entry to check the handle back into, and the handle.
+    """
+    entry = _get_entry(filename, version, local_path)
+    with _PDF_HANDLE_RETURNED:
+        to_close = _expire_idle_handles_locked(time.monotonic())
+        while not entry["idle"] and entry["checked_out"] >= PDF_HANDLES_PER_FILE:
+            _PDF_HANDLE_RETURNED.wait()
+        entry["checked_out"] += 1
+        document = entry["idle"].pop()[0] if entry["idle"] else None
+        if document is not None:
+            _pdf_cache_state["handles_reused"] += 1
+    _close_documents(to_close)
+    if document is not None:
+        return entry, document
+
+    try:
+        document = fitz.open(local_path)
+    except Exception:
+        with _PDF_HANDLE_RETURNED:
+            entry["checked_out"] -= 1
+            _PDF_HANDLE_RETURNED.notify_all()
+        raise
+    with _PDF_CACHE_LOCK:
+        _pdf_cache_state["handles_opened"] += 1
+        # The parsed xref and page tree grow with the file; its size is a fair estimate.
+        entry["handle_bytes"] = os.path.getsize(local_path)
+        to_close = _add_bytes_locked(entry, entry["handle_bytes"])
+    _close_documents(to_close)
+    return entry, document
+
+
+def checkin_pdf_document(entry: dict[str, Any], document: Any) -> None:
+    """Return a handle taken with checkout_pdf_document to its pool."""
+    now = time.monotonic()
+    with _PDF_HANDLE_RETURNED:
+        entry["checked_out"] -= 1
+        if entry["evicted"] or document.is_closed:
+            _release_handle_locked(entry)
+            to_close = [document]
+        else:
+            entry["idle"].append((document, now))
+            to_close = []
+        to_close.extend(_expire_idle_handles_locked(now))
+        _PDF_HANDLE_RETURNED.notify_all()
+    _close_documents([document for document in to_close if not document.is_closed])
+
+
+@contextmanager
+def open_pdf_document(
+    filename: str, version: Hashable, local_path: str
+) -> Iterator[Any]:
+    """Check a pooled PyMuPDF handle of a file version out for the duration of a block."""
+    entry, document = checkout_pdf_document(filename, version, local_path)
+    try:
+        yield document
+    finally:
+        checkin_pdf_document(entry, document)
+
+
+def _get_index(
+    filename: str, version: Hashable, local_path: str, artifact: str, loader
+) -> dict[str, Any]:
+    entry = _get_entry(filename, version, local_path)
+    with _PDF_CACHE_LOCK:
+        index = entry[artifact]
+    if index is not None:
+        return index
+    # Build outside the lock; if another thread stored the index meanwhile, use theirs.
+    index = loader(local_path)
+    size = len(json.dumps(index))
+    with _PDF_CACHE_LOCK:
+        if entry[artifact] is not None:
+            return entry[artifact]
+        entry[artifact] = index
+        to_close = _add_bytes_locked(entry, size)
+    _close_documents(to_close)
+    return index
+
+
+def get_pdf_table_index(filename: str, version: Hashable, local_path: str) -> dict[str, Any]:
+    """Return the table index of a file version, loading or building it on first use."""
+    return _get_index(filename, version, local_path, "table_index", get_table_index)
+
+
+def get_pdf_text_index(filename: str, version: Hashable, local_path: str) -> dict[str, Any]:
+    """Return the page text index of a file version, loading or building it on first use."""
+    return _get_index(filename, version, local_path, "text_index", get_text_index)
+
+
+def get_pdf_cache_stats() -> dict:
+    """Return hit/miss counters and estimated memory use of the PDF artifact cache."""
+    with _PDF_CACHE_LOCK:
+        lookups = _pdf_cache_state["hits"] + _pdf_cache_state["misses"]
+        return {
+            "entries": len(_PDF_CACHE),
+            "open_documents": sum(
+                len(entry["idle"]) + entry["checked_out"] for entry in _PDF_CACHE.values()
+            ),
+            "idle_documents": sum(len(entry["idle"]) for entry in _PDF_CACHE.values()),
+            "bytes": _pdf_cache_state["bytes"],
+            "max_bytes": PDF_CACHE_MAX_BYTES,
+            "hits": _pdf_cache_state["hits"],
+            "misses": _pdf_cache_state["misses"],
+            "evictions": _pdf_cache_state["evictions"],
+            "handles_opened": _pdf_cache_state["handles_opened"],
+            "handles_reused": _pdf_cache_state["handles_reused"],
+            "handles_expired": _pdf_cache_state["handles_expired"],
+            "hit_rate": _pdf_cache_state["hits"] / lookups if lookups else 0.0,
+        }
+
+
+def clear_pdf_cache() -> None:
+    with _PDF_CACHE_LOCK:
+        to_close = []
+        for entry in _PDF_CACHE.values():
+            entry["evicted"] = True
+            to_close.extend(document for document, _ in entry["idle"])
+            entry["idle"].clear()
+        _PDF_CACHE.clear()
+        for counter in _pdf_cache_state:
+            _pdf_cache_state[counter] = 0
+    _close_documents(to_close)
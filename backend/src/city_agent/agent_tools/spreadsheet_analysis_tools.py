@@ -1,9 +1,25 @@
 from pathlib import Path
 import json
-from typing import Optional, Tuple
+import os
+import re
+from typing import Iterator, Optional, Tuple
 import pandas as pd
+from src.csv_loader import iter_csv_chunks, read_csv_file, read_csv_header
+from src.pdf_table_index import extract_tables_on_pages
 from src.supabase_interface import download_supabase_file
 from city_agent.error_codes import ErrorCode
+from city_agent.agent_tools.spreadsheet_cache import get_cached_frame, keyword_mask
+from city_agent.agent_tools.workbook_manifest import get_workbook_manifest
+
+# CSV files at least this large are aggregated chunk by chunk instead of loaded whole.
+SPREADSHEET_STREAMING_THRESHOLD_BYTES = max(
+    0, int(os.getenv("SPREADSHEET_STREAMING_THRESHOLD_BYTES", str(100 * 1024**2)))
+)
+SPREADSHEET_STREAMING_CHUNK_ROWS = max(
+    1, int(os.getenv("SPREADSHEET_STREAMING_CHUNK_ROWS", "100000"))
+)
+# PDF tables are addressed as sheets, using the sheet_name extract_pdf_tables reports.
+_PDF_TABLE_SHEET = re.compile(r"page_(\d+)_table_(\d+)")
 
 
 def _normalize_for_json(value):
@@ -93,6 +109,48 @@ def _get_column(
     return df[column_name], None
 
 
+def _pdf_table_frame(table: dict) -> pd.DataFrame:
+    """Build a frame from an extracted PDF table, typing columns whose cells are all numbers.
+
+    Cells are text, so thousands separators, currency signs and whitespace are stripped
+    before parsing; a column with any other non-empty text stays as text.
+    """
+    frame = pd.DataFrame(table["rows"], columns=table["headers"])
+    for position in range(frame.shape[1]):
+        column = frame.iloc[:, position]
+        cleaned = column.astype("string").str.replace(r"[\s,$]", "", regex=True)
+        cleaned = cleaned.mask(cleaned == "")
+        numbers = pd.to_numeric(cleaned, errors="coerce")
+        if cleaned.notna().any() and numbers.notna().sum() == cleaned.notna().sum():
+            frame.isetitem(position, numbers.astype("float64"))
+    return frame
+
+
+def _get_pdf_table(
+    filename: str, sheet_name: Optional[str], version, local_path: str
+) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    match = _PDF_TABLE_SHEET.fullmatch(sheet_name or "")
+    if match is None:
+        return None, _tool_error(
+            f"PDF file '{filename}' needs sheet_name 'page_<n>_table_<k>' naming a table "
+            "reported by extract_pdf_tables.",
+            tool_name="spreadsheet",
+            code=ErrorCode.INVALID_ARGUMENT.value,
+        )
+    page_num, table_num = int(match.group(1)), int(match.group(2))
+
+    def load_table() -> pd.DataFrame:
+        ((_, tables),) = extract_tables_on_pages(local_path, [page_num - 1])
+        if not 1 <= table_num <= len(tables):
+            raise KeyError(sheet_name)
+        return _pdf_table_frame(tables[table_num - 1])
+
+    try:
+        return get_cached_frame(filename, sheet_name, version, load_table), None
+    except (KeyError, IndexError, ValueError):
+        return None, _sheet_not_found_error(filename, sheet_name, "spreadsheet")
+
+
 def _get_spreadsheet(
     filename: str,
     sheet_name: Optional[str] = None,
@@ -100,58 +158,80 @@ def _get_spreadsheet(
     get_info: bool = False,
 ) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     """
-    Helper function to read a spreadsheet file (CSV or XLSX) into a pandas DataFrame.
+    Helper function to read a spreadsheet file (CSV or XLSX), or a table of a PDF, into a pandas DataFrame.
     Args:
         filename (str): The name of the spreadsheet file to read.
-        sheet_name (Optional[str]): The name of the sheet to read. If None, reads the first sheet. Only applicable for XLSX files.
+        sheet_name (Optional[str]): The name of the sheet to read. If None, reads the first sheet. Only applicable for XLSX files,
+            and required for PDF files, where it names a table as "page_<n>_table_<k>".
         target_column (Optional[str]): The name of the column to filter for. Used for identifying the specific sheet
         get_info (bool): For the get_spreadsheet_info tool to explain if there are multiple sheets
     Returns:
         Tuple[Optional[pd.DataFrame], Optional[str]]: DataFrame on success, error text on failure.
+        Frames are served from the parsed frame cache and must be treated as read-only.
     """
     if isinstance(sheet_name, str):
         sheet_name = sheet_name.strip() or None
 
-    if not filename.endswith(".csv") and not filename.endswith(".xlsx"):
+    if not filename.endswith((".csv", ".xlsx", ".pdf")):
         return None, _tool_error(
-            f"Unsupported file type for file '{filename}'. Only .csv and .xlsx files are supported.",
+            f"Unsupported file type for file '{filename}'. Only .csv and .xlsx files, and PDF tables, are supported.",
             tool_name="spreadsheet",
             code=ErrorCode.UNSUPPORTED_FILE_TYPE.value,
         )
 
     try:
-        db_file_info = download_supabase_file(filename, "documents")
-        # db_file_info[0] is the local file path of the downloaded file
-        if db_file_info[0].endswith(".csv"):
-            return pd.read_csv(db_file_info[0], encoding="cp1252"), None
-        if db_file_info[0].endswith(".xlsx"):
-            xls = pd.ExcelFile(db_file_info[0])
-            if sheet_name and sheet_name not in xls.sheet_names:
+        local_path, _, _, last_updated = download_supabase_file(filename, "documents")
+        # Fall back to the content-addressed local path when no last_updated is recorded.
+        version = last_updated or local_path
+        if local_path.endswith(".csv"):
+            return (
+                get_cached_frame(
+                    filename,
+                    None,
+                    version,
+                    lambda: read_csv_file(local_path),
+                ),
+                None,
+            )
+        if local_path.endswith(".pdf"):
+            return _get_pdf_table(filename, sheet_name, version, local_path)
+        if local_path.endswith(".xlsx"):
+            manifest = get_workbook_manifest(local_path)
+            sheet_names = manifest["sheet_names"]
+            if sheet_name and sheet_name not in sheet_names:
                 return None, _sheet_not_found_error(filename, sheet_name, "spreadsheet")
+
+            def load_sheet(workbook_sheet_name: str) -> pd.DataFrame:
+                return get_cached_frame(
+                    filename,
+                    workbook_sheet_name,
+                    version,
+                    lambda: pd.read_excel(local_path, sheet_name=workbook_sheet_name),
+                )
+
             if get_info:
                 # Attach workbook-level info while returning a standard (df, error) tuple.
-                sheet_rows = {sheet: len(xls.parse(sheet)) for sheet in xls.sheet_names}
-                selected_sheet = sheet_name or xls.sheet_names[0]
-                selected_df = xls.parse(selected_sheet)
+                # Row counts come from the manifest so only the selected sheet is parsed.
+                selected_sheet = sheet_name or sheet_names[0]
+                selected_df = load_sheet(selected_sheet)
                 selected_df.attrs["sheet_info"] = {
-                    "sheet_names": sheet_rows,
+                    "sheet_names": dict(manifest["row_counts"]),
                     "selected_sheet": selected_sheet,
                 }
                 return selected_df, None
             if sheet_name:
-                return xls.parse(sheet_name), None
+                return load_sheet(sheet_name), None
             if target_column:
-                # If a target column is specified, we need to find which sheet it is in.
-                for workbook_sheet_name in xls.sheet_names:
-                    df = xls.parse(workbook_sheet_name)
-                    if target_column in df.columns:
-                        return df, None
+                # If a target column is specified, the manifest knows which sheet it is in.
+                target_sheet = manifest["column_sheets"].get(str(target_column))
+                if target_sheet is not None:
+                    return load_sheet(target_sheet), None
                 return None, _tool_error(
                     f"Column '{target_column}' not found in any sheet of file '{filename}'.",
                     tool_name="spreadsheet",
                     code=ErrorCode.COLUMN_NOT_FOUND.value,
                 )
-            return xls.parse(xls.sheet_names[0]), None
+            return load_sheet(sheet_names[0]), None
         return None, _tool_error(
             f"Downloaded file '{filename}' is not a supported spreadsheet type.",
             tool_name="spreadsheet",
@@ -171,6 +251,71 @@ def _get_spreadsheet(
         )
 
 
+def _get_csv_chunks(
+    filename: str, columns: Optional[list], tool_name: str
+) -> Tuple[Optional[Iterator[pd.DataFrame]], Optional[str]]:
+    """
+    Helper function to stream a large CSV file in fixed-size chunks.
+    Args:
+        filename (str): The name of the spreadsheet file to read.
+        columns (Optional[list]): The columns to read. None reads every column.
+        tool_name (str): The tool reporting a missing column.
+    Returns:
+        Tuple[Optional[Iterator[pd.DataFrame]], Optional[str]]: A chunk iterator when the file is a CSV
+        above SPREADSHEET_STREAMING_THRESHOLD_BYTES, (None, None) when it should be loaded whole with
+        _get_spreadsheet, or error text on failure.
+    """
+    if not filename.endswith(".csv"):
+        return None, None
+    try:
+        local_path = download_supabase_file(filename, "documents")[0]
+        if os.path.getsize(local_path) < SPREADSHEET_STREAMING_THRESHOLD_BYTES:
+            return None, None
+        header = read_csv_header(local_path)
+    except Exception:
+        # Let _get_spreadsheet report download and read failures consistently.
+        return None, None
+
+    usecols = None
+    if columns is not None:
+        missing_columns = [column for column in columns if column not in header]
+        if missing_columns:
+            return None, _column_not_found_error(filename, missing_columns[0], tool_name)
+        usecols = list(dict.fromkeys(columns))
+    return (
+        iter_csv_chunks(local_path, usecols, SPREADSHEET_STREAMING_CHUNK_ROWS),
+        None,
+    )
+
+
+def _reduce_column_chunks(
+    chunks: Iterator[pd.DataFrame], column_name: str, stats: tuple
+) -> dict:
+    """Merge per-chunk count/sum/min/max partials of one column into whole-file values."""
+    merged = {"count": 0, "sum": None, "min": None, "max": None}
+    for chunk in chunks:
+        column = chunk[column_name]
+        non_null = int(column.count())
+        if non_null == 0:
+            continue
+        merged["count"] += non_null
+        if "sum" in stats:
+            part = column.sum()
+            merged["sum"] = part if merged["sum"] is None else merged["sum"] + part
+        if "min" in stats:
+            part = column.min()
+            merged["min"] = part if merged["min"] is None else min(merged["min"], part)
+        if "max" in stats:
+            part = column.max()
+            merged["max"] = part if merged["max"] is None else max(merged["max"], part)
+    if merged["sum"] is None:
+        merged["sum"] = 0
+    for stat in ("min", "max"):
+        if merged[stat] is None:
+            merged[stat] = float("nan")
+    return merged
+
+
 def get_spreadsheet_info_impl(filename: str, sheet_name: Optional[str] = None) -> str:
     """
     Tool for retrieving basic information about a spreadsheet
@@ -206,6 +351,21 @@ def get_mean_impl(
     Returns:
         str: The mean value of the specified column.
     """
+    chunks, error = _get_csv_chunks(filename, [column_name], "get_mean")
+    if error:
+        return error
+    if chunks is not None:
+        merged = _reduce_column_chunks(chunks, column_name, ("sum",))
+        mean = merged["sum"] / merged["count"] if merged["count"] else float("nan")
+        return _tool_success(
+            "get_mean",
+            {
+                "filename": filename,
+                "column": column_name,
+                "mean": mean,
+            },
+        )
+
     df, error = _get_spreadsheet(
         filename, sheet_name=sheet_name, target_column=column_name
     )
@@ -255,14 +415,9 @@ def filter_values_impl(
             code=ErrorCode.COLUMN_NOT_FOUND.value,
         )
 
-    specific_info_df = df[columns]
-    # Use vectorized matching across selected columns instead of row-wise apply.
-    mask = (
-        specific_info_df.astype(str)
-        .apply(lambda col: col.str.contains(keyword, case=False, na=False, regex=False))
-        .any(axis=1)
-    )
-    specific_info_df = specific_info_df[mask]
+    # Match through the per-column token indexes cached with the frame.
+    mask = keyword_mask(df, columns, keyword)
+    specific_info_df = df.loc[mask, columns]
 
     if len(specific_info_df) == 0:
         return _tool_success(
@@ -359,15 +514,31 @@ def count_values_impl(
     Returns:
         str: A string representation of the count of each unique value in the specified column.
     """
-    df, error = _get_spreadsheet(
-        filename, sheet_name=sheet_name, target_column=column_name
-    )
-    if error:
-        return error
-    column, error = _get_column(df, filename, column_name, "count_values")
+    chunks, error = _get_csv_chunks(filename, [column_name], "count_values")
     if error:
         return error
-    value_counts = column.value_counts()
+    if chunks is not None:
+        value_counts = pd.Series(dtype="int64")
+        for chunk in chunks:
+            value_counts = value_counts.add(
+                chunk[column_name].value_counts(), fill_value=0
+            )
+        value_counts = value_counts.astype("int64").sort_values(
+            ascending=False, kind="stable"
+        )
+    else:
+        df, error = _get_spreadsheet(
+            filename, sheet_name=sheet_name, target_column=column_name
+        )
+        if error:
+            return error
+        column, error = _get_column(df, filename, column_name, "count_values")
+        if error:
+            return error
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Count plain values so unused categories are not listed and ties keep row order.
+            column = column.astype(column.cat.categories.dtype)
+        value_counts = column.value_counts()
     return _tool_success(
         "count_values",
         {
@@ -389,6 +560,20 @@ def get_min_in_column_impl(
     Returns:
         str: The minimum value of the specified column.
     """
+    chunks, error = _get_csv_chunks(filename, [column_name], "get_min_in_column")
+    if error:
+        return error
+    if chunks is not None:
+        merged = _reduce_column_chunks(chunks, column_name, ("min",))
+        return _tool_success(
+            "get_min_in_column",
+            {
+                "filename": filename,
+                "column": column_name,
+                "minimum": merged["min"],
+            },
+        )
+
     df, error = _get_spreadsheet(
         filename, sheet_name=sheet_name, target_column=column_name
     )
@@ -418,6 +603,20 @@ def get_max_in_column_impl(
     Returns:
         str: The maximum value of the specified column.
     """
+    chunks, error = _get_csv_chunks(filename, [column_name], "get_max_in_column")
+    if error:
+        return error
+    if chunks is not None:
+        merged = _reduce_column_chunks(chunks, column_name, ("max",))
+        return _tool_success(
+            "get_max_in_column",
+            {
+                "filename": filename,
+                "column": column_name,
+                "maximum": merged["max"],
+            },
+        )
+
     df, error = _get_spreadsheet(
         filename, sheet_name=sheet_name, target_column=column_name
     )
@@ -447,6 +646,20 @@ def get_sum_in_column_impl(
     Returns:
         str: The sum of the specified column.
     """
+    chunks, error = _get_csv_chunks(filename, [column_name], "get_sum_in_column")
+    if error:
+        return error
+    if chunks is not None:
+        merged = _reduce_column_chunks(chunks, column_name, ("sum",))
+        return _tool_success(
+            "get_sum_in_column",
+            {
+                "filename": filename,
+                "column": column_name,
+                "sum": merged["sum"],
+            },
+        )
+
     df, error = _get_spreadsheet(
         filename, sheet_name=sheet_name, target_column=column_name
     )
@@ -465,6 +678,49 @@ def get_sum_in_column_impl(
     )
 
 
+def _stream_sum_of_filtered_values(
+    chunks: Iterator[pd.DataFrame],
+    filename: str,
+    column_name: str,
+    keyword: str,
+    filter_column: Optional[str],
+) -> str:
+    """Chunked variant of get_sum_of_filtered_values for CSV files too large to load whole."""
+    match_count = 0
+    numeric_match_count = 0
+    total_sum = 0
+    for chunk in chunks:
+        if column_name not in chunk.columns:
+            return _column_not_found_error(
+                filename, column_name, "get_sum_of_filtered_values"
+            )
+        match_columns = [filter_column] if filter_column else list(chunk.columns)
+        mask = keyword_mask(chunk, match_columns, keyword)
+        numeric_values = pd.to_numeric(chunk.loc[mask, column_name], errors="coerce")
+        match_count += int(mask.sum())
+        numeric_match_count += int(numeric_values.notna().sum())
+        total_sum += numeric_values.sum()
+
+    if match_count and numeric_match_count == 0:
+        return _tool_error(
+            f"Column '{column_name}' has no numeric values in matched rows.",
+            tool_name="get_sum_of_filtered_values",
+            code=ErrorCode.NON_NUMERIC_SUM_COLUMN.value,
+        )
+    return _tool_success(
+        "get_sum_of_filtered_values",
+        {
+            "filename": filename,
+            "sum_column": column_name,
+            "keyword": keyword,
+            "matched_on": filter_column or "all_columns",
+            "match_count": match_count,
+            "numeric_match_count": numeric_match_count,
+            "sum": total_sum,
+        },
+    )
+
+
 def get_sum_of_filtered_values_impl(
     filename: str,
     column_name: str,
@@ -483,6 +739,17 @@ def get_sum_of_filtered_values_impl(
     Returns:
         str: The sum of the values in the specified column for rows that match the keyword.
     """
+    stream_columns = [column_name, filter_column] if filter_column else None
+    chunks, error = _get_csv_chunks(
+        filename, stream_columns, "get_sum_of_filtered_values"
+    )
+    if error:
+        return error
+    if chunks is not None:
+        return _stream_sum_of_filtered_values(
+            chunks, filename, column_name, keyword, filter_column
+        )
+
     df, error = _get_spreadsheet(
         filename, sheet_name=sheet_name, target_column=column_name
     )
@@ -493,24 +760,14 @@ def get_sum_of_filtered_values_impl(
         return error
 
     if filter_column:
-        filter_series, error = _get_column(
-            df, filename, filter_column, "get_sum_of_filtered_values"
-        )
+        _, error = _get_column(df, filename, filter_column, "get_sum_of_filtered_values")
         if error:
             return error
-        mask = filter_series.astype(str).str.contains(
-            keyword, case=False, na=False, regex=False
-        )
+        mask = keyword_mask(df, [filter_column], keyword)
         matched_on = filter_column
     else:
         # Backward-compatible fallback for existing 3-argument calls.
-        mask = (
-            df.astype(str)
-            .apply(
-                lambda col: col.str.contains(keyword, case=False, na=False, regex=False)
-            )
-            .any(axis=1)
-        )
+        mask = keyword_mask(df, list(df.columns), keyword)
         matched_on = "all_columns"
     filtered_df = df[mask]
 
@@ -552,6 +809,206 @@ def get_sum_of_filtered_values_impl(
     )
 
 
+AGGREGATE_BASIC_STATS = ("count", "sum", "mean", "min", "max", "median")
+
+
+def _parse_aggregate_stats(stats: list) -> Tuple[list, dict, list]:
+    """Split requested stats into pandas aggregations and percentiles ("p90" -> 0.9)."""
+    basic_stats = []
+    percentiles = {}
+    invalid_stats = []
+    for stat in stats:
+        name = str(stat).strip().lower()
+        if name in AGGREGATE_BASIC_STATS:
+            if name not in basic_stats:
+                basic_stats.append(name)
+            continue
+        try:
+            quantile = float(name[1:]) / 100 if name.startswith("p") else None
+        except ValueError:
+            quantile = None
+        if quantile is None or not 0 <= quantile <= 1:
+            invalid_stats.append(stat)
+            continue
+        percentiles[name] = quantile
+    return basic_stats, percentiles, invalid_stats
+
+
+def aggregate_impl(
+    filename: str,
+    columns: list,
+    stats: list,
+    sheet_name: Optional[str] = None,
+) -> str:
+    """
+    Tool for computing several statistics over several columns of a spreadsheet in one call.
+    Values are coerced to numbers; text cells are ignored.
+    Args:
+        filename (str): The name of the spreadsheet file.
+        columns (list): The names of the columns to aggregate.
+        stats (list): Any of count, sum, mean, min, max, median and percentiles such as p90.
+    Returns:
+        str: The requested statistics for each column.
+    """
+    if not columns or not stats:
+        return _tool_error(
+            "Both 'columns' and 'stats' must be non-empty lists.",
+            tool_name="aggregate",
+            code=ErrorCode.INVALID_ARGUMENT.value,
+        )
+    basic_stats, percentiles, invalid_stats = _parse_aggregate_stats(stats)
+    if invalid_stats:
+        return _tool_error(
+            f"Unsupported stats {invalid_stats}. Use {list(AGGREGATE_BASIC_STATS)} "
+            "or percentiles written as p<0-100> (e.g. p90).",
+            tool_name="aggregate",
+            code=ErrorCode.INVALID_ARGUMENT.value,
+        )
+
+    df, error = _get_spreadsheet(
+        filename, sheet_name=sheet_name, target_column=columns[0]
+    )
+    if error:
+        return error
+    missing_columns = [column for column in columns if column not in df.columns]
+    if missing_columns:
+        return _tool_error(
+            f"Column not found in file '{filename}': {missing_columns}",
+            tool_name="aggregate",
+            code=ErrorCode.COLUMN_NOT_FOUND.value,
+        )
+
+    numeric_df = df[columns].apply(pd.to_numeric, errors="coerce")
+    results = {column: {} for column in columns}
+    if basic_stats:
+        basic_results = numeric_df.agg(basic_stats)
+        for column in columns:
+            for stat in basic_stats:
+                results[column][stat] = basic_results.at[stat, column]
+    if percentiles:
+        quantile_results = numeric_df.quantile(sorted(set(percentiles.values())))
+        for column in columns:
+            for name, quantile in percentiles.items():
+                results[column][name] = quantile_results.at[quantile, column]
+
+    numeric_counts = numeric_df.count()
+    non_numeric_columns = [
+        column
+        for column in columns
+        if numeric_counts[column] == 0 and df[column].notna().any()
+    ]
+    return _tool_success(
+        "aggregate",
+        {
+            "filename": filename,
+            "row_count": len(df),
+            "results": results,
+            "non_numeric_columns": non_numeric_columns,
+        },
+    )
+
+
+def group_aggregate_impl(
+    filename: str,
+    group_by: str,
+    value_column: str,
+    stat: str = "sum",
+    top_n: int = 20,
+    sheet_name: Optional[str] = None,
+) -> str:
+    """
+    Tool for aggregating a column per distinct value of another column (e.g. total cost per ward).
+    Args:
+        filename (str): The name of the spreadsheet file.
+        group_by (str): The name of the column whose distinct values form the groups.
+        value_column (str): The name of the column to aggregate within each group.
+        stat (str): One of count, sum, mean, min, max or median.
+        top_n (int): Maximum number of groups to return, largest values first. 0 returns all groups.
+    Returns:
+        str: The groups sorted by their aggregated value in descending order.
+    """
+    stat = str(stat).strip().lower()
+    if stat not in AGGREGATE_BASIC_STATS:
+        return _tool_error(
+            f"Unsupported stat '{stat}'. Use one of {list(AGGREGATE_BASIC_STATS)}.",
+            tool_name="group_aggregate",
+            code=ErrorCode.INVALID_ARGUMENT.value,
+        )
+    df, error = _get_spreadsheet(
+        filename, sheet_name=sheet_name, target_column=value_column
+    )
+    if error:
+        return error
+    group_series, error = _get_column(df, filename, group_by, "group_aggregate")
+    if error:
+        return error
+    value_series, error = _get_column(df, filename, value_column, "group_aggregate")
+    if error:
+        return error
+
+    if stat != "count":
+        value_series = pd.to_numeric(value_series, errors="coerce")
+        if pd.api.types.is_integer_dtype(value_series):
+            # Cached frames hold downcast integers; group sums keep the input dtype.
+            nullable = isinstance(value_series.dtype, pd.api.extensions.ExtensionDtype)
+            value_series = value_series.astype("Int64" if nullable else "int64")
+        if value_series.notna().sum() == 0:
+            return _tool_error(
+                f"Column '{value_column}' has no numeric values to {stat}.",
+                tool_name="group_aggregate",
+                code=ErrorCode.NON_NUMERIC_SUM_COLUMN.value,
+            )
+
+    grouped = value_series.groupby(group_series, sort=False, observed=True)
+    summary = pd.DataFrame({"value": grouped.agg(stat), "rows": grouped.size()})
+    summary = summary.sort_values("value", ascending=False, kind="stable")
+    group_count = len(summary)
+    top_n = int(top_n) if top_n else 0
+    shown = summary.head(top_n) if top_n > 0 else summary
+
+    return _tool_success(
+        "group_aggregate",
+        {
+            "filename": filename,
+            "group_by": group_by,
+            "value_column": value_column,
+            "stat": stat,
+            "group_count": group_count,
+            "groups": [
+                {"group": group, "value": row.value, "rows": int(row.rows)}
+                for group, row in zip(shown.index, shown.itertuples(index=False))
+            ],
+            "truncated": len(shown) < group_count,
+        },
+    )
+
+
+def _stream_filter_in_range(
+    chunks: Iterator[pd.DataFrame],
+    filename: str,
+    column_name: str,
+    min_value: float,
+    max_value: float,
+) -> Tuple[Optional[pd.DataFrame], int, Optional[str]]:
+    """Chunked range filter that counts every match but keeps only the rows needed for output."""
+    retained = []
+    retained_rows = 0
+    row_count = 0
+    for chunk in chunks:
+        column, error = _get_column(chunk, filename, column_name, "filter_values_in_range")
+        if error:
+            return None, 0, error
+        matched = chunk[(column >= min_value) & (column <= max_value)]
+        row_count += len(matched)
+        # Enough rows for either the full result (<= 200 cells) or the 10-row preview.
+        keep_limit = max(10, 200 // max(1, chunk.shape[1]) + 1)
+        if retained_rows < keep_limit and len(matched):
+            retained.append(matched.head(keep_limit - retained_rows))
+            retained_rows += len(retained[-1])
+    filtered_df = pd.concat(retained) if retained else pd.DataFrame()
+    return filtered_df, row_count, None
+
+
 def filter_values_in_range_impl(
     filename: str,
     column_name: str,
@@ -569,16 +1026,27 @@ def filter_values_in_range_impl(
     Returns:
         str: A string representation of the rows that match the filter criteria.
     """
-    df, error = _get_spreadsheet(
-        filename, sheet_name=sheet_name, target_column=column_name
-    )
-    if error:
-        return error
-    column, error = _get_column(df, filename, column_name, "filter_values_in_range")
+    chunks, error = _get_csv_chunks(filename, None, "filter_values_in_range")
     if error:
         return error
-    filtered_df = df[(column >= min_value) & (column <= max_value)]
-    if len(filtered_df) == 0:
+    if chunks is not None:
+        filtered_df, row_count, error = _stream_filter_in_range(
+            chunks, filename, column_name, min_value, max_value
+        )
+        if error:
+            return error
+    else:
+        df, error = _get_spreadsheet(
+            filename, sheet_name=sheet_name, target_column=column_name
+        )
+        if error:
+            return error
+        column, error = _get_column(df, filename, column_name, "filter_values_in_range")
+        if error:
+            return error
+        filtered_df = df[(column >= min_value) & (column <= max_value)]
+        row_count = len(filtered_df)
+    if row_count == 0:
         return _tool_success(
             "filter_values_in_range",
             {
@@ -591,7 +1059,8 @@ def filter_values_in_range_impl(
                 "truncated": False,
             },
         )
-    if filtered_df.size > 200:
+    # Streamed results only retain the rows needed for output, so size from row_count.
+    if row_count * filtered_df.shape[1] > 200:
         reduced_df = _format_rows_for_output(
             filtered_df.head(min(10, len(filtered_df)))
         )
@@ -602,7 +1071,7 @@ def filter_values_in_range_impl(
                 "column": column_name,
                 "min_value": min_value,
                 "max_value": max_value,
-                "row_count": len(filtered_df),
+                "row_count": row_count,
                 "result": reduced_df.to_string(),
                 "truncated": True,
                 "message": "Use narrower range to reduce results.",
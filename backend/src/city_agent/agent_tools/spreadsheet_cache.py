@@ -0,0 +1,275 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SPREADSHEET_CACHE_MAX_BYTES = max(
+    0, int(os.getenv("SPREADSHEET_CACHE_MAX_BYTES", str(512 * 1024**2)))
+)
+# Columns whose distinct values hold more characters than this are searched by
+# scanning the distinct values instead of through a trigram index.
+SPREADSHEET_INDEX_MAX_CHARS = max(
+    0, int(os.getenv("SPREADSHEET_INDEX_MAX_CHARS", str(5 * 1024**2)))
+)
+_NGRAM_SIZE = 3
+# Set SPREADSHEET_COMPACT_DTYPES=0 to cache frames with the dtypes pandas parsed them with.
+SPREADSHEET_COMPACT_DTYPES = os.getenv("SPREADSHEET_COMPACT_DTYPES", "1") != "0"
+# Text columns with at most this share of distinct values are stored as categoricals.
+SPREADSHEET_CATEGORY_MAX_RATIO = float(os.getenv("SPREADSHEET_CATEGORY_MAX_RATIO", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+# Cached frames are handed out as shallow copies (see _read_only_view), which relies on
+# copy-on-write. It is always on from pandas 3; pandas 2 needs it switched on.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# (filename, sheet_name, version) -> {"frame": DataFrame, "bytes": int, "parsed_bytes": int,
+# "frame_bytes": int, "indexes": {column: index}}, least recently used first. "bytes" also
+# counts the indexes; "parsed_bytes" is the frame's size before compact_frame.
+_FRAME_CACHE: "OrderedDict[Tuple[str, Optional[str], Hashable], dict[str, Any]]" = (
+    OrderedDict()
+)
+_FRAME_CACHE_LOCK = threading.Lock()
+_frame_cache_state = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def _frame_size(frame: pd.DataFrame) -> int:
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def _compact_column(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(column) or isinstance(column.dtype, pd.CategoricalDtype):
+        return column
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast="integer")
+    if pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+        if pd.api.types.infer_dtype(column, skipna=True) != "string":
+            # e.g. booleans with blanks, which tools still sum and count as numbers.
+            return column
+        distinct = column.dropna().unique()
+        if len(distinct) > SPREADSHEET_CATEGORY_MAX_RATIO * len(column):
+            return column
+        return column.astype(pd.CategoricalDtype(sorted(distinct), ordered=True))
+    return column
+
+
+def compact_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Store a parsed frame in smaller dtypes without changing any value.
+
+    Repetitive text columns become ordered categoricals (ordered by value, so
+    min/max still compare text) and integers are downcast to the narrowest type that
+    holds them. Values and labels compare equal to the parsed frame. Float columns
+    are kept as they are: tools match and show their values as text, and "3.0"
+    must not turn into "3".
+    """
+    return pd.DataFrame(
+        {position: _compact_column(frame.iloc[:, position]) for position in range(frame.shape[1])},
+        index=frame.index,
+    ).set_axis(frame.columns, axis=1)
+
+
+def _read_only_view(frame: pd.DataFrame, key: tuple) -> pd.DataFrame:
+    """Hand out a shallow copy so tool code can never change the cached frame.
+
+    With copy-on-write (switched on above for pandas 2) any write to the copy, including
+    new columns and attrs, materializes new data instead of touching the original.
+    The cache key is kept in attrs so lookups can find indexes built for the frame.
+    """
+    view = frame.copy(deep=False)
+    view.attrs["cache_key"] = key
+    return view
+
+
+def _evict_locked() -> None:
+    while (
+        _frame_cache_state["bytes"] > SPREADSHEET_CACHE_MAX_BYTES
+        and len(_FRAME_CACHE) > 1
+    ):
+        _, entry = _FRAME_CACHE.popitem(last=False)
+        _frame_cache_state["bytes"] -= entry["bytes"]
+        _frame_cache_state["evictions"] += 1
+
+
+def get_cached_frame(
+    filename: str,
+    sheet_name: Optional[str],
+    version: Hashable,
+    loader: Callable[[], pd.DataFrame],
+) -> pd.DataFrame:
+    """Return the parsed frame for one file version and sheet, parsing it only on a miss.
+
+    Args:
+        filename (str): Storage path of the spreadsheet.
+        sheet_name (Optional[str]): Sheet name for XLSX files, None for CSV files.
+        version (Hashable): Identifies the file version, normally its last_updated value.
+        loader (Callable[[], pd.DataFrame]): Parses the sheet when it is not cached.
+    Returns:
+        pd.DataFrame: A read-only view of the cached frame.
+    """
+    key = (filename, sheet_name, version)
+    with _FRAME_CACHE_LOCK:
+        entry = _FRAME_CACHE.get(key)
+        if entry is not None:
+            _FRAME_CACHE.move_to_end(key)
+            _frame_cache_state["hits"] += 1
+            return _read_only_view(entry["frame"], key)
+        _frame_cache_state["misses"] += 1
+
+    # Parse outside the lock so slow workbooks do not block other tool calls.
+    frame = loader()
+    parsed_size = _frame_size(frame)
+    if SPREADSHEET_COMPACT_DTYPES:
+        frame = compact_frame(frame)
+    size = _frame_size(frame)
+    logger.info(
+        "Cached %s%s: %d bytes parsed, %d bytes compacted",
+        filename,
+        f" [{sheet_name}]" if sheet_name else "",
+        parsed_size,
+        size,
+    )
+    with _FRAME_CACHE_LOCK:
+        existing = _FRAME_CACHE.pop(key, None)
+        if existing is not None:
+            _frame_cache_state["bytes"] -= existing["bytes"]
+        _FRAME_CACHE[key] = {
+            "frame": frame,
+            "bytes": size,
+            "parsed_bytes": parsed_size,
+            "frame_bytes": size,
+            "indexes": {},
+        }
+        _frame_cache_state["bytes"] += size
+        _evict_locked()
+    return _read_only_view(frame, key)
+
+
+def _build_column_index(series: pd.Series) -> dict[str, Any]:
+    """Index the distinct case-folded values of a column.
+
+    Rows are mapped to distinct values through factorize codes, and each trigram
+    maps to the distinct values containing it, so a substring lookup only checks
+    the few values that share all of the keyword's trigrams.
+    """
+    codes, uniques = pd.factorize(series.astype(str))
+    folded = [str(value).upper() for value in uniques]
+    ngrams: Optional[dict[str, list[int]]] = None
+    if sum(len(value) for value in folded) <= SPREADSHEET_INDEX_MAX_CHARS:
+        ngrams = {}
+        for value_id, value in enumerate(folded):
+            grams = {value[i : i + _NGRAM_SIZE] for i in range(len(value) - _NGRAM_SIZE + 1)}
+            for gram in grams:
+                ngrams.setdefault(gram, []).append(value_id)
+    size = codes.nbytes + sum(len(value) + 49 for value in folded)
+    if ngrams is not None:
+        size += sum(len(ids) * 8 + 64 for ids in ngrams.values())
+    return {"codes": codes, "values": folded, "ngrams": ngrams, "bytes": size}
+
+
+def _match_value_ids(index: dict[str, Any], needle: str) -> np.ndarray:
+    values = index["values"]
+    ngrams = index["ngrams"]
+    if ngrams is None or len(needle) < _NGRAM_SIZE:
+        candidates = range(len(values))
+    else:
+        postings = [
+            ngrams.get(needle[i : i + _NGRAM_SIZE], [])
+            for i in range(len(needle) - _NGRAM_SIZE + 1)
+        ]
+        postings.sort(key=len)
+        candidate_set = set(postings[0])
+        for ids in postings[1:]:
+            if not candidate_set:
+                break
+            candidate_set.intersection_update(ids)
+        candidates = sorted(candidate_set)
+    matches = (value_id for value_id in candidates if needle in values[value_id])
+    return np.fromiter(matches, dtype=np.intp)
+
+
+def _get_column_index(key: tuple, frame: pd.DataFrame, column: Any) -> Optional[dict]:
+    """Return the lazily built index of a cached column, if `frame` is that cached frame."""
+    with _FRAME_CACHE_LOCK:
+        entry = _FRAME_CACHE.get(key)
+        if entry is None:
+            return None
+        cached = entry["frame"]
+        index = entry["indexes"].get(column)
+    if column not in cached.columns or len(frame) != len(cached):
+        return None
+    if not frame.index.equals(cached.index):
+        # A filtered or reordered frame no longer lines up with the cached rows.
+        return None
+    if index is not None:
+        return index
+
+    index = _build_column_index(cached[column])
+    with _FRAME_CACHE_LOCK:
+        if _FRAME_CACHE.get(key) is entry and column not in entry["indexes"]:
+            entry["indexes"][column] = index
+            entry["bytes"] += index["bytes"]
+            _frame_cache_state["bytes"] += index["bytes"]
+            _evict_locked()
+    return index
+
+
+def keyword_mask(frame: pd.DataFrame, columns: list, keyword: str) -> pd.Series:
+    """Rows where any of `columns` contains `keyword`, ignoring case.
+
+    Matches `frame[columns].astype(str).str.contains(keyword, case=False, regex=False)`
+    but answers from per-column indexes cached with the frame instead of scanning
+    every cell. Frames that are not straight from the cache fall back to a scan.
+    """
+    key = frame.attrs.get("cache_key")
+    needle = str(keyword).upper()
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        index = _get_column_index(key, frame, column) if key is not None else None
+        if index is None:
+            mask |= (
+                frame[column]
+                .astype(str)
+                .str.contains(keyword, case=False, na=False, regex=False)
+                .to_numpy(dtype=bool)
+            )
+            continue
+        mask |= np.isin(index["codes"], _match_value_ids(index, needle))
+    return pd.Series(mask, index=frame.index)
+
+
+def get_spreadsheet_cache_stats() -> dict:
+    """Return hit/miss counters and memory use of the parsed frame cache.
+
+    "files" lists each cached frame's size as parsed and as stored after compact_frame.
+    """
+    with _FRAME_CACHE_LOCK:
+        lookups = _frame_cache_state["hits"] + _frame_cache_state["misses"]
+        return {
+            "entries": len(_FRAME_CACHE),
+            "bytes": _frame_cache_state["bytes"],
+            "files": [
+                {
+                    "filename": filename,
+                    "sheet_name": sheet_name,
+                    "parsed_bytes": entry["parsed_bytes"],
+                    "compact_bytes": entry["frame_bytes"],
+                }
+                for (filename, sheet_name, _), entry in _FRAME_CACHE.items()
+            ],
+            "max_bytes": SPREADSHEET_CACHE_MAX_BYTES,
+            "hits": _frame_cache_state["hits"],
+            "misses": _frame_cache_state["misses"],
+            "evictions": _frame_cache_state["evictions"],
+            "hit_rate": _frame_cache_state["hits"] / lookups if lookups else 0.0,
+        }
+
+
+def clear_spreadsheet_cache() -> None:
+    with _FRAME_CACHE_LOCK:
+        _FRAME_CACHE.clear()
+        _frame_cache_state.update({"bytes": 0, "hits": 0, "misses": 0, "evictions": 0})
@@ -0,0 +1,95 @@
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any
+
+from openpyxl import load_workbook
+
+from src.file_cache import load_artifact_json, save_artifact_json
+
+MANIFEST_ARTIFACT = "manifest.json"
+
+
+def _dedup_headers(headers: list[str]) -> list[str]:
+    """Rename duplicate headers the way pandas does ("Cost", "Cost.1", ...)."""
+    counts: dict[str, int] = defaultdict(int)
+    deduped = []
+    for header in headers:
+        cur_count = counts[header]
+        while cur_count > 0:
+            counts[header] = cur_count + 1
+            header = f"{header}.{cur_count}"
+            cur_count = counts[header]
+        deduped.append(header)
+        counts[header] = cur_count + 1
+    return deduped
+
+
+def _scan_sheet(worksheet) -> dict[str, Any]:
+    """Read one sheet row by row, keeping only the header row and counters."""
+    header_row = None
+    width = 0
+    data_rows = 0
+    pending_empty_rows = 0
+    for row in worksheet.iter_rows(values_only=True):
+        filled = [idx for idx, value in enumerate(row) if value is not None and value != ""]
+        if header_row is None:
+            header_row = list(row)
+            width = max(width, filled[-1] + 1 if filled else 0)
+            continue
+        if not filled:
+            # pandas drops trailing empty rows but keeps empty rows between data rows.
+            pending_empty_rows += 1
+            continue
+        width = max(width, filled[-1] + 1)
+        data_rows += pending_empty_rows + 1
+        pending_empty_rows = 0
+
+    header_row = (header_row or [])[:width]
+    header_row += [None] * (width - len(header_row))
+    headers = [
+        f"Unnamed: {idx}" if value is None or value == "" else str(value)
+        for idx, value in enumerate(header_row)
+    ]
+    return {"headers": _dedup_headers(headers), "row_count": data_rows}
+
+
+def build_workbook_manifest(local_path: str) -> dict[str, Any]:
+    """Describe every sheet of a workbook in one streaming read-only pass.
+
+    Returns:
+        dict: sheet_names (in workbook order), row_counts and headers per sheet,
+            and column_sheets mapping each header to the first sheet containing it.
+    """
+    workbook = load_workbook(local_path, read_only=True, data_only=True)
+    try:
+        sheets = {
+            worksheet.title: _scan_sheet(worksheet) for worksheet in workbook.worksheets
+        }
+    finally:
+        workbook.close()
+
+    column_sheets: dict[str, str] = {}
+    for sheet_name, sheet in sheets.items():
+        for header in sheet["headers"]:
+            column_sheets.setdefault(header, sheet_name)
+    return {
+        "sheet_names": list(sheets),
+        "row_counts": {name: sheet["row_count"] for name, sheet in sheets.items()},
+        "headers": {name: sheet["headers"] for name, sheet in sheets.items()},
+        "column_sheets": column_sheets,
+    }
+
+
+@lru_cache(maxsize=128)
+def get_workbook_manifest(local_path: str) -> dict[str, Any]:
+    """Return the manifest of a cached workbook, building and persisting it on first use.
+
+    The manifest is stored next to the cached file, whose path is unique per file
+    version, so it is rebuilt only when a new version of the workbook is downloaded.
+    Callers must not modify the returned dict.
+    """
+    manifest = load_artifact_json(local_path, MANIFEST_ARTIFACT)
+    if manifest is None:
+        manifest = build_workbook_manifest(local_path)
+        save_artifact_json(local_path, MANIFEST_ARTIFACT, manifest)
+    return manifest
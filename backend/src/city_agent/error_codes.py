@@ -8,4 +8,5 @@ class ErrorCode(Enum):
     READ_FAILURE = "READ_FAILURE"
     FILE_NOT_FOUND = "FILE_NOT_FOUND"
     UNSUPPORTED_FILE_TYPE = "UNSUPPORTED_FILE_TYPE"
-    UNSUPPORTED_DOWNLOADED_TYPE = "UNSUPPORTED_DOWNLOADED_TYPE"
\ No newline at end of file
+    UNSUPPORTED_DOWNLOADED_TYPE = "UNSUPPORTED_DOWNLOADED_TYPE"
+    INVALID_ARGUMENT = "INVALID_ARGUMENT"
\ No newline at end of file
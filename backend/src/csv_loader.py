@@ -0,0 +1,196 @@
+import codecs
+import csv
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+
+from src.file_cache import is_cached_path, load_artifact_json, save_artifact_json
+
+SCHEMA_ARTIFACT = "schema.json"
+# Encodings tried in order. latin-1 maps every byte, so detection always succeeds.
+CSV_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+# Set CSV_PYARROW_ENGINE=0 to always parse with the single-threaded C engine.
+CSV_PYARROW_ENGINE = os.getenv("CSV_PYARROW_ENGINE", "1") != "0"
+_PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+_DETECT_BLOCK_BYTES = 1024**2
+_SCHEMA_MEMO_SIZE = 256
+
+# local_path -> schema, least recently used first.
+_SCHEMA_MEMO: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+_SCHEMA_MEMO_LOCK = threading.Lock()
+
+
+def _decodes_as(local_path: str, encoding: str) -> bool:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(local_path, "rb") as csv_file:
+            while block := csv_file.read(_DETECT_BLOCK_BYTES):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_csv_encoding(local_path: str) -> str:
+    """Return the first encoding in CSV_ENCODINGS that decodes the whole file.
+
+    A UTF-8 byte order mark selects "utf-8-sig" so the BOM does not end up in the
+    first header.
+    """
+    with open(local_path, "rb") as csv_file:
+        if csv_file.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+            return "utf-8-sig"
+    for encoding in CSV_ENCODINGS:
+        if _decodes_as(local_path, encoding):
+            return encoding
+    return CSV_ENCODINGS[-1]
+
+
+def _file_signature(local_path: str) -> list[int]:
+    stat = os.stat(local_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _raw_header(local_path: str, encoding: str) -> list[str]:
+    with open(local_path, "r", encoding=encoding, newline="") as csv_file:
+        return next(csv.reader(csv_file), [])
+
+
+def _load_schema(local_path: str) -> Optional[dict[str, Any]]:
+    """Return the persisted schema of a CSV file if it still matches the file on disk."""
+    signature = _file_signature(local_path)
+    with _SCHEMA_MEMO_LOCK:
+        schema = _SCHEMA_MEMO.get(local_path)
+        if schema is not None and schema["signature"] == signature:
+            _SCHEMA_MEMO.move_to_end(local_path)
+            return schema
+
+    if not is_cached_path(local_path):
+        return None
+    schema = load_artifact_json(local_path, SCHEMA_ARTIFACT)
+    if not isinstance(schema, dict) or schema.get("signature") != signature:
+        return None
+    _remember_schema(local_path, schema)
+    return schema
+
+
+def _remember_schema(local_path: str, schema: dict[str, Any]) -> None:
+    with _SCHEMA_MEMO_LOCK:
+        _SCHEMA_MEMO[local_path] = schema
+        _SCHEMA_MEMO.move_to_end(local_path)
+        while len(_SCHEMA_MEMO) > _SCHEMA_MEMO_SIZE:
+            _SCHEMA_MEMO.popitem(last=False)
+
+
+def _save_schema(local_path: str, schema: dict[str, Any]) -> None:
+    _remember_schema(local_path, schema)
+    # Only cached downloads get sidecar files; other paths are remembered in memory.
+    if is_cached_path(local_path):
+        save_artifact_json(local_path, SCHEMA_ARTIFACT, schema)
+
+
+def _new_schema(local_path: str, encoding: str, dtypes: dict[str, str]) -> dict[str, Any]:
+    return {
+        "signature": _file_signature(local_path),
+        "encoding": encoding,
+        "header": _raw_header(local_path, encoding),
+        "dtypes": dtypes,
+    }
+
+
+def _has_all_dtypes(schema: dict[str, Any]) -> bool:
+    # Streamed reads store the dtypes of the columns they read, which may be only some.
+    return len(schema["dtypes"]) == len(schema["header"])
+
+
+def get_csv_encoding(local_path: str) -> str:
+    """Return the encoding of a CSV file, detecting and storing it only if no schema is stored yet."""
+    schema = _load_schema(local_path)
+    if schema is not None:
+        return schema["encoding"]
+    encoding = detect_csv_encoding(local_path)
+    _save_schema(local_path, _new_schema(local_path, encoding, {}))
+    return encoding
+
+
+def _can_use_pyarrow(schema: dict[str, Any]) -> bool:
+    # The pyarrow engine neither renames duplicate headers nor names blank ones,
+    # so those files stay on the C engine to keep column names identical.
+    header = schema["header"]
+    return (
+        CSV_PYARROW_ENGINE
+        and _PYARROW_AVAILABLE
+        and all(header)
+        and len(set(header)) == len(header)
+        and list(schema["dtypes"]) == header
+    )
+
+
+def read_csv_file(local_path: str) -> pd.DataFrame:
+    """Parse a whole CSV file.
+
+    The first read detects the encoding and lets pandas infer column types, then
+    stores both next to the cached file version. Later reads pass the stored dtypes, which skips
+    inference, and use the multithreaded pyarrow engine when it is installed.
+    """
+    schema = _load_schema(local_path)
+    if schema is None or not _has_all_dtypes(schema):
+        encoding = schema["encoding"] if schema is not None else detect_csv_encoding(local_path)
+        frame = pd.read_csv(
+            local_path, encoding=encoding, dtype=schema["dtypes"] if schema is not None else None
+        )
+        _save_schema(
+            local_path,
+            _new_schema(
+                local_path,
+                encoding,
+                {str(column): str(dtype) for column, dtype in frame.dtypes.items()},
+            ),
+        )
+        return frame
+
+    engine = "pyarrow" if _can_use_pyarrow(schema) else "c"
+    return pd.read_csv(
+        local_path, encoding=schema["encoding"], dtype=schema["dtypes"], engine=engine
+    )
+
+
+def read_csv_header(local_path: str) -> pd.Index:
+    """Return the column names of a CSV file without parsing any rows."""
+    return pd.read_csv(local_path, encoding=get_csv_encoding(local_path), nrows=0).columns
+
+
+def iter_csv_chunks(
+    local_path: str, usecols: Optional[list], chunksize: int
+) -> Iterator[pd.DataFrame]:
+    """Stream a CSV file in chunks, with the stored dtypes of columns read before.
+
+    Chunked reads always use the C engine, which is the only one that supports chunksize.
+    Once the whole file has been streamed, the dtype of every column that was inferred
+    the same for all chunks, and so for the whole file, is stored for later reads.
+    """
+    encoding = get_csv_encoding(local_path)
+    schema = _load_schema(local_path)
+    known = dict(schema["dtypes"]) if schema is not None else {}
+    inferred: dict[str, Optional[str]] = {}
+    for chunk in pd.read_csv(
+        local_path,
+        encoding=encoding,
+        usecols=usecols,
+        dtype=known or None,
+        chunksize=chunksize,
+    ):
+        for column, dtype in chunk.dtypes.items():
+            column = str(column)
+            if column not in known and inferred.setdefault(column, str(dtype)) != str(dtype):
+                inferred[column] = None
+        yield chunk
+
+    agreed = {column: dtype for column, dtype in inferred.items() if dtype is not None}
+    if schema is not None and agreed:
+        _save_schema(local_path, dict(schema, dtypes={**known, **agreed}))
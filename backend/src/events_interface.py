@@ -11,6 +11,9 @@ class VectorizeEvent(TypedDict):
     chunks_to_create: NotRequired[int]
     chunks_embedded: NotRequired[int]
     total_chunks: NotRequired[int]
+    llm_calls_avoided: NotRequired[int]
+    pages_reused: NotRequired[int]
+    chunks_reused: NotRequired[int]
     detail: NotRequired[str]
 
 
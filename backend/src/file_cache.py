@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple
+
+FILE_CACHE_DIR = os.getenv("FILE_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "cityagent_file_cache"
+)
+FILE_CACHE_MAX_BYTES = max(0, int(os.getenv("FILE_CACHE_MAX_BYTES", str(1024**3))))
+# How long a (bucket, storage_path) -> last_updated lookup is trusted before the
+# documents table is queried again. Within this window repeat lookups do no network I/O.
+FILE_CACHE_VERSION_TTL_SECONDS = float(
+    os.getenv("FILE_CACHE_VERSION_TTL_SECONDS", "60")
+)
+# A file handed out by the cache is not evicted for this long, so tool threads can
+# finish reading it. Longer jobs pin the file instead (see pinned()).
+FILE_CACHE_LEASE_SECONDS = float(os.getenv("FILE_CACHE_LEASE_SECONDS", "300"))
+
+# Cache file name -> bytes of the file and its artifacts, ordered from least to most recently used.
+_FILE_CACHE: "OrderedDict[str, int]" = OrderedDict()
+# Cache file name -> artifact file name -> size in bytes.
+_ARTIFACT_SIZES: dict[str, dict[str, int]] = {}
+# Cache file name -> monotonic time it was last handed out.
+_LEASES: dict[str, float] = {}
+# Cache file name -> number of pinned() blocks using it.
+_PINS: dict[str, int] = {}
+# (bucket, storage_path) -> (local_path, last_updated, checked_at)
+_VERSION_CACHE: dict[Tuple[str, str], Tuple[str, Optional[str], float]] = {}
+_FILE_CACHE_LOCK = threading.Lock()
+_file_cache_state = {"loaded": False, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def _cache_dir() -> Path:
+    cache_dir = Path(FILE_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _is_cache_file(path: Path) -> bool:
+    """Cached objects are named <sha256><extension>; anything else is a sidecar artifact."""
+    return len(path.stem) == 64 and "." not in path.stem and path.is_file()
+
+
+def _artifact_owner(artifact_name: str) -> str:
+    """Artifacts are named <cache file name>.<artifact>, and cache file names <sha256><extension>."""
+    return ".".join(artifact_name.split(".")[:2])
+
+
+def _load_index_locked() -> None:
+    """Seed the LRU index from files and artifacts left on disk by a previous process."""
+    if _file_cache_state["loaded"]:
+        return
+    cache_dir = _cache_dir()
+    entries = []
+    artifacts = []
+    for path in cache_dir.iterdir():
+        if _is_cache_file(path):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.name, stat.st_size))
+        elif path.is_file() and not path.name.startswith(".partial-"):
+            artifacts.append(path)
+    for _, name, size in sorted(entries):
+        _FILE_CACHE[name] = size
+        _file_cache_state["bytes"] += size
+    for path in artifacts:
+        owner = _artifact_owner(path.name)
+        if owner in _FILE_CACHE:
+            size = path.stat().st_size
+            _ARTIFACT_SIZES.setdefault(owner, {})[path.name] = size
+            _FILE_CACHE[owner] += size
+            _file_cache_state["bytes"] += size
+    _file_cache_state["loaded"] = True
+
+
+def _forget_locked(name: str) -> None:
+    _file_cache_state["bytes"] -= _FILE_CACHE.pop(name)
+    _ARTIFACT_SIZES.pop(name, None)
+    _LEASES.pop(name, None)
+
+
+def _remove_cache_file(name: str) -> None:
+    cache_dir = Path(FILE_CACHE_DIR)
+    for path in [cache_dir / name, *cache_dir.glob(f"{name}.*")]:
+        try:
+            path.unlink()
+        except OSError:
+            # Windows can hold transient handles; the file is re-indexed on next start.
+            continue
+
+
+def _evict_locked(keep: str) -> None:
+    """Evict least recently used files until under budget, skipping files still in use.
+
+    The cache can stay over budget while every other file is pinned or leased.
+    """
+    now = time.monotonic()
+    for name in list(_FILE_CACHE):
+        if _file_cache_state["bytes"] <= FILE_CACHE_MAX_BYTES:
+            return
+        if (
+            name == keep
+            or _PINS.get(name)
+            or now - _LEASES.get(name, float("-inf")) < FILE_CACHE_LEASE_SECONDS
+        ):
+            continue
+        _forget_locked(name)
+        _file_cache_state["evictions"] += 1
+        _remove_cache_file(name)
+
+
+def version_cache_name(
+    bucket: str, storage_path: str, last_updated: str, extension: str
+) -> str:
+    """Name a cached object by its (bucket, storage_path, last_updated) version."""
+    key = f"{bucket}\x00{storage_path}\x00{last_updated}".encode("utf-8")
+    return hashlib.sha256(key).hexdigest() + extension
+
+
+def content_cache_name(file_bytes: bytes, extension: str) -> str:
+    """Name a cached object by a hash of its content."""
+    return hashlib.sha256(file_bytes).hexdigest() + extension
+
+
+def get_cached_file(name: str) -> Optional[str]:
+    """Return the local path of a cached object and mark it as recently used."""
+    with _FILE_CACHE_LOCK:
+        _load_index_locked()
+        path = Path(FILE_CACHE_DIR) / name
+        if name in _FILE_CACHE and path.exists():
+            _FILE_CACHE.move_to_end(name)
+            _LEASES[name] = time.monotonic()
+            _file_cache_state["hits"] += 1
+            return str(path)
+        if name in _FILE_CACHE:
+            _forget_locked(name)
+        _file_cache_state["misses"] += 1
+        return None
+
+
+def store_file(name: str, file_bytes: bytes) -> str:
+    """Write an object into the cache, evicting least recently used files over budget."""
+    cache_dir = _cache_dir()
+    path = cache_dir / name
+    # Write to a unique partial file first so concurrent readers never see a torn file.
+    fd, partial_path = tempfile.mkstemp(dir=cache_dir, prefix=".partial-")
+    with os.fdopen(fd, "wb") as partial_file:
+        partial_file.write(file_bytes)
+    os.replace(partial_path, path)
+
+    with _FILE_CACHE_LOCK:
+        _load_index_locked()
+        size = len(file_bytes) + sum(_ARTIFACT_SIZES.get(name, {}).values())
+        if name in _FILE_CACHE:
+            _file_cache_state["bytes"] -= _FILE_CACHE.pop(name)
+        _FILE_CACHE[name] = size
+        _file_cache_state["bytes"] += size
+        _LEASES[name] = time.monotonic()
+        _evict_locked(keep=name)
+    return str(path)
+
+
+def lookup_version(bucket: str, storage_path: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Return (local_path, last_updated) if the object's version was checked recently."""
+    with _FILE_CACHE_LOCK:
+        entry = _VERSION_CACHE.get((bucket, storage_path))
+        if not entry:
+            return None
+        local_path, last_updated, checked_at = entry
+        is_fresh = time.monotonic() - checked_at < FILE_CACHE_VERSION_TTL_SECONDS
+        name = Path(local_path).name
+        if not is_fresh or name not in _FILE_CACHE or not os.path.exists(local_path):
+            _VERSION_CACHE.pop((bucket, storage_path), None)
+            return None
+        _FILE_CACHE.move_to_end(name)
+        _LEASES[name] = time.monotonic()
+        _file_cache_state["hits"] += 1
+        return local_path, last_updated
+
+
+def remember_version(
+    bucket: str, storage_path: str, local_path: str, last_updated: Optional[str]
+) -> None:
+    with _FILE_CACHE_LOCK:
+        _VERSION_CACHE[(bucket, storage_path)] = (
+            local_path,
+            last_updated,
+            time.monotonic(),
+        )
+
+
+@contextmanager
+def pinned(local_path: str) -> Iterator[str]:
+    """Keep a cached file, and its artifacts, from being evicted while the block runs."""
+    name = Path(local_path).name
+    with _FILE_CACHE_LOCK:
+        _PINS[name] = _PINS.get(name, 0) + 1
+    try:
+        yield local_path
+    finally:
+        with _FILE_CACHE_LOCK:
+            _PINS[name] -= 1
+            if not _PINS[name]:
+                del _PINS[name]
+
+
+def artifact_path(local_path: str, artifact: str) -> str:
+    """Return the path of a derived artifact stored alongside a cached file version.
+
+    Artifacts share the cached file's lifetime: they are removed when it is evicted.
+    Writers call record_artifact() so artifacts count towards FILE_CACHE_MAX_BYTES.
+    """
+    return f"{local_path}.{artifact}"
+
+
+def record_artifact(local_path: str, artifact: str) -> None:
+    """Count a written artifact's size towards its cached file's entry, evicting others if over budget."""
+    if not is_cached_path(local_path):
+        return
+    name = Path(local_path).name
+    path = Path(artifact_path(local_path, artifact))
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return
+    with _FILE_CACHE_LOCK:
+        _load_index_locked()
+        if name not in _FILE_CACHE:
+            return
+        sizes = _ARTIFACT_SIZES.setdefault(name, {})
+        delta = size - sizes.get(path.name, 0)
+        sizes[path.name] = size
+        _FILE_CACHE[name] += delta
+        _file_cache_state["bytes"] += delta
+        _evict_locked(keep=name)
+
+
+def load_artifact_json(local_path: str, artifact: str) -> Optional[Any]:
+    """Return a JSON artifact stored alongside a cached file, or None if it is missing or unreadable."""
+    try:
+        with open(artifact_path(local_path, artifact), "r", encoding="utf-8") as artifact_file:
+            return json.load(artifact_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_artifact_json(local_path: str, artifact: str, data: Any) -> None:
+    """Atomically write a JSON artifact alongside a cached file.
+
+    Persisting artifacts is an optimization only, so write failures are ignored.
+    """
+    path = artifact_path(local_path, artifact)
+    try:
+        fd, partial_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=".partial-"
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as artifact_file:
+            json.dump(data, artifact_file)
+        os.replace(partial_path, path)
+    except OSError:
+        return
+    record_artifact(local_path, artifact)
+
+
+def is_cached_path(local_path: str) -> bool:
+    """Whether `local_path` lives in the cache directory, where each path is one file version."""
+    return Path(local_path).resolve().parent == Path(FILE_CACHE_DIR).resolve()
+
+
+def file_cache_stats() -> dict:
+    with _FILE_CACHE_LOCK:
+        return {
+            "entries": len(_FILE_CACHE),
+            "bytes": _file_cache_state["bytes"],
+            "max_bytes": FILE_CACHE_MAX_BYTES,
+            "hits": _file_cache_state["hits"],
+            "misses": _file_cache_state["misses"],
+            "evictions": _file_cache_state["evictions"],
+        }
+
+
+def clear_file_cache() -> None:
+    """Drop every cached object, its artifacts and all remembered versions."""
+    with _FILE_CACHE_LOCK:
+        _load_index_locked()
+        for name in list(_FILE_CACHE):
+            _remove_cache_file(name)
+        _FILE_CACHE.clear()
+        _ARTIFACT_SIZES.clear()
+        _LEASES.clear()
+        _VERSION_CACHE.clear()
+        _file_cache_state.update(
+            {"loaded": False, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+        )
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Optional, Tuple
+
+import pymupdf4llm
+
+# PyMuPDF is sometimes referred to as fitz so add a compatibility import
+try:
+    import pymupdf as fitz
+except Exception:
+    import fitz
+
+# PDF-to-markdown conversion is CPU bound and holds the GIL for seconds on large files,
+# so it runs in worker processes. Each worker is a single-process executor, so one
+# conversion can be stopped without affecting the others. Set PDF_CONVERSION_WORKERS=0
+# to convert in a thread of the calling process instead.
+PDF_CONVERSION_WORKERS = max(0, int(os.getenv("PDF_CONVERSION_WORKERS", "2")))
+# Pages converted per worker call by iter_pdf_pages_async.
+PDF_CONVERSION_PAGE_BATCH = max(1, int(os.getenv("PDF_CONVERSION_PAGE_BATCH", "16")))
+
+# Idle worker slots, as (executor, pid of its process); None marks a slot whose process
+# has not been started yet. The queue belongs to the event loop that created it, and is
+# created again if conversions start on another loop.
+_conversion_slots: "Optional[asyncio.Queue[Optional[Tuple[ProcessPoolExecutor, int]]]]" = None
+_conversion_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _convert(local_path: str, pages: Optional[list[int]]) -> list[dict[str, Any]]:
+    # Page chunks are defaultdicts with a lambda factory, which cannot be pickled back.
+    page_chunks = [
+        dict(page_chunk)
+        for page_chunk in pymupdf4llm.to_markdown(local_path, pages=pages, page_chunks=True)
+    ]
+    # Headings are detected across the pages converted together, so a page's markdown
+    # can change with the batch it is in; "text_hash" identifies the page regardless.
+    document = fitz.open(local_path)
+    try:
+        for page_chunk in page_chunks:
+            page = document[page_chunk["metadata"]["page_number"] - 1]
+            page_chunk["text_hash"] = hashlib.sha256(page.get_text().encode("utf-8")).hexdigest()
+    finally:
+        document.close()
+    return page_chunks
+
+
+def _page_count(local_path: str) -> int:
+    document = fitz.open(local_path)
+    try:
+        return int(document.page_count)
+    finally:
+        document.close()
+
+
+def _slots() -> "asyncio.Queue[Optional[Tuple[ProcessPoolExecutor, int]]]":
+    global _conversion_slots, _conversion_slots_loop
+    loop = asyncio.get_running_loop()
+    if _conversion_slots is None or _conversion_slots_loop is not loop:
+        _reset_conversion_workers()
+        _conversion_slots = asyncio.Queue()
+        for _ in range(PDF_CONVERSION_WORKERS):
+            _conversion_slots.put_nowait(None)
+        _conversion_slots_loop = loop
+    return _conversion_slots
+
+
+async def _start_worker() -> Tuple[ProcessPoolExecutor, int]:
+    # Spawned workers do not inherit the server's threads or open handles.
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # The executor cannot stop a running call, so keep the pid to stop its process.
+        pid = await asyncio.get_running_loop().run_in_executor(executor, os.getpid)
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    return executor, pid
+
+
+def _stop_worker(worker: Tuple[ProcessPoolExecutor, int]) -> None:
+    executor, pid = worker
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        # The process has already exited.
+        pass
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def convert_pdf_pages_async(
+    local_path: str, pages: Optional[list[int]] = None
+) -> list[dict[str, Any]]:
+    """Convert a PDF, or some of its 0-indexed pages, to pymupdf4llm page chunks without blocking the event loop.
+
+    Cancelling the awaiting task (e.g. when the client of a streaming response
+    disconnects) terminates the worker process running the conversion. If the worker
+    dies instead (e.g. killed for using too much memory), BrokenProcessPool is raised.
+    Either way its slot starts a fresh process on next use.
+    """
+    if PDF_CONVERSION_WORKERS == 0:
+        return await asyncio.to_thread(_convert, local_path, pages)
+
+    slots = _slots()
+    worker = await slots.get()
+    try:
+        if worker is None:
+            worker = await _start_worker()
+        return await asyncio.get_running_loop().run_in_executor(
+            worker[0], _convert, local_path, pages
+        )
+    except BrokenProcessPool:
+        if worker is not None:
+            worker[0].shutdown(wait=False)
+        worker = None
+        raise
+    except asyncio.CancelledError:
+        if worker is not None:
+            _stop_worker(worker)
+        worker = None
+        raise
+    finally:
+        slots.put_nowait(worker)
+
+
+async def iter_pdf_pages_async(
+    local_path: str, pages: Optional[list[int]] = None
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Convert a PDF, or some of its 0-indexed pages, PDF_CONVERSION_PAGE_BATCH pages at a time.
+
+    Each batch of page chunks is yielded as soon as it is converted, so callers can
+    start on the first pages of a large document while the rest is still converting.
+    """
+    if pages is None:
+        pages = list(range(await asyncio.to_thread(_page_count, local_path)))
+    for start in range(0, len(pages), PDF_CONVERSION_PAGE_BATCH):
+        yield await convert_pdf_pages_async(
+            local_path, pages[start : start + PDF_CONVERSION_PAGE_BATCH]
+        )
+
+
+def _reset_conversion_workers() -> None:
+    """Terminate idle conversion workers; busy ones finish and are kept."""
+    if _conversion_slots is None:
+        return
+    for _ in range(_conversion_slots.qsize()):
+        worker = _conversion_slots.get_nowait()
+        if worker is not None:
+            _stop_worker(worker)
+        _conversion_slots.put_nowait(None)
@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+# Importing pymupdf4llm switches PyMuPDF to its layout analysis, which changes what
+# find_tables() detects. Import it here too so worker processes match the server.
+import pymupdf4llm  # noqa: F401
+
+# PyMuPDF is sometimes referred to as fitz so add a compatibility import
+try:
+    import pymupdf as fitz
+except Exception:
+    import fitz
+
+from src.file_cache import is_cached_path, load_artifact_json, save_artifact_json
+from src.pdf_table_store import load_page_tables, save_page_tables
+
+TABLE_INDEX_ARTIFACT = "tables.json"
+# Table detection is CPU bound, so page ranges are scanned in worker processes.
+# Set PDF_TABLE_WORKERS=1 to scan in the calling thread.
+PDF_TABLE_WORKERS = max(1, int(os.getenv("PDF_TABLE_WORKERS", str(os.cpu_count() or 1))))
+# Documents shorter than this many pages per worker are scanned in the calling thread.
+PDF_TABLE_MIN_PAGES_PER_WORKER = max(
+    1, int(os.getenv("PDF_TABLE_MIN_PAGES_PER_WORKER", "8"))
+)
+
+_table_pool: Optional[ProcessPoolExecutor] = None
+_table_pool_lock = threading.Lock()
+
+
+def _table_sample(table: Any, table_idx: int) -> dict[str, Any]:
+    """Keep a small, JSON-safe preview so the LLM can choose the right page."""
+    try:
+        contents = table.to_pandas().head(2)
+        headers = [str(col) for col in list(contents.columns)]
+        rows = contents.fillna("").astype(str).values.tolist()
+    except Exception:
+        extracted = table.extract() or []
+        headers = [str(col) for col in (extracted[0] if extracted else [])]
+        rows = []
+        for row in extracted[1:3]:
+            rows.append([str(cell) if cell is not None else "" for cell in row])
+    return {"table_index": table_idx, "headers": headers, "rows": rows}
+
+
+def scan_page_tables(page: Any) -> list[dict[str, Any]]:
+    """Detect the tables on one PyMuPDF page and return a preview of each."""
+    table_finder = page.find_tables()
+    tables = list(table_finder.tables) if table_finder else []
+    return [_table_sample(table, table_idx) for table_idx, table in enumerate(tables, start=1)]
+
+
+def extract_table(table: Any) -> dict[str, Any]:
+    """Normalize PyMuPDF table output into header names and list[dict] rows."""
+    extracted = table.extract()
+    if not extracted:
+        return {"headers": [], "rows": []}
+
+    headers = [
+        str(header).strip() if header is not None and str(header).strip() else f"column_{idx + 1}"
+        for idx, header in enumerate(extracted[0])
+    ]
+    rows = [
+        {key: row[idx] if idx < len(row) else None for idx, key in enumerate(headers)}
+        for row in extracted[1:]
+    ]
+    return {"headers": headers, "rows": rows}
+
+
+def extract_page_tables(page: Any) -> list[dict[str, Any]]:
+    """Detect and fully extract the tables on one PyMuPDF page."""
+    table_finder = page.find_tables()
+    tables = list(table_finder.tables) if table_finder else []
+    return [extract_table(table) for table in tables]
+
+
+def _extract_page_list(local_path: str, page_indices: list[int]) -> list[tuple[int, list]]:
+    document = fitz.open(local_path)
+    try:
+        return [
+            (page_idx, extract_page_tables(document.load_page(page_idx)))
+            for page_idx in page_indices
+        ]
+    finally:
+        document.close()
+
+
+def _scan_page_range(local_path: str, start: int, stop: int) -> list[tuple[int, list]]:
+    """Scan pages [start, stop) with a document handle owned by the calling process."""
+    document = fitz.open(local_path)
+    try:
+        return [
+            (page_idx, scan_page_tables(document.load_page(page_idx)))
+            for page_idx in range(start, stop)
+        ]
+    finally:
+        document.close()
+
+
+def _get_table_pool() -> ProcessPoolExecutor:
+    global _table_pool
+    with _table_pool_lock:
+        if _table_pool is None:
+            # Spawned workers do not inherit the server's threads or open handles.
+            _table_pool = ProcessPoolExecutor(
+                max_workers=PDF_TABLE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _table_pool
+
+
+def _reset_table_pool() -> None:
+    global _table_pool
+    with _table_pool_lock:
+        if _table_pool is not None:
+            _table_pool.shutdown(wait=False, cancel_futures=True)
+        _table_pool = None
+
+
+def _page_ranges(page_count: int, workers: int) -> list[tuple[int, int]]:
+    # Several ranges per worker keep every core busy when table-heavy pages cluster.
+    range_count = min(workers * 4, max(1, page_count // PDF_TABLE_MIN_PAGES_PER_WORKER))
+    bounds = [page_count * i // range_count for i in range(range_count + 1)]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+
+def _scan_pages(local_path: str, page_count: int) -> list[tuple[int, list]]:
+    if PDF_TABLE_WORKERS == 1 or page_count < 2 * PDF_TABLE_MIN_PAGES_PER_WORKER:
+        return _scan_page_range(local_path, 0, page_count)
+    try:
+        pool = _get_table_pool()
+        futures = [
+            pool.submit(_scan_page_range, local_path, start, stop)
+            for start, stop in _page_ranges(page_count, PDF_TABLE_WORKERS)
+        ]
+        # Futures are collected in submission order, which keeps pages in order.
+        return [page for future in futures for page in future.result()]
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool next time.
+        _reset_table_pool()
+        return _scan_page_range(local_path, 0, page_count)
+
+
+def _extract_uncached(
+    local_path: str, page_indices: list[int], document: Any = None
+) -> dict[int, list]:
+    if PDF_TABLE_WORKERS == 1 or len(page_indices) < 2:
+        if document is not None:
+            return {
+                page_idx: extract_page_tables(document.load_page(page_idx))
+                for page_idx in page_indices
+            }
+        return dict(_extract_page_list(local_path, page_indices))
+    group_count = min(PDF_TABLE_WORKERS, len(page_indices))
+    groups = [page_indices[i::group_count] for i in range(group_count)]
+    try:
+        pool = _get_table_pool()
+        futures = [pool.submit(_extract_page_list, local_path, group) for group in groups]
+        return dict(page for future in futures for page in future.result())
+    except BrokenProcessPool:
+        _reset_table_pool()
+        return dict(_extract_page_list(local_path, page_indices))
+
+
+def extract_tables_on_pages(
+    local_path: str, page_indices: list[int], document: Any = None
+) -> list[tuple[int, list]]:
+    """Extract the tables on several 0-indexed pages, in the order given.
+
+    Pages extracted before are read from the table store. The rest are split across
+    the table process pool when there is more than one; a single page is read with
+    `document` (an open handle) when one is passed.
+
+    Returns:
+        list[tuple[int, list]]: (page index, extract_page_tables output) per page.
+    """
+    by_page = {}
+    for page_idx in page_indices:
+        stored = load_page_tables(local_path, page_idx)
+        if stored is not None:
+            by_page[page_idx] = stored
+    missing = [page_idx for page_idx in page_indices if page_idx not in by_page]
+    if missing:
+        extracted = _extract_uncached(local_path, missing, document)
+        for page_idx in missing:
+            save_page_tables(local_path, page_idx, extracted[page_idx])
+        by_page.update(extracted)
+    return [(page_idx, by_page[page_idx]) for page_idx in page_indices]
+
+
+def build_table_index(local_path: str) -> dict[str, Any]:
+    """Run table detection over every page of a PDF.
+
+    Long documents are split into page ranges scanned in parallel by a process
+    pool of PDF_TABLE_WORKERS workers, each opening its own document handle.
+
+    Returns:
+        dict: page_count, table_counts_by_page and table_content_samples, both keyed
+            by the 1-indexed page number as a string and holding only pages with tables.
+    """
+    document = fitz.open(local_path)
+    try:
+        page_count = int(document.page_count)
+    finally:
+        document.close()
+
+    table_counts_by_page: dict[str, int] = {}
+    table_content_samples: dict[str, list] = {}
+    for page_idx, samples in _scan_pages(local_path, page_count):
+        if samples:
+            table_counts_by_page[str(page_idx + 1)] = len(samples)
+            table_content_samples[str(page_idx + 1)] = samples
+    return {
+        "page_count": page_count,
+        "table_counts_by_page": table_counts_by_page,
+        "table_content_samples": table_content_samples,
+    }
+
+
+def get_table_index(local_path: str) -> dict[str, Any]:
+    """Return the table index of a PDF, detecting tables only the first time a version is seen.
+
+    Cached downloads keep the index next to the file, so it survives restarts and is
+    dropped with the file version. Callers must not modify the returned dict.
+    """
+    if is_cached_path(local_path):
+        table_index = load_artifact_json(local_path, TABLE_INDEX_ARTIFACT)
+        if table_index is not None:
+            return table_index
+    table_index = build_table_index(local_path)
+    if is_cached_path(local_path):
+        save_artifact_json(local_path, TABLE_INDEX_ARTIFACT, table_index)
+    return table_index
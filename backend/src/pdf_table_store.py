@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+from src.file_cache import artifact_path, is_cached_path, record_artifact
+
+
+def _page_artifact(page_idx: int) -> str:
+    return f"page_{page_idx + 1}.tables.json.gz"
+
+
+def _to_columns(table: dict[str, Any]) -> dict[str, Any]:
+    headers = table["headers"]
+    return {
+        "headers": headers,
+        "columns": [[row.get(header) for row in table["rows"]] for header in headers],
+    }
+
+
+def _from_columns(stored: dict[str, Any]) -> dict[str, Any]:
+    headers = stored["headers"]
+    return {
+        "headers": headers,
+        "rows": [dict(zip(headers, values)) for values in zip(*stored["columns"])],
+    }
+
+
+def load_page_tables(local_path: str, page_idx: int) -> Optional[list[dict[str, Any]]]:
+    """Return the stored tables of a 0-indexed page, or None if the page was never extracted.
+
+    An empty list means the page was extracted and has no tables.
+    """
+    if not is_cached_path(local_path):
+        return None
+    try:
+        path = artifact_path(local_path, _page_artifact(page_idx))
+        with gzip.open(path, "rt", encoding="utf-8") as store:
+            return [_from_columns(stored) for stored in json.load(store)]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_page_tables(local_path: str, page_idx: int, tables: list[dict[str, Any]]) -> None:
+    """Store the extracted tables of a 0-indexed page column by column, gzip-compressed.
+
+    Each table keeps its header list and one value list per column, which is much
+    smaller than row dicts repeating every header. Only cached downloads are stored.
+    """
+    if not is_cached_path(local_path):
+        return
+    path = artifact_path(local_path, _page_artifact(page_idx))
+    try:
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".partial-")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as store:
+            json.dump([_to_columns(table) for table in tables], store)
+        os.replace(partial_path, path)
+    except OSError:
+        # Persisting is an optimization only; the page is extracted again next time.
+        return
+    record_artifact(local_path, _page_artifact(page_idx))
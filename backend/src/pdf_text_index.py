@@ -0,0 +1,115 @@
+import re
+from typing import Any
+
+# PyMuPDF is sometimes referred to as fitz so add a compatibility import
+try:
+    import pymupdf as fitz
+except Exception:
+    import fitz
+
+from src.file_cache import is_cached_path, load_artifact_json, save_artifact_json
+
+TEXT_INDEX_ARTIFACT = "text_index.json"
+_TOKEN_PATTERN = re.compile(r"\w+")
+_SNIPPET_CONTEXT_CHARS = 80
+_MAX_SNIPPETS_PER_PAGE = 3
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _normalize_space(text: str) -> str:
+    return " ".join(text.split())
+
+
+def build_text_index(local_path: str) -> dict[str, Any]:
+    """Index the words of every page of a PDF's text layer.
+
+    Returns:
+        dict: page_count, pages (whitespace-normalized text per page, used for
+            phrase checks and snippets) and postings mapping each lower-cased word
+            to the 0-indexed pages containing it, in page order.
+    """
+    document = fitz.open(local_path)
+    try:
+        pages = [_normalize_space(page.get_text("text")) for page in document]
+    finally:
+        document.close()
+
+    postings: dict[str, list[int]] = {}
+    for page_idx, text in enumerate(pages):
+        for token in set(tokenize(text)):
+            postings.setdefault(token, []).append(page_idx)
+    return {"page_count": len(pages), "pages": pages, "postings": postings}
+
+
+def get_text_index(local_path: str) -> dict[str, Any]:
+    """Return the text index of a PDF, building it only the first time a version is seen."""
+    if is_cached_path(local_path):
+        text_index = load_artifact_json(local_path, TEXT_INDEX_ARTIFACT)
+        if text_index is not None:
+            return text_index
+    text_index = build_text_index(local_path)
+    if is_cached_path(local_path):
+        save_artifact_json(local_path, TEXT_INDEX_ARTIFACT, text_index)
+    return text_index
+
+
+def _snippets(text: str, needles: list[str]) -> list[str]:
+    lowered = text.lower()
+    spans = []
+    for needle in needles:
+        start = lowered.find(needle)
+        while start != -1 and len(spans) < _MAX_SNIPPETS_PER_PAGE:
+            if not any(lo <= start < hi for lo, hi in spans):
+                spans.append(
+                    (
+                        max(0, start - _SNIPPET_CONTEXT_CHARS),
+                        min(len(text), start + len(needle) + _SNIPPET_CONTEXT_CHARS),
+                    )
+                )
+            start = lowered.find(needle, start + len(needle))
+        if spans:
+            break
+    snippets = []
+    for lo, hi in sorted(spans):
+        snippet = text[lo:hi]
+        snippets.append(f"{'...' if lo > 0 else ''}{snippet}{'...' if hi < len(text) else ''}")
+    return snippets
+
+
+def search_text_index(text_index: dict[str, Any], query: str) -> list[dict[str, Any]]:
+    """Find the pages containing every word of `query`, best matches first.
+
+    Pages containing the whole query as a phrase rank above pages that only contain
+    its words, then pages with more occurrences rank higher; ties keep page order.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    postings = text_index["postings"]
+    candidate_lists = sorted((postings.get(token, []) for token in tokens), key=len)
+    if not candidate_lists or not candidate_lists[0]:
+        return []
+    candidates = set(candidate_lists[0])
+    for page_list in candidate_lists[1:]:
+        candidates.intersection_update(page_list)
+
+    phrase = _normalize_space(query).lower()
+    matches = []
+    for page_idx in sorted(candidates):
+        text = text_index["pages"][page_idx]
+        lowered = text.lower()
+        is_phrase = phrase in lowered
+        occurrences = lowered.count(phrase) if is_phrase else sum(
+            lowered.count(token) for token in tokens
+        )
+        matches.append(
+            {
+                "page_num": page_idx + 1,
+                "phrase_match": is_phrase,
+                "match_count": occurrences,
+                "snippets": _snippets(text, [phrase] if is_phrase else tokens),
+            }
+        )
+    matches.sort(key=lambda match: (not match["phrase_match"], -match["match_count"]))
+    return matches
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Optional
+
+# Classifications are kept across restarts and uploads, so they live outside the file cache.
+EXCEL_CLASSIFICATION_CACHE_DIR = os.getenv("EXCEL_CLASSIFICATION_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "cityagent_excel_classifications"
+)
+# Also key entries by each column's dtype kind, so e.g. a column that turns from
+# free text into numeric codes is classified again.
+EXCEL_CLASSIFICATION_CACHE_DTYPES = os.getenv(
+    "EXCEL_CLASSIFICATION_CACHE_DTYPES", "false"
+).strip().lower() in ("1", "true", "yes", "on")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_header(header: str) -> str:
+    """Compare headers without case or whitespace differences: " Road  Name" == "road name"."""
+    return _WHITESPACE.sub(" ", header).strip().casefold()
+
+
+def header_signature(headers: list[str], dtype_kinds: Optional[list[str]] = None) -> Optional[str]:
+    """Identify a sheet schema by its set of normalized headers, and optionally their dtype kinds.
+
+    Returns None when two headers normalize to the same name, since a cached
+    classification could not tell them apart.
+    """
+    names = [normalize_header(header) for header in headers]
+    if len(set(names)) != len(names):
+        return None
+    if dtype_kinds is not None:
+        names = [f"{name}:{kind}" for name, kind in zip(names, dtype_kinds)]
+    return hashlib.sha256(json.dumps(sorted(names)).encode("utf-8")).hexdigest()[:24]
+
+
+def _entry_path(signature: str) -> str:
+    return os.path.join(EXCEL_CLASSIFICATION_CACHE_DIR, f"{signature}.json")
+
+
+def load_classification(signature: str, headers: list[str]) -> Optional[dict[str, dict[int, str]]]:
+    """Return the cached page_content/metadata split for a sheet with these headers.
+
+    The split is rebuilt for `headers` as the agent would have answered for them:
+    {"page_content": {index: header}, "metadata": {index: header}}, with indices into
+    `headers` and page content columns in the order the agent first returned them.
+    """
+    try:
+        with open(_entry_path(signature), "r", encoding="utf-8") as entry_file:
+            entry = json.load(entry_file)
+    except (OSError, ValueError):
+        return None
+    positions = {normalize_header(header): idx for idx, header in enumerate(headers)}
+    return {
+        kind: {
+            positions[name]: headers[positions[name]]
+            for name in entry[kind]
+            if name in positions
+        }
+        for kind in ("page_content", "metadata")
+    }
+
+
+def save_classification(
+    signature: str, headers: list[str], parsed: dict[str, dict[int, str]]
+) -> None:
+    """Store an agent classification. Caching is an optimization only, so write failures are ignored."""
+    entry = {
+        "signature": signature,
+        "headers": headers,
+        "page_content": [normalize_header(header) for header in parsed["page_content"].values()],
+        "metadata": [normalize_header(header) for header in parsed["metadata"].values()],
+        "created": time.time(),
+    }
+    try:
+        os.makedirs(EXCEL_CLASSIFICATION_CACHE_DIR, exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(dir=EXCEL_CLASSIFICATION_CACHE_DIR, prefix=".partial-")
+        with os.fdopen(fd, "w", encoding="utf-8") as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(partial_path, _entry_path(signature))
+    except OSError:
+        pass
+
+
+def list_classifications() -> list[dict[str, Any]]:
+    """Return every cached entry, most recent first."""
+    entries = []
+    try:
+        names = os.listdir(EXCEL_CLASSIFICATION_CACHE_DIR)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(EXCEL_CLASSIFICATION_CACHE_DIR, name), "r", encoding="utf-8") as entry_file:
+                entries.append(json.load(entry_file))
+        except (OSError, ValueError):
+            continue
+    return sorted(entries, key=lambda entry: entry.get("created", 0), reverse=True)
+
+
+def invalidate_classification(signature: str) -> bool:
+    """Drop one cached classification so the next upload with that schema asks the agent again.
+
+    Returns:
+        bool: False if no entry had that signature.
+    """
+    try:
+        os.remove(_entry_path(signature))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def clear_classification_cache() -> int:
+    """Drop every cached classification and return how many were removed."""
+    return sum(
+        invalidate_classification(entry["signature"]) for entry in list_classifications()
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.rag_pipeline.excel_classification_cache",
+        description="Inspect or invalidate cached spreadsheet column classifications.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show cached schemas and their page content columns")
+    invalidate = commands.add_parser("invalidate", help="drop the entries with these signatures")
+    invalidate.add_argument("signatures", nargs="+")
+    commands.add_parser("clear", help="drop every entry")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for entry in list_classifications():
+            print(
+                f"{entry['signature']}  {time.ctime(entry.get('created', 0))}  "
+                f"page_content={entry['page_content']}  headers={entry['headers']}"
+            )
+    elif args.command == "invalidate":
+        for signature in args.signatures:
+            found = invalidate_classification(signature)
+            print(f"{signature}: {'invalidated' if found else 'not cached'}")
+    else:
+        print(f"Removed {clear_classification_cache()} cached classifications")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Optional, TypedDict
+
+# Encoding used to count tokens; o200k_base matches the gpt-oss models in ai_api_selector.
+PDF_CHUNK_TOKENIZER = os.getenv("PDF_CHUNK_TOKENIZER", "o200k_base")
+# Share of the agent context window filled by one chunk. The agent echoes the chunk
+# back as content_body, so the rest is needed for its instructions and output.
+PDF_CHUNK_FILL_RATIO = float(os.getenv("PDF_CHUNK_FILL_RATIO", "0.25"))
+# A heading closes the current chunk once it is at least this full, keeping sections together.
+_HEADING_BREAK_FILL = 0.5
+
+_HEADING = re.compile(r"^#{1,6}\s")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class MarkdownChunk(TypedDict):
+    text: str
+    pages: list[int]
+    tokens: int
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Optional[Any]:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(PDF_CHUNK_TOKENIZER)
+    except Exception:
+        # tiktoken missing, or its BPE file cannot be downloaded (e.g. offline).
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the local tokenizer, or estimate 1 token per 4 characters without it."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def page_content_hash(page_chunk: dict[str, Any]) -> str:
+    """Identify the content of one page chunk.
+
+    Uses the hash of the page's plain text recorded by pdf_conversion, which does not
+    depend on the conversion batch, and falls back to hashing the chunk's markdown.
+    """
+    if page_chunk.get("text_hash"):
+        return page_chunk["text_hash"]
+    return hashlib.sha256(page_chunk.get("text", "").encode("utf-8")).hexdigest()
+
+
+def get_chunk_target_tokens(ctx_window_size: int) -> int:
+    return max(1, int(ctx_window_size * PDF_CHUNK_FILL_RATIO))
+
+
+def _split_blocks(markdown: str) -> list[tuple[str, str]]:
+    """Split page markdown into ("heading" | "table" | "text", block) pieces.
+
+    Tables are runs of lines starting with "|"; text blocks are separated by blank lines.
+    """
+    blocks = []
+    current: list[str] = []
+    current_kind = "text"
+
+    def flush() -> None:
+        if current and "".join(current).strip():
+            blocks.append((current_kind, "\n".join(current).strip("\n")))
+        current.clear()
+
+    for line in markdown.splitlines():
+        if _HEADING.match(line):
+            flush()
+            blocks.append(("heading", line.strip()))
+            current_kind = "text"
+        elif _TABLE_ROW.match(line):
+            if current_kind != "table":
+                flush()
+                current_kind = "table"
+            current.append(line)
+        elif not line.strip():
+            flush()
+            current_kind = "text"
+        else:
+            if current_kind == "table":
+                flush()
+                current_kind = "text"
+            current.append(line)
+    flush()
+    return blocks
+
+
+def _split_table(table: str, target_tokens: int, count: Callable[[str], int]) -> list[str]:
+    """Split a markdown table between rows, repeating its header in every piece."""
+    lines = table.split("\n")
+    header_len = 2 if len(lines) > 1 and _TABLE_SEPARATOR.match(lines[1]) else 1
+    header, rows = lines[:header_len], lines[header_len:]
+    pieces, piece = [], list(header)
+    for row in rows:
+        if len(piece) > header_len and count("\n".join(piece + [row])) > target_tokens:
+            pieces.append("\n".join(piece))
+            piece = list(header)
+        piece.append(row)
+    pieces.append("\n".join(piece))
+    return pieces
+
+
+def _split_text(text: str, target_tokens: int, count: Callable[[str], int]) -> list[str]:
+    """Split prose between sentences, and a single oversized sentence between words."""
+    units = _SENTENCE_END.split(text)
+    if len(units) == 1:
+        units = text.split(" ")
+    pieces, piece = [], ""
+    for unit in units:
+        candidate = f"{piece} {unit}" if piece else unit
+        if piece and count(candidate) > target_tokens:
+            pieces.append(piece)
+            candidate = unit
+        piece = candidate
+    pieces.append(piece)
+    if len(pieces) == 1 and len(units) == 1:
+        return pieces
+    return [
+        part
+        for piece in pieces
+        for part in (
+            _split_text(piece, target_tokens, count) if count(piece) > target_tokens else [piece]
+        )
+    ]
+
+
+class MarkdownChunker:
+    """Incremental form of chunk_markdown_pages: pages are fed one at a time and every
+    call returns the chunks that page closed, so a document is never held whole."""
+
+    def __init__(self, target_tokens: int):
+        self.target_tokens = target_tokens
+        self._closed: list[MarkdownChunk] = []
+        self._parts: list[str] = []
+        self._pages: list[int] = []
+        self._tokens = 0
+        self._last_heading: Optional[str] = None
+        self._page_count = 0
+
+    def _close(self) -> None:
+        if self._parts:
+            self._closed.append(
+                {"text": "\n\n".join(self._parts), "pages": self._pages, "tokens": self._tokens}
+            )
+        self._parts, self._pages, self._tokens = [], [], 0
+
+    def _add(self, block: str, block_tokens: int, page_num: int) -> None:
+        if not self._parts and self._last_heading is not None and block != self._last_heading:
+            self._parts.append(self._last_heading)
+            self._tokens += count_tokens(self._last_heading)
+        self._parts.append(block)
+        self._tokens += block_tokens
+        if page_num not in self._pages:
+            self._pages.append(page_num)
+
+    def _take_closed(self) -> list[MarkdownChunk]:
+        closed, self._closed = self._closed, []
+        return closed
+
+    def add_page(self, page_chunk: dict[str, Any]) -> list[MarkdownChunk]:
+        """Add the next page chunk and return the chunks it completed."""
+        self._page_count += 1
+        page_num = page_chunk.get("metadata", {}).get("page_number", self._page_count)
+        for kind, block in _split_blocks(page_chunk.get("text", "")):
+            block_tokens = count_tokens(block)
+            if kind == "heading":
+                if self._tokens >= self.target_tokens * _HEADING_BREAK_FILL:
+                    self._close()
+                self._last_heading = block
+            if block_tokens > self.target_tokens:
+                split = _split_table if kind == "table" else _split_text
+                pieces = split(block, self.target_tokens, count_tokens)
+            else:
+                pieces = [block]
+            for piece in pieces:
+                piece_tokens = block_tokens if len(pieces) == 1 else count_tokens(piece)
+                if self._parts and self._tokens + piece_tokens > self.target_tokens:
+                    self._close()
+                self._add(piece, piece_tokens, page_num)
+        return self._take_closed()
+
+    def finish(self) -> list[MarkdownChunk]:
+        """Close and return the last, partly filled chunk."""
+        self._close()
+        return self._take_closed()
+
+
+def chunk_markdown_pages(
+    page_chunks: list[dict[str, Any]], target_tokens: int
+) -> list[MarkdownChunk]:
+    """Pack pymupdf4llm page chunks into LLM requests of up to target_tokens tokens.
+
+    Pages are split into heading, table and text blocks that are never cut in the
+    middle; blocks are packed greedily in reading order, and a heading starts a new
+    chunk once the current one is half full. Only blocks larger than the whole budget
+    are split: tables between rows with their header repeated, text between sentences.
+    A chunk that starts inside a section is prefixed with the section's heading.
+
+    Args:
+        page_chunks (list[dict]): pymupdf4llm.to_markdown(..., page_chunks=True) output.
+        target_tokens (int): Token budget of one chunk.
+    Returns:
+        list[MarkdownChunk]: Chunks in reading order, with their 1-indexed pages and token count.
+    """
+    chunker = MarkdownChunker(target_tokens)
+    chunks = [chunk for page_chunk in page_chunks for chunk in chunker.add_page(page_chunk)]
+    return chunks + chunker.finish()
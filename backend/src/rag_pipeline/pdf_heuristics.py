@@ -0,0 +1,71 @@
+import os
+import re
+from typing import Any
+
+# pymupdf4llm layout box classes the LLM is still needed for.
+_COMPLEX_BOX_CLASSES = {"table", "picture", "formula"}
+_MARKDOWN_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$", re.MULTILINE)
+_MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\(|==> picture")
+_HEADING = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+# First matching keyword wins, so more specific areas come first.
+_SERVICE_AREA_KEYWORDS = (
+    ("Water", ("wastewater", "stormwater", "water", "sewer", "watermain")),
+    ("Transportation", ("road", "bridge", "transit", "traffic", "sidewalk", "culvert", "pavement")),
+    ("Facilities", ("facility", "facilities", "building", "arena", "library")),
+    ("Parks", ("park", "trail", "playground", "recreation")),
+    ("Fleet", ("fleet", "vehicle", "equipment")),
+)
+_DATA_TYPE_KEYWORDS = (
+    ("Financial", ("$", "budget", "cost", "funding", "revenue", "expenditure", "reinvestment")),
+    ("Condition", ("condition", "rating", "deterioration", "assessment")),
+    ("Inventory", ("inventory", "quantity", "number of", "length of")),
+    ("Risk", ("risk", "consequence", "likelihood")),
+    ("Levels of Service", ("level of service", "levels of service")),
+)
+
+
+def is_text_only_page(page_chunk: dict[str, Any]) -> bool:
+    """Return True if a pymupdf4llm page chunk has no tables, pictures or formulas.
+
+    Uses the layout boxes when pymupdf4llm reports them and the markdown otherwise.
+    """
+    boxes = page_chunk.get("page_boxes")
+    if boxes:
+        if any(box.get("class") in _COMPLEX_BOX_CLASSES for box in boxes):
+            return False
+    text = page_chunk.get("text", "")
+    return not (_MARKDOWN_TABLE_ROW.search(text) or _MARKDOWN_IMAGE.search(text))
+
+
+def _first_keyword_match(text: str, keywords: tuple, default: str) -> str:
+    lowered = text.lower()
+    for label, words in keywords:
+        if any(word in lowered for word in words):
+            return label
+    return default
+
+
+def heuristic_metadata(chunk_text: str, filepath: str) -> dict[str, str]:
+    """Fill the PDF_Vectorization_Agent metadata fields without an LLM call.
+
+    The topic is the chunk's first heading, or the file name when it has none; service
+    area and data type are picked by keyword from the headings, then the whole chunk.
+    """
+    source_file = os.path.basename(filepath)
+    headings = [match.strip("*_ ") for match in _HEADING.findall(chunk_text)]
+    title = os.path.splitext(source_file)[0].replace("_", " ").replace("-", " ").strip()
+    topic = headings[0] if headings else title
+    context = " ".join(headings + [title])
+    return {
+        "source_file": source_file,
+        "service_area": _first_keyword_match(
+            context, _SERVICE_AREA_KEYWORDS,
+            _first_keyword_match(chunk_text, _SERVICE_AREA_KEYWORDS, "Citywide"),
+        ),
+        "topic": topic,
+        "data_type": _first_keyword_match(
+            context, _DATA_TYPE_KEYWORDS,
+            _first_keyword_match(chunk_text, _DATA_TYPE_KEYWORDS, "General"),
+        ),
+    }
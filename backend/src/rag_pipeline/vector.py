@@ -2,16 +2,18 @@ import os
 import json
 import re
 import time
-import gc
 import asyncio
 from pathlib import Path
 
 from supabase import Client
 
+from src import file_cache
 from src.events_interface import make_event
 from src.rag_pipeline.vectorize_excel import vectorize_excel
-from src.rag_pipeline.vectorize_pdf import vectorize_pdf
+from src.rag_pipeline.vectorize_pdf import PDF_PIPELINE_QUEUE_SIZE, vectorize_pdf
+from src.rag_pipeline.vectorize_checkpoint import VectorizeCheckpoint
 from src.ai_api_selector import get_embedding_model
+from src.pdf_table_index import get_table_index
 from src.supabase_interface import get_supabase_client, download_supabase_file
 
 _embedding_model = None
@@ -22,22 +24,8 @@ SUPABASE_INSERT_MAX_RETRIES = max(1, int(os.getenv("SUPABASE_INSERT_MAX_RETRIES"
 SUPABASE_INSERT_BASE_BACKOFF_SECONDS = float(
     os.getenv("SUPABASE_INSERT_BASE_BACKOFF_SECONDS", "2")
 )
-
-
-def _safe_remove_temp_file(path: str, retries: int = 20, delay_seconds: float = 0.25):
-    for attempt in range(retries):
-        try:
-            os.remove(path)
-            return True
-        except PermissionError:
-            # Windows can hold transient file handles briefly (Pandas/openpyxl/http stack).
-            gc.collect()
-            if attempt == retries - 1:
-                print(
-                    f"Warning: could not delete temporary file after {retries} attempts: {path}"
-                )
-                return False
-            time.sleep(delay_seconds)
+# PostgREST returns at most 1000 rows per request by default.
+SUPABASE_SELECT_PAGE_SIZE = 1000
 
 
 def get_embedding_model_cached():
@@ -112,13 +100,12 @@ def _build_vector_payload(
     source_bucket_col,
     embedding_col,
     write_embeddings,
+    chunk_embeddings=None,
 ):
-    chunk_texts = [doc.page_content for doc in chunk_docs]
-    chunk_embeddings = (
-        _embed_documents_with_retry(chunk_texts)
-        if write_embeddings and embedding_col
-        else None
-    )
+    if chunk_embeddings is None and write_embeddings and embedding_col:
+        chunk_embeddings = _embed_documents_with_retry(
+            [doc.page_content for doc in chunk_docs]
+        )
 
     payload = []
     for idx, (doc, _id) in enumerate(zip(chunk_docs, chunk_ids)):
@@ -141,83 +128,227 @@ def _build_vector_payload(
     return payload
 
 
-async def add_documents_to_vector_store(documents, ids):
-    """Insert chunked documents into Supabase and yield progress events without blocking the event loop."""
-    if not documents:
-        return
+def _vector_store_settings() -> dict:
+    return {
+        "table_name": os.getenv("SUPABASE_VECTOR_TABLE", "documents"),
+        "content_col": os.getenv("SUPABASE_CONTENT_COLUMN", "content"),
+        "metadata_col": os.getenv("SUPABASE_METADATA_COLUMN", "metadata"),
+        "id_col": os.getenv("SUPABASE_ID_COLUMN", "id"),
+        "source_last_updated_col": os.getenv(
+            "SUPABASE_SOURCE_LAST_UPDATED_COLUMN", "source_last_updated"
+        ),
+        "source_filename_col": os.getenv(
+            "SUPABASE_SOURCE_FILENAME_COLUMN", "source_filename"
+        ),
+        "source_bucket_col": os.getenv("SUPABASE_SOURCE_BUCKET_COLUMN", "source_bucket"),
+        "embedding_col": os.getenv("SUPABASE_EMBEDDING_COLUMN", "embedding"),
+        "write_embeddings": os.getenv(
+            "SUPABASE_WRITE_EMBEDDINGS", "true"
+        ).strip().lower() in ("1", "true", "yes", "on"),
+        "insert_batch_size": int(os.getenv("SUPABASE_INSERT_BATCH_SIZE", "50")),
+    }
 
-    table_name = os.getenv("SUPABASE_VECTOR_TABLE", "documents")
-    content_col = os.getenv("SUPABASE_CONTENT_COLUMN", "content")
-    metadata_col = os.getenv("SUPABASE_METADATA_COLUMN", "metadata")
-    id_col = os.getenv("SUPABASE_ID_COLUMN", "id")
-    source_last_updated_col = os.getenv(
-        "SUPABASE_SOURCE_LAST_UPDATED_COLUMN", "source_last_updated"
-    )
-    source_filename_col = os.getenv(
-        "SUPABASE_SOURCE_FILENAME_COLUMN", "source_filename"
-    )
-    source_bucket_col = os.getenv("SUPABASE_SOURCE_BUCKET_COLUMN", "source_bucket")
-    embedding_col = os.getenv("SUPABASE_EMBEDDING_COLUMN", "embedding")
-    write_embeddings = os.getenv(
-        "SUPABASE_WRITE_EMBEDDINGS", "true"
-    ).strip().lower() in ("1", "true", "yes", "on")
-    insert_batch_size = int(os.getenv("SUPABASE_INSERT_BATCH_SIZE", "50"))
 
-    client = get_supabase_client()
-    total_chunks = len(documents)
-    completed = 0
+async def _store_document_batch(client, settings, chunk_docs, chunk_ids, start_idx, checkpoint=None):
+    """Embed and insert one batch of documents, yielding the number of rows stored by each insert.
+
+    With a VectorizeCheckpoint, documents it records as inserted are skipped, recorded
+    embeddings are reused, and new embeddings and inserts are recorded.
+    """
+    # Documents inserted by an earlier attempt count towards the first progress step.
+    skipped = 0
+    if checkpoint is not None:
+        pending = [
+            (doc, _id) for doc, _id in zip(chunk_docs, chunk_ids) if _id not in checkpoint.inserted
+        ]
+        skipped = len(chunk_docs) - len(pending)
+        if not pending:
+            yield skipped
+            return
+        chunk_docs = [doc for doc, _ in pending]
+        chunk_ids = [_id for _, _id in pending]
 
-    for i in range(0, total_chunks, insert_batch_size):
-        chunk_docs = documents[i : i + insert_batch_size]
-        chunk_ids = ids[i : i + insert_batch_size]
-        payload = await asyncio.to_thread(
-            _build_vector_payload,
-            chunk_docs,
-            chunk_ids,
-            content_col,
-            metadata_col,
-            id_col,
-            source_filename_col,
-            source_last_updated_col,
-            source_bucket_col,
-            embedding_col,
-            write_embeddings,
+    chunk_embeddings = None
+    if settings["write_embeddings"] and settings["embedding_col"] and checkpoint is not None:
+        if all(_id in checkpoint.embeddings for _id in chunk_ids):
+            chunk_embeddings = [checkpoint.embeddings[_id] for _id in chunk_ids]
+        else:
+            chunk_embeddings = await asyncio.to_thread(
+                _embed_documents_with_retry,
+                [doc.page_content for doc in chunk_docs],
+            )
+            checkpoint.record_embeddings(chunk_ids, chunk_embeddings)
+
+    payload = await asyncio.to_thread(
+        _build_vector_payload,
+        chunk_docs,
+        chunk_ids,
+        settings["content_col"],
+        settings["metadata_col"],
+        settings["id_col"],
+        settings["source_filename_col"],
+        settings["source_last_updated_col"],
+        settings["source_bucket_col"],
+        settings["embedding_col"],
+        settings["write_embeddings"],
+        chunk_embeddings,
+    )
+
+    try:
+        await asyncio.to_thread(
+            _insert_rows_with_retry,
+            client,
+            settings["table_name"],
+            payload,
+            start_idx,
+            len(chunk_docs),
         )
+        if checkpoint is not None:
+            checkpoint.record_inserted(chunk_ids)
+        yield skipped + len(chunk_docs)
 
-        try:
+    except Exception:
+        # degrade to row-by-row and still report progress
+        for row_idx, row in enumerate(payload):
             await asyncio.to_thread(
                 _insert_rows_with_retry,
                 client,
-                table_name,
-                payload,
-                i,
-                len(chunk_docs),
+                settings["table_name"],
+                [row],
+                start_idx + row_idx,
+                1,
             )
-            completed += len(chunk_docs)
+            if checkpoint is not None:
+                checkpoint.record_inserted([chunk_ids[row_idx]])
+            yield 1 + (skipped if row_idx == 0 else 0)
+
 
+async def add_documents_to_vector_store(documents, ids, checkpoint=None):
+    """Insert chunked documents into Supabase and yield progress events without blocking the event loop.
+
+    With a VectorizeCheckpoint, documents it records as inserted are skipped, recorded
+    embeddings are reused, and every new batch of embeddings and inserts is recorded.
+    """
+    if not documents:
+        return
+
+    settings = _vector_store_settings()
+    insert_batch_size = settings["insert_batch_size"]
+    client = get_supabase_client()
+    total_chunks = len(documents)
+    completed = 0
+
+    for i in range(0, total_chunks, insert_batch_size):
+        async for stored in _store_document_batch(
+            client,
+            settings,
+            documents[i : i + insert_batch_size],
+            ids[i : i + insert_batch_size],
+            i,
+            checkpoint,
+        ):
+            completed += stored
             yield make_event(
                 "embedding",
                 message=f"Embedding ({completed}/{total_chunks})",
                 chunks_embedded=completed,
             )
 
-        except Exception:
-            # degrade to row-by-row and still report progress
-            for row_idx, row in enumerate(payload):
-                await asyncio.to_thread(
-                    _insert_rows_with_retry,
-                    client,
-                    table_name,
-                    [row],
-                    i + row_idx,
-                    1,
-                )
-                completed += 1
-                yield make_event(
-                    "embedding",
-                    message=f"Embedding ({completed}/{total_chunks})",
-                    chunks_embedded=completed,
+
+async def _forward_items(items, item_queue: asyncio.Queue) -> None:
+    try:
+        async for item in items:
+            await item_queue.put(item)
+        await item_queue.put(None)
+    finally:
+        # Stops the generator's own stages when the consumer goes away.
+        await items.aclose()
+
+
+async def _vectorize_pdf_into_vector_store(
+    local_path, checkpoint, existing_rows, source_metadata, file_path
+):
+    """Run vectorize_pdf and store its documents while later chunks are still being structured.
+
+    vectorize_pdf feeds a queue of at most PDF_PIPELINE_QUEUE_SIZE items; documents are
+    embedded and inserted as soon as a batch of SUPABASE_INSERT_BATCH_SIZE is ready, so
+    the first chunks are searchable before the rest of the PDF is converted.
+
+    Yields:
+        Chunking and embedding events, then {"type": "result", "ids", "reused_row_ids",
+        "llm_calls_avoided", "pages_reused", "page_hashes"} with the ids of every stored document.
+    """
+    settings = _vector_store_settings()
+    insert_batch_size = settings["insert_batch_size"]
+    client = None
+    item_queue: asyncio.Queue = asyncio.Queue(maxsize=PDF_PIPELINE_QUEUE_SIZE)
+    producer = asyncio.create_task(
+        _forward_items(vectorize_pdf(local_path, checkpoint, existing_rows), item_queue)
+    )
+    batch_docs, batch_ids, ids = [], [], []
+    completed = 0
+    result = None
+
+    async def store_batch():
+        nonlocal client, completed, batch_docs, batch_ids
+        if client is None:
+            client = get_supabase_client()
+        docs, batch = batch_docs, batch_ids
+        batch_docs, batch_ids = [], []
+        async for stored in _store_document_batch(
+            client, settings, docs, batch, len(ids) - len(batch), checkpoint
+        ):
+            completed += stored
+            yield make_event(
+                "embedding",
+                message=f"Embedding ({completed}/{len(ids)})",
+                file_path=file_path,
+                chunks_embedded=completed,
+                total_chunks=len(ids),
+            )
+
+    try:
+        while True:
+            if producer.done():
+                # Re-raises a vectorize_pdf failure; otherwise the end marker is queued.
+                producer.result()
+                item = await item_queue.get()
+            else:
+                get_item = asyncio.ensure_future(item_queue.get())
+                done, _ = await asyncio.wait(
+                    {get_item, producer}, return_when=asyncio.FIRST_COMPLETED
                 )
+                if get_item not in done:
+                    get_item.cancel()
+                    continue
+                item = get_item.result()
+            if item is None:
+                break
+            if item["type"] == "documents":
+                for doc in item["documents"]:
+                    doc.metadata.update(source_metadata)
+                batch_docs.extend(item["documents"])
+                batch_ids.extend(item["ids"])
+                ids.extend(item["ids"])
+                if len(batch_docs) >= insert_batch_size:
+                    async for event in store_batch():
+                        yield event
+            elif item["type"] == "result":
+                result = item
+            else:
+                yield item
+        if batch_docs:
+            async for event in store_batch():
+                yield event
+    finally:
+        producer.cancel()
+
+    yield {**result, "ids": ids}
+
+
+def _report_table_index_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Building the PDF table index failed: {task.exception()}")
 
 
 def delete_vector_from_vector_store(storage_location: str, bucket: str | None):
@@ -250,6 +381,94 @@ def delete_vector_from_vector_store(storage_location: str, bucket: str | None):
     }
 
 
+def _fetch_existing_page_hashes(file_path: str, bucket: str) -> dict:
+    """Return vector row id -> page_hashes metadata (None if absent) for one storage object."""
+    table_name = os.getenv("SUPABASE_VECTOR_TABLE", "documents")
+    metadata_col = os.getenv("SUPABASE_METADATA_COLUMN", "metadata")
+    id_col = os.getenv("SUPABASE_ID_COLUMN", "id")
+    source_filename_col = os.getenv(
+        "SUPABASE_SOURCE_FILENAME_COLUMN", "source_filename"
+    )
+    source_bucket_col = os.getenv("SUPABASE_SOURCE_BUCKET_COLUMN", "source_bucket")
+    if not id_col or not source_filename_col:
+        return {}
+
+    client = get_supabase_client()
+    rows = {}
+    start = 0
+    while True:
+        query = (
+            client.table(table_name)
+            .select(f"{id_col},{metadata_col}")
+            .eq(source_filename_col, file_path)
+        )
+        if source_bucket_col:
+            query = query.eq(source_bucket_col, bucket)
+        page = query.range(start, start + SUPABASE_SELECT_PAGE_SIZE - 1).execute().data or []
+        for row in page:
+            rows[str(row[id_col])] = (row.get(metadata_col) or {}).get("page_hashes")
+        if len(page) < SUPABASE_SELECT_PAGE_SIZE:
+            return rows
+        start += SUPABASE_SELECT_PAGE_SIZE
+
+
+def _locate_pages(row_hashes: list[str], pages_by_hash: dict[str, list[int]]) -> list[int]:
+    page_numbers = []
+    for page_hash in row_hashes:
+        pages = pages_by_hash[page_hash]
+        # A repeated page (e.g. a blank one) is matched to its first copy after the previous page.
+        later = [page_num for page_num in pages if not page_numbers or page_num > page_numbers[-1]]
+        page_numbers.append(later[0] if later else pages[0])
+    return page_numbers
+
+
+def _refresh_reused_rows(
+    row_ids: list[str], page_hashes: dict[int, str], last_updated: str | None
+) -> None:
+    """Update rows kept from an earlier version of a PDF to describe the new version.
+
+    Unchanged pages can move (e.g. when a page is inserted before them), so each row's
+    page_numbers is looked up again from its page_hashes, and source_last_updated is set
+    to the new version's.
+    """
+    settings = _vector_store_settings()
+    table_name, metadata_col, id_col = (
+        settings["table_name"], settings["metadata_col"], settings["id_col"]
+    )
+    pages_by_hash: dict[str, list[int]] = {}
+    for page_num in sorted(page_hashes):
+        pages_by_hash.setdefault(page_hashes[page_num], []).append(page_num)
+
+    client = get_supabase_client()
+    for i in range(0, len(row_ids), SUPABASE_SELECT_PAGE_SIZE):
+        rows = (
+            client.table(table_name)
+            .select(f"{id_col},{metadata_col}")
+            .in_(id_col, row_ids[i : i + SUPABASE_SELECT_PAGE_SIZE])
+            .execute()
+            .data
+            or []
+        )
+        for row in rows:
+            metadata = dict(row.get(metadata_col) or {})
+            metadata["page_numbers"] = _locate_pages(metadata.get("page_hashes") or [], pages_by_hash)
+            metadata["source_last_updated"] = last_updated
+            update = {metadata_col: metadata}
+            if settings["source_last_updated_col"]:
+                update[settings["source_last_updated_col"]] = last_updated
+            client.table(table_name).update(update).eq(id_col, row[id_col]).execute()
+
+
+def _delete_rows(row_ids: list[str]) -> None:
+    table_name = os.getenv("SUPABASE_VECTOR_TABLE", "documents")
+    id_col = os.getenv("SUPABASE_ID_COLUMN", "id")
+    client = get_supabase_client()
+    for i in range(0, len(row_ids), SUPABASE_SELECT_PAGE_SIZE):
+        client.table(table_name).delete().in_(
+            id_col, row_ids[i : i + SUPABASE_SELECT_PAGE_SIZE]
+        ).execute()
+
+
 def _is_transient_insert_error(error_text: str) -> bool:
     lower = error_text.lower()
     return (
@@ -290,31 +509,96 @@ def _insert_rows_with_retry(
 async def vectorize_and_store_supabase_file(
     storage_location: str, bucket: str | None = None
 ):
-    """Download from Supabase Storage, vectorize, then upsert into pgvector."""
-    temp_path, bucket_name, file_path, last_updated = download_supabase_file(
-        storage_location, bucket
+    """Download from Supabase Storage, vectorize, then upsert into pgvector.
+
+    PDFs are streamed: chunks are embedded and inserted while later pages are still
+    being converted and structured (see _vectorize_pdf_into_vector_store).
+
+    For a new version of a PDF, rows of the previous version whose pages are all
+    unchanged are kept (with their page numbers and source_last_updated moved to the
+    new version) and only changed or new pages are vectorized; the other rows
+    of the previous version are deleted once the new rows are inserted.
+    """
+    # Always re-check the version: the object was likely just uploaded or replaced.
+    # The local copy stays in the file cache so later tool calls reuse it.
+    local_path, bucket_name, file_path, last_updated = download_supabase_file(
+        storage_location, bucket, revalidate=True
     )
+    # Jobs outlive the cache lease, so keep the file from being evicted until they end.
+    with file_cache.pinned(local_path):
+        async for event in _vectorize_and_store_local_file(
+            local_path, bucket_name, file_path, last_updated
+        ):
+            yield event
+
+
+async def _vectorize_and_store_local_file(local_path, bucket_name, file_path, last_updated):
     extension = Path(file_path).suffix.lower()
+    # Re-submitting the same path and version resumes from this job's checkpoint.
+    checkpoint = VectorizeCheckpoint(bucket_name, file_path, last_updated or local_path)
 
-    try:
-        yield make_event(
-            "chunking",
-            message="Chunking",
-            file_path=file_path,
+    yield make_event(
+        "chunking",
+        message="Chunking",
+        file_path=file_path,
+    )
+
+    table_index_task = None
+    if extension == ".pdf":
+        # Detect tables for get_pdf_info while the text is chunked, so the tool
+        # only has to look the persisted index up.
+        table_index_task = asyncio.create_task(
+            asyncio.to_thread(get_table_index, local_path)
         )
+        table_index_task.add_done_callback(_report_table_index_failure)
 
-        if extension == ".pdf":
-            documents = None
-            ids = None
+    # Rows stored for an earlier version of this PDF, with the page hashes they were built from.
+    existing_rows = {}
+    if extension == ".pdf":
+        existing_rows = await asyncio.to_thread(
+            _fetch_existing_page_hashes, file_path, bucket_name
+        )
 
-            async for item in vectorize_pdf(temp_path):
-                if item["type"] == "result":
-                    documents = item["documents"]
-                    ids = item["ids"]
-                else:
-                    yield item
+    source_metadata = {
+        "source_bucket": bucket_name,
+        "source_filename": file_path,
+        "source_last_updated": last_updated,
+    }
+    summary = {}
+    reused_row_ids = []
+    page_hashes = {}
+    if extension == ".pdf":
+        # Rows this job inserted before it was interrupted are its own, not an earlier version's.
+        existing_rows = {
+            row_id: row_hashes
+            for row_id, row_hashes in existing_rows.items()
+            if row_id not in checkpoint.inserted
+        }
+        ids = []
+        async for item in _vectorize_pdf_into_vector_store(
+            local_path, checkpoint, existing_rows, source_metadata, file_path
+        ):
+            if item["type"] == "result":
+                ids = item["ids"]
+                reused_row_ids = item["reused_row_ids"]
+                page_hashes = item["page_hashes"]
+                summary["llm_calls_avoided"] = item["llm_calls_avoided"]
+                summary["pages_reused"] = item["pages_reused"]
+                summary["chunks_reused"] = len(reused_row_ids)
+            else:
+                yield item
+        if not ids and not reused_row_ids:
+            raise RuntimeError(
+                "Vectorization produced zero chunks. Verify source file content/columns."
+            )
+        total_chunks = len(ids)
+    else:
+        if checkpoint.documents is not None:
+            documents, ids = checkpoint.documents
         else:
-            documents, ids = await vectorize_excel(temp_path)
+            documents, ids = await vectorize_excel(local_path)
+            if documents:
+                checkpoint.record_documents(documents, ids)
 
         if not documents or not ids:
             raise RuntimeError(
@@ -324,11 +608,7 @@ async def vectorize_and_store_supabase_file(
         total_chunks = len(ids)
 
         for doc in documents:
-            doc.metadata["source_bucket"] = bucket_name
-            doc.metadata["source_filename"] = file_path
-            doc.metadata["source_last_updated"] = last_updated
-
-        print(f"Vectorization complete for {file_path}. Total chunks: {total_chunks}")
+            doc.metadata.update(source_metadata)
 
         yield make_event(
             "embedding",
@@ -338,7 +618,7 @@ async def vectorize_and_store_supabase_file(
             total_chunks=total_chunks,
         )
 
-        async for event in add_documents_to_vector_store(documents, ids):
+        async for event in add_documents_to_vector_store(documents, ids, checkpoint):
             yield make_event(
                 event["type"],
                 message=event.get("message"),
@@ -347,14 +627,33 @@ async def vectorize_and_store_supabase_file(
                 total_chunks=total_chunks,
             )
 
-        yield make_event(
-            "success",
-            message="Fully vectorized",
-            file_path=file_path,
-            chunks_embedded=total_chunks,
-            total_chunks=total_chunks,
+    print(f"Vectorization complete for {file_path}. Total chunks: {total_chunks}")
+    if summary.get("llm_calls_avoided"):
+        print(f"LLM calls avoided for {file_path}: {summary['llm_calls_avoided']}")
+    if summary.get("pages_reused"):
+        print(
+            f"Unchanged pages reused for {file_path}: {summary['pages_reused']} "
+            f"({summary['chunks_reused']} existing chunks kept)"
         )
 
-    finally:
-        if os.path.exists(temp_path):
-            _safe_remove_temp_file(temp_path)
+    if reused_row_ids:
+        await asyncio.to_thread(_refresh_reused_rows, reused_row_ids, page_hashes, last_updated)
+
+    # Rows of earlier versions are dropped only once the new rows are searchable.
+    kept_ids = set(reused_row_ids) | set(ids)
+    stale_ids = [row_id for row_id in existing_rows if row_id not in kept_ids]
+    if stale_ids:
+        await asyncio.to_thread(_delete_rows, stale_ids)
+
+    if table_index_task is not None:
+        await asyncio.wait([table_index_task])
+    checkpoint.complete()
+
+    yield make_event(
+        "success",
+        message="Fully vectorized",
+        file_path=file_path,
+        chunks_embedded=total_chunks,
+        total_chunks=total_chunks,
+        **summary,
+    )
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from typing import Any, Optional
+
+from langchain_core.documents import Document
+
+# Checkpoints must outlive the file cache, whose entries can be evicted mid-job.
+VECTORIZE_CHECKPOINT_DIR = os.getenv("VECTORIZE_CHECKPOINT_DIR") or os.path.join(
+    tempfile.gettempdir(), "cityagent_vectorize_checkpoints"
+)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:24]
+
+
+def chunk_digest(chunk_text: str) -> str:
+    """Identify a chunk by its text, so a resumed job only reuses output for identical chunks."""
+    return _digest(chunk_text)
+
+
+class VectorizeCheckpoint:
+    """Append-only JSONL record of one vectorization job: a storage path at one version.
+
+    Every completed step is appended and fsynced as one line, so a job that fails part
+    way can be re-submitted and resume after the last completed step:
+
+    - {"kind": "chunk", ...}: one structured PDF chunk returned by the LLM.
+    - {"kind": "documents", ...}: the full spreadsheet document list, written once
+      vectorization ends. PDF documents are streamed to the vector table instead and
+      rebuilt from their chunks.
+    - {"kind": "embedded", ...}: the embeddings of a batch of documents, by document id.
+    - {"kind": "inserted", ...}: ids of documents inserted into the vector table.
+
+    The file is deleted when the job succeeds. Opening a job for a new version of the
+    same path discards checkpoints of older versions.
+    """
+
+    def __init__(self, bucket: str, file_path: str, version: Any):
+        os.makedirs(VECTORIZE_CHECKPOINT_DIR, exist_ok=True)
+        path_key = _digest(f"{bucket}/{file_path}")
+        self.path = os.path.join(
+            VECTORIZE_CHECKPOINT_DIR, f"{path_key}-{_digest(str(version))}.jsonl"
+        )
+        for name in os.listdir(VECTORIZE_CHECKPOINT_DIR):
+            stale = os.path.join(VECTORIZE_CHECKPOINT_DIR, name)
+            if name.startswith(f"{path_key}-") and stale != self.path:
+                os.remove(stale)
+
+        self.chunks: dict[int, tuple[str, Optional[dict]]] = {}
+        self.documents: Optional[tuple[list[Document], list[str]]] = None
+        self.embeddings: dict[str, list[float]] = {}
+        self.inserted: set[str] = set()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as checkpoint_file:
+                lines = checkpoint_file.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write leaves at most one truncated last line.
+                continue
+            kind = record.get("kind")
+            if kind == "chunk":
+                self.chunks[record["index"]] = (record["digest"], record["object"])
+            elif kind == "documents":
+                self.documents = (
+                    [
+                        Document(page_content=doc["page_content"], metadata=doc["metadata"], id=doc["id"])
+                        for doc in record["documents"]
+                    ],
+                    record["ids"],
+                )
+            elif kind == "embedded":
+                self.embeddings.update(zip(record.get("ids", []), record["embeddings"]))
+            elif kind == "inserted":
+                self.inserted.update(record.get("ids", []))
+
+    def _append(self, record: dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(json.dumps(record, default=str) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+    def document_id(self, index: int, digest: str) -> str:
+        """Return a stable vector row id for a PDF chunk, so a resumed job recognizes its own rows."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.path}#{index}:{digest}"))
+
+    def get_chunk(self, index: int, digest: str) -> tuple[bool, Optional[dict]]:
+        """Return (found, structured output) of a chunk completed by an earlier attempt."""
+        stored = self.chunks.get(index)
+        if stored is None or stored[0] != digest:
+            return False, None
+        return True, stored[1]
+
+    def record_chunk(self, index: int, digest: str, knowledge_object: Optional[dict]) -> None:
+        self.chunks[index] = (digest, knowledge_object)
+        self._append({"kind": "chunk", "index": index, "digest": digest, "object": knowledge_object})
+
+    def record_documents(self, documents: list[Document], ids: list[str]) -> None:
+        self.documents = (documents, ids)
+        self._append(
+            {
+                "kind": "documents",
+                "documents": [
+                    {"page_content": doc.page_content, "metadata": doc.metadata, "id": doc.id}
+                    for doc in documents
+                ],
+                "ids": ids,
+            }
+        )
+
+    def record_embeddings(self, ids: list[str], embeddings: list[list[float]]) -> None:
+        self.embeddings.update(zip(ids, embeddings))
+        self._append({"kind": "embedded", "ids": ids, "embeddings": embeddings})
+
+    def record_inserted(self, ids: list[str]) -> None:
+        self.inserted.update(ids)
+        self._append({"kind": "inserted", "ids": ids})
+
+    def complete(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -6,8 +6,16 @@ from google.genai import types
 from google.adk.sessions import InMemorySessionService
 from langchain_core.documents import Document
 import json, re, pandas as pd, asyncio
+import numpy as np
 import uuid
 from src.ai_api_selector import get_agent_model
+from src.csv_loader import read_csv_file
+from src.rag_pipeline.excel_classification_cache import (
+    EXCEL_CLASSIFICATION_CACHE_DTYPES,
+    header_signature,
+    load_classification,
+    save_classification,
+)
 
 # from ai_api_selector import get_agent_model
 
@@ -76,7 +84,10 @@ async def _vectorize(df: pd.DataFrame, filepath: str):
     1. Loading the file into a pandas DataFrame (CSV or XLSX).
     2. Filtering headers to English-only with `_is_english_header`.
     3. Sending `indexed_headers` and a small set of `sample_rows` to the
-    4. Parsing the agent response and building one `Document` per row using
+       agent, unless a sheet with the same headers was classified before
+       (see excel_classification_cache).
+    4. Parsing the agent response and grouping the rows into `Document`s of
+       EXCEL_ROWS_PER_VECTOR rows with `_build_row_documents`.
     Args:
         df (pd.DataFrame): The pandas DataFrame to vectorize.
         filepath (str): The file path of the source file, used for metadata.
@@ -86,21 +97,34 @@ async def _vectorize(df: pd.DataFrame, filepath: str):
             - ids (list[str]): List of corresponding document IDs as UUID strings.
     """
 
-    documents = []
-    ids = []
-
     raw_headers = [h for h in df.columns.tolist() if _is_english_header(h)]
-    indexed_headers = dict(enumerate(raw_headers))
-    sample_rows = df.head(5).to_dict(orient="records")
-
-    query = (
-        "{headers:" + str(indexed_headers) + " sample_rows: " + str(sample_rows) + "}"
+    dtype_kinds = (
+        [dtype.kind for h, dtype in df.dtypes.items() if _is_english_header(h)]
+        if EXCEL_CLASSIFICATION_CACHE_DTYPES
+        else None
     )
-    agent_response = await call_agent(runner, agent, SESSION_ID, query)
+    # Sheets sharing a schema (e.g. a monthly export) reuse the first classification.
+    signature = header_signature(raw_headers, dtype_kinds)
+    parsed = load_classification(signature, raw_headers) if signature else None
 
-    parsed = json.loads(agent_response)
-    parsed["page_content"] = {int(k): v for k, v in parsed["page_content"].items()}
-    parsed["metadata"] = {int(k): v for k, v in parsed["metadata"].items()}
+    if parsed is not None:
+        print(
+            f"Reusing cached column classification {signature} for {os.path.basename(filepath)}"
+        )
+    else:
+        indexed_headers = dict(enumerate(raw_headers))
+        sample_rows = df.head(5).to_dict(orient="records")
+
+        query = (
+            "{headers:" + str(indexed_headers) + " sample_rows: " + str(sample_rows) + "}"
+        )
+        agent_response = await call_agent(runner, agent, SESSION_ID, query)
+
+        parsed = json.loads(agent_response)
+        parsed["page_content"] = {int(k): v for k, v in parsed["page_content"].items()}
+        parsed["metadata"] = {int(k): v for k, v in parsed["metadata"].items()}
+        if signature:
+            save_classification(signature, raw_headers, parsed)
 
     page_content_columns = list(parsed["page_content"].values())
     metadata_columns = set(parsed["metadata"].values())
@@ -112,55 +136,103 @@ async def _vectorize(df: pd.DataFrame, filepath: str):
             candidate_columns = raw_headers[: min(5, len(raw_headers))]
         page_content_columns = candidate_columns
 
-    cur_count = EXCEL_ROWS_PER_VECTOR
-    temp_page_content_values = []
-    temp_metadata_values = {"rowdata": {}}
-
-    for i, row in df.iterrows():
-        page_content_values = []
-        metadata = {}
-
-        for col_name in page_content_columns:
-            if col_name in row and pd.notna(row[col_name]):
-                page_content_values.append(str(row[col_name]))
-                metadata[col_name] = str(row[col_name])
-
-        str_page_content = " ".join(page_content_values)
-        if not str_page_content.strip():
-            continue
+    return _build_row_documents(
+        df, page_content_columns, list(parsed["metadata"].values()), filepath
+    )
 
-        for k, col_name in parsed["metadata"].items():
-            if col_name in row and pd.notna(row[col_name]):
-                metadata[col_name] = str(row[col_name])
 
-        cur_count -= 1
+def _column_strings(column: pd.Series, row_dtype) -> np.ndarray:
+    """Return str(value) per cell as seen by df.iterrows(), and None for missing cells.
 
-        temp_page_content_values.append(f"{i}: {str_page_content}")
+    iterrows() hands every row over as one Series of the frame's common dtype, so an
+    int column in an otherwise numeric frame reads as float ("3.0"); casting to that
+    dtype first keeps the text identical.
+    """
+    present = column.notna().to_numpy()
+    if row_dtype != object:
+        column = column.astype(row_dtype)
+    if isinstance(column.dtype, (np.dtype, pd.StringDtype)) and column.dtype.kind in "biufO":
+        # numpy's str cast matches str() and skips pandas' string array round trip.
+        strings = column.to_numpy().astype(str).astype(object)
+    elif column.dtype.kind in "biufO":
+        # Nullable extension dtypes, e.g. Int64, whose to_numpy() may change the type.
+        strings = column.astype(str).to_numpy(dtype=object)
+    elif column.dtype.kind == "M" and getattr(column.dtype, "tz", None) is None and not (
+        column.to_numpy().astype("datetime64[ns]").astype("int64")[present] % 10**9
+    ).any():
+        # str(Timestamp) of a whole second, e.g. "2024-01-01 00:00:00".
+        strings = np.char.replace(
+            np.datetime_as_string(column.to_numpy(), unit="s"), "T", " "
+        ).astype(object)
+    else:
+        # Other dtypes (timezones, categoricals, ...): astype(str) formats differently than str().
+        strings = column.map(str).to_numpy(dtype=object)
+    strings[~present] = None
+    return strings
 
-        row_key = str(i)
-        if row_key not in temp_metadata_values["rowdata"]:
-            temp_metadata_values["rowdata"][row_key] = {}
-        temp_metadata_values["rowdata"][row_key]["metadata"] = metadata
 
-        if cur_count == 0:
-            id = str(uuid.uuid4())
-            p = "[" + ", ".join(temp_page_content_values) + "]"
-            doc = Document(page_content=p, metadata=temp_metadata_values, id=id)
-            ids.append(id)
-            documents.append(doc)
+def _build_row_documents(
+    df: pd.DataFrame, page_content_columns: list, metadata_columns: list, filepath: str
+):
+    """Group the rows of a classified sheet into Documents of EXCEL_ROWS_PER_VECTOR rows.
 
-            cur_count = EXCEL_ROWS_PER_VECTOR
-            temp_page_content_values = []
-            temp_metadata_values = {"rowdata": {}}
+    Works column by column instead of with df.iterrows(), and produces the same
+    output: each row reads "<index>: <page content values>" and its page content
+    and metadata values are kept under metadata["rowdata"][<index>]["metadata"].
+    Rows without page content are skipped. Only the last, partly filled document
+    carries filename and last_updated.
+    """
+    documents = []
+    ids = []
 
-    # final flush for leftover rows
-    if temp_page_content_values:
-        temp_metadata_values["filename"] = os.path.basename(filepath)
-        temp_metadata_values["last_updated"] = str(ctime(os.path.getmtime(filepath)))
+    content_cols = [col for col in page_content_columns if col in df.columns]
+    # A column classified as both keeps its page content position in the row metadata.
+    metadata_keys = list(
+        dict.fromkeys(content_cols + [col for col in metadata_columns if col in df.columns])
+    )
+    row_dtype = df.iloc[:0].to_numpy().dtype
+    strings = {col: _column_strings(df[col], row_dtype) for col in metadata_keys}
+
+    # " ".join() of each row's present page content values.
+    text = np.full(len(df), "", dtype=object)
+    has_text = np.zeros(len(df), dtype=bool)
+    for col in content_cols:
+        values = strings[col]
+        present = values != None  # noqa: E711 - elementwise on an object array
+        text = np.where(present & has_text, text + " " + np.where(present, values, ""), text)
+        text = np.where(present & ~has_text, values, text)
+        has_text |= present
+    keep = np.flatnonzero(pd.Series(text, dtype=object).str.strip().to_numpy(dtype=bool))
+
+    labels = df.index[keep].tolist()
+    row_texts = text[keep].tolist()
+    row_metadata = [
+        {col: value for col, value in zip(metadata_keys, values) if value is not None}
+        for values in zip(*(strings[col][keep].tolist() for col in metadata_keys))
+    ]
+
+    for start in range(0, len(keep), EXCEL_ROWS_PER_VECTOR):
+        stop = start + EXCEL_ROWS_PER_VECTOR
+        page_content_values = [
+            f"{label}: {row_text}"
+            for label, row_text in zip(labels[start:stop], row_texts[start:stop])
+        ]
+        metadata_values = {
+            "rowdata": {
+                str(label): {"metadata": metadata}
+                for label, metadata in zip(labels[start:stop], row_metadata[start:stop])
+            }
+        }
+        if stop <= len(keep):
+            p = "[" + ", ".join(page_content_values) + "]"
+        else:
+            # final flush for leftover rows
+            metadata_values["filename"] = os.path.basename(filepath)
+            metadata_values["last_updated"] = str(ctime(os.path.getmtime(filepath)))
+            p = "[" + " ".join(page_content_values) + "]"
 
         id = str(uuid.uuid4())
-        p = "[" + " ".join(temp_page_content_values) + "]"
-        doc = Document(page_content=p, metadata=temp_metadata_values, id=id)
+        doc = Document(page_content=p, metadata=metadata_values, id=id)
         ids.append(id)
         documents.append(doc)
 
@@ -280,7 +352,7 @@ async def vectorize_excel(filepath: str):
 
     sheets = []
     if filepath.endswith(".csv"):
-        sheets.append(pd.read_csv(filepath, encoding="cp1252"))
+        sheets.append(read_csv_file(filepath))
     elif filepath.endswith(".xlsx"):
         with pd.ExcelFile(filepath) as excel_data:
             for sheet in excel_data.sheet_names:
@@ -8,18 +8,34 @@ from langchain_core.documents import Document
 import json
 import asyncio
 import uuid
+from collections import deque
 from src.events_interface import make_event
 from src.ai_api_selector import get_agent_model, get_agent_ctx_window_size
-import pymupdf4llm
-from typing import TypedDict, Literal
+from src.rag_pipeline.pdf_chunker import (
+    MarkdownChunker,
+    get_chunk_target_tokens,
+    page_content_hash,
+)
+from src.rag_pipeline.pdf_heuristics import heuristic_metadata, is_text_only_page
+from src.rag_pipeline.vectorize_checkpoint import VectorizeCheckpoint, chunk_digest
+from src.pdf_conversion import iter_pdf_pages_async
+from typing import Optional, TypedDict, Literal
 
 
-class VectorizePdfResult(TypedDict):
-    type: Literal["result"]
+class VectorizePdfDocuments(TypedDict):
+    type: Literal["documents"]
     documents: list[Document]
     ids: list[str]
 
 
+class VectorizePdfResult(TypedDict):
+    type: Literal["result"]
+    llm_calls_avoided: int
+    pages_reused: int
+    reused_row_ids: list[str]
+    page_hashes: dict[int, str]
+
+
 _INSTRUCTIONS = """
 You are a document processing assistant for asset management reports. 
 Your goal is to transform provided text into a structured JSON format.
@@ -89,6 +105,17 @@ OUTPUT_SCHEMA_DICT = {
     "additionalProperties": False,
 }
 
+# Chunk requests kept in flight at once. Set PDF_VECTORIZE_CONCURRENCY=1 to send them one by one.
+PDF_VECTORIZE_CONCURRENCY = max(1, int(os.getenv("PDF_VECTORIZE_CONCURRENCY", "4")))
+# "llm" structures every chunk with the agent; "hybrid" only chunks of pages with tables,
+# pictures or formulas, and structures prose-only chunks heuristically.
+PDF_VECTORIZE_MODE = os.getenv("PDF_VECTORIZE_MODE", "llm").strip().lower()
+# Attempts per chunk before a chunk with invalid JSON is skipped.
+PDF_VECTORIZE_CHUNK_ATTEMPTS = max(1, int(os.getenv("PDF_VECTORIZE_CHUNK_ATTEMPTS", "2")))
+# Items held between two pipeline stages (page batches, planned chunks, finished chunks);
+# bounds memory on large documents while every stage keeps working.
+PDF_PIPELINE_QUEUE_SIZE = max(1, int(os.getenv("PDF_PIPELINE_QUEUE_SIZE", "8")))
+
 APP_NAME = "Vectorize_PDF_App"
 USER_ID = "2468"
 SESSION_ID = "session2468"
@@ -173,30 +200,191 @@ async def call_agent(
     return final_response_content
 
 
-async def vectorize_pdf(filepath: str):
+async def _structure_chunk(chunk_text: str):
+    """Send one markdown slice to the agent, retrying it on its own if the call fails.
+
+    Returns:
+        dict | None: The parsed JSON object, or None if every attempt returned invalid JSON.
+    Raises:
+        Exception: The error of the last attempt when call_agent itself keeps failing.
     """
-    Asynchronously vectorize a PDF into a list of langchain_core.documents.Document objects and their UUIDs.
+    for attempt in range(1, PDF_VECTORIZE_CHUNK_ATTEMPTS + 1):
+        try:
+            response = await call_agent(runner, agent, SESSION_ID, chunk_text)
+        except Exception:
+            if attempt == PDF_VECTORIZE_CHUNK_ATTEMPTS:
+                raise
+            continue
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _structure_text_chunk(chunk_text: str, filepath: str) -> dict:
+    """Build the agent's JSON output for a prose-only chunk without calling it."""
+    metadata = heuristic_metadata(chunk_text, filepath)
+    return {
+        "metadata": metadata,
+        "page_content": {
+            "context_header": metadata["topic"],
+            "content_body": chunk_text,
+            "key_metrics": [],
+        },
+    }
+
+
+async def _extract_pages(
+    filepath: str,
+    page_queue: asyncio.Queue,
+    page_hashes: dict[int, str],
+    existing_rows: dict[str, Optional[list[str]]],
+) -> dict:
+    """Pipeline stage 1: convert the PDF in page batches and queue the pages to chunk, in page order.
+
+    Chunks can split a page, so existing rows that share a page are kept or dropped
+    together: a group of rows linked by shared pages is kept once every page of the
+    group has been seen in the file, and the pages of kept groups are not chunked
+    again. Otherwise all of the group's pages are chunked again, since a kept row
+    would miss the part of a shared page that lived in a dropped one. A page whose
+    hash belongs to a group that may still be kept waits, along with the pages
+    after it, until that is decided, at the latest once the whole file has been
+    converted.
+
+    Returns:
+        dict: reused_row_ids and pages_reused.
+    """
+    # Union rows that share a page hash; each group is named by one of its hashes.
+    parent = {
+        page_hash: page_hash for row_hashes in existing_rows.values() for page_hash in row_hashes or []
+    }
+
+    def group_of(page_hash: str) -> str:
+        while parent[page_hash] != page_hash:
+            parent[page_hash] = parent[parent[page_hash]]
+            page_hash = parent[page_hash]
+        return page_hash
+
+    for row_hashes in existing_rows.values():
+        for page_hash in (row_hashes or [])[1:]:
+            parent[group_of(page_hash)] = group_of(row_hashes[0])
+    missing_hashes: dict[str, set[str]] = {}
+    for page_hash in parent:
+        missing_hashes.setdefault(group_of(page_hash), set()).add(page_hash)
+    group_hashes = {group: set(hashes) for group, hashes in missing_hashes.items()}
+    covered_hashes: set[str] = set()
+    pending: deque[dict] = deque()
+    pages_reused = 0
+
+    def release(undecided_wait: bool) -> list[dict]:
+        nonlocal pages_reused
+        to_chunk = []
+        while pending:
+            page_hash = page_hashes[pending[0]["metadata"]["page_number"]]
+            if page_hash in covered_hashes:
+                pages_reused += 1
+            elif page_hash in parent and undecided_wait:
+                break
+            else:
+                to_chunk.append(pending[0])
+            pending.popleft()
+        return to_chunk
+
+    async for batch in iter_pdf_pages_async(filepath):
+        for page_chunk in batch:
+            page_num = page_chunk.setdefault("metadata", {}).setdefault(
+                "page_number", len(page_hashes) + 1
+            )
+            page_hash = page_hashes[page_num] = page_content_hash(page_chunk)
+            if page_hash in parent:
+                group = group_of(page_hash)
+                missing_hashes[group].discard(page_hash)
+                if not missing_hashes[group]:
+                    covered_hashes.update(group_hashes[group])
+            pending.append(page_chunk)
+        if to_chunk := release(undecided_wait=True):
+            await page_queue.put(to_chunk)
+
+    # Groups still missing pages are not kept, so the pages that are left are chunked.
+    if to_chunk := release(undecided_wait=False):
+        await page_queue.put(to_chunk)
+    await page_queue.put(None)
+    return {
+        "reused_row_ids": [
+            row_id
+            for row_id, row_hashes in existing_rows.items()
+            if row_hashes and row_hashes[0] in covered_hashes
+        ],
+        "pages_reused": pages_reused,
+    }
+
+
+async def _plan_chunks(page_queue: asyncio.Queue, chunk_queue: asyncio.Queue) -> None:
+    """Pipeline stage 2: pack queued pages into (needs_llm, text, pages) chunks as they arrive."""
+    target_tokens = get_chunk_target_tokens(get_agent_ctx_window_size())
+    hybrid = PDF_VECTORIZE_MODE == "hybrid"
+    chunker = MarkdownChunker(target_tokens)
+    needs_llm = True
+    while (batch := await page_queue.get()) is not None:
+        for page_chunk in batch:
+            closed = []
+            # Runs of text-only pages and of pages with tables or pictures are chunked
+            # separately, so every chunk is either all prose or needs the LLM.
+            page_needs_llm = not (hybrid and is_text_only_page(page_chunk))
+            if page_needs_llm != needs_llm:
+                closed = chunker.finish()
+                chunker = MarkdownChunker(target_tokens)
+            for chunk in closed:
+                await chunk_queue.put((needs_llm, chunk["text"], chunk["pages"]))
+            needs_llm = page_needs_llm
+            for chunk in chunker.add_page(page_chunk):
+                await chunk_queue.put((needs_llm, chunk["text"], chunk["pages"]))
+    for chunk in chunker.finish():
+        await chunk_queue.put((needs_llm, chunk["text"], chunk["pages"]))
+    await chunk_queue.put(None)
+
+
+async def vectorize_pdf(
+    filepath: str,
+    checkpoint: Optional[VectorizeCheckpoint] = None,
+    existing_rows: Optional[dict[str, Optional[list[str]]]] = None,
+):
+    """
+    Asynchronously vectorize a PDF into langchain_core.documents.Document objects and their UUIDs, streamed as they are ready.
     Behavior:
     - Ensures the provided filepath points to a .pdf file.
     - Creates or retrieves an in-memory session for the application.
-    - Converts the PDF to markdown via pymupdf4llm.to_markdown().
-    - Splits the markdown into chunks based on the agent context window size and sends each chunk to an LLM agent via call_agent().
-    - Concatenates the agent's chunked JSON responses into a single JSON payload keyed by the filepath, then parses and normalizes the resulting data into a list of "knowledge objects".
+    - Runs as a pipeline of stages joined by queues of at most PDF_PIPELINE_QUEUE_SIZE items, so the first documents
+      are yielded while later pages are still converting and memory stays flat on large files:
+        1. Converts the PDF to per-page markdown with pymupdf4llm in page batches, in a conversion worker process
+           (see pdf_conversion), so the event loop keeps serving other requests; cancelling the generator stops the conversion.
+        2. Packs the pages into chunks of up to PDF_CHUNK_FILL_RATIO of the agent context window, counted in tokens and
+           cut only at heading, table-row and sentence boundaries (see pdf_chunker).
+        3. Sends each chunk to an LLM agent via call_agent(), keeping up to PDF_VECTORIZE_CONCURRENCY requests in flight.
+           A failed chunk is retried on its own; documents keep chunk order.
+    - With PDF_VECTORIZE_MODE=hybrid, chunks of text-only pages skip the LLM: their markdown is the content and their
+      metadata comes from headings and the filename (see pdf_heuristics). The result reports llm_calls_avoided.
     - For each knowledge object, prefers page_content.content_body as the document text; falls back to the whole object JSON if necessary.
-    - Merges any provided metadata, and adds/overrides source_file (basename of filepath) and last_updated (file modification time).
-    - Constructs a Document for each item with a generated UUID and returns (documents, ids).
+    - Constructs a Document for each item with a generated UUID (stable per chunk when a checkpoint is given).
+    - Records the chunk's page_numbers and the content hash of each page as page_hashes metadata.
     Args:
         filepath (str): Path to the PDF file to process. Must end with ".pdf".
-    Returns:
-        Tuple[List[Document], List[str]]: A tuple containing a list of Document objects and a parallel list of UUID strings.
+        checkpoint (Optional[VectorizeCheckpoint]): Job checkpoint; chunks it already holds are not sent
+            to the LLM again, and every newly structured chunk is recorded in it.
+        existing_rows (Optional[dict]): Vector row id -> page_hashes metadata of the rows stored for an earlier
+            version of the file. Rows whose pages are all unchanged are reported in reused_row_ids, and their
+            pages are not chunked again.
+    Yields:
+        Chunking progress events, {"type": "documents", "documents", "ids"} batches in chunk order, and a final
+        VectorizePdfResult with llm_calls_avoided, pages_reused, reused_row_ids and the content hash of every
+        page of the file by page number (page_hashes), which locates the pages of reused rows in this version.
     Raises:
         ValueError: If filepath does not end with ".pdf".
         OSError: If there is an error accessing the file metadata.
-        Any exceptions raised by call_agent, pymupdf4llm.to_markdown, or session management may propagate.
+        Any exceptions raised by call_agent, the PDF conversion, or session management may propagate.
     Side effects and notes:
-    - Prints debug information (agent responses and parsed item count).
     - Depends on external services: an LLM agent (call_agent/runner), pymupdf4llm, and an in-memory session service.
-    - Assumes the agent returns valid minified JSON fragments that can be concatenated into a valid JSON array/object using the filepath as a key.
     """
 
     session_service = await get_or_create_session(APP_NAME, USER_ID, SESSION_ID)
@@ -204,61 +392,139 @@ async def vectorize_pdf(filepath: str):
     if not filepath.endswith(".pdf"):
         raise ValueError("File is not a PDF")
 
-    query = pymupdf4llm.to_markdown(filepath)
-
-    ctx_window_size = get_agent_ctx_window_size()
-    # According to OpenAI, 1 token ≈ 4 characters
-    # Reserve half the space for each chunk (remaining space will be necessary for the LLM's output)
-    chunk_size = ctx_window_size // 8
-    overlap_size = chunk_size // 10
-    doc_length = len(query)
-    num_chunks = doc_length // chunk_size + 1
-    knowledge_objects = []
-
-    attempts = 0
-    chunk_number = 0
-    while chunk_number < num_chunks:
-        attempts += 1
-        start = min(
-            chunk_size * chunk_number, abs(chunk_size * chunk_number - overlap_size)
+    page_hashes: dict[int, str] = {}
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=PDF_PIPELINE_QUEUE_SIZE)
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=PDF_PIPELINE_QUEUE_SIZE)
+    extract_task = asyncio.create_task(
+        _extract_pages(filepath, page_queue, page_hashes, existing_rows or {})
+    )
+    plan_task = asyncio.create_task(_plan_chunks(page_queue, chunk_queue))
+    stages = {extract_task, plan_task}
+
+    # Chunk results are stored by position so documents keep chunk order no matter
+    # which request finishes first; chunks that never returned valid JSON stay None.
+    plan: dict[int, tuple[str, list[int]]] = {}
+    results: dict[int, Optional[dict]] = {}
+    in_flight: dict[asyncio.Task, int] = {}
+    next_chunk: Optional[asyncio.Task] = None
+    planning_done = False
+    chunks_planned = 0
+    chunks_created = 0
+    released = 0
+    llm_calls_avoided = 0
+
+    def start_structuring(chunk_number: int, needs_llm: bool, chunk_text: str) -> None:
+        nonlocal llm_calls_avoided
+        if not needs_llm:
+            results[chunk_number] = _structure_text_chunk(chunk_text, filepath)
+            llm_calls_avoided += 1
+            return
+        found, knowledge_object = (
+            checkpoint.get_chunk(chunk_number, plan[chunk_number][0])
+            if checkpoint is not None
+            else (False, None)
+        )
+        if found:
+            results[chunk_number] = knowledge_object
+        else:
+            in_flight[asyncio.create_task(_structure_chunk(chunk_text))] = chunk_number
+
+    def release_documents() -> VectorizePdfDocuments:
+        nonlocal released
+        documents = []
+        ids = []
+        while released in results:
+            item = results.pop(released)
+            digest, pages = plan.pop(released)
+            if item is not None:
+                content = item["page_content"]["content_body"]
+                meta = item["metadata"]
+                # Lets a later version of the file keep this row if its pages are unchanged.
+                meta["page_numbers"] = pages
+                meta["page_hashes"] = [page_hashes[page_num] for page_num in pages]
+                _id = (
+                    checkpoint.document_id(released, digest)
+                    if checkpoint is not None
+                    else str(uuid.uuid4())
+                )
+                documents.append(Document(page_content=content, metadata=meta))
+                ids.append(_id)
+            released += 1
+        return {"type": "documents", "documents": documents, "ids": ids}
+
+    try:
+        while not planning_done or in_flight or released < chunks_planned:
+            # Pull the next chunk only while the window has room, which holds the
+            # planning stages back once PDF_PIPELINE_QUEUE_SIZE chunks are waiting.
+            if (
+                next_chunk is None
+                and not planning_done
+                and len(in_flight) < PDF_VECTORIZE_CONCURRENCY
+                and chunks_planned - released < PDF_VECTORIZE_CONCURRENCY + PDF_PIPELINE_QUEUE_SIZE
+            ):
+                next_chunk = asyncio.create_task(chunk_queue.get())
+            waiting = set(in_flight) | {stage for stage in stages if not stage.done()}
+            if next_chunk is not None:
+                waiting.add(next_chunk)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            progressed = False
+            for task in done:
+                if task in stages:
+                    # Re-raises a failed conversion or planning stage.
+                    task.result()
+                elif task is next_chunk:
+                    next_chunk = None
+                    planned = task.result()
+                    if planned is None:
+                        planning_done = True
+                        continue
+                    needs_llm, chunk_text, pages = planned
+                    plan[chunks_planned] = (chunk_digest(chunk_text), pages)
+                    start_structuring(chunks_planned, needs_llm, chunk_text)
+                    if chunks_planned in results:
+                        chunks_created += 1
+                        progressed = True
+                    chunks_planned += 1
+                else:
+                    chunk_number = in_flight.pop(task)
+                    results[chunk_number] = task.result()
+                    if checkpoint is not None:
+                        checkpoint.record_chunk(
+                            chunk_number, plan[chunk_number][0], results[chunk_number]
+                        )
+                    chunks_created += 1
+                    progressed = True
+
+            if progressed:
+                yield make_event(
+                    "chunking",
+                    message=f"Chunking ({chunks_created}/{chunks_planned})",
+                    chunks_created=chunks_created,
+                    chunks_to_create=chunks_planned,
+                )
+            if released in results:
+                yield release_documents()
+        reuse = await extract_task
+        await plan_task
+    finally:
+        for task in [*in_flight, *stages, *([next_chunk] if next_chunk else [])]:
+            task.cancel()
+
+    if reuse["pages_reused"]:
+        yield make_event(
+            "chunking",
+            message=f"Reusing {len(reuse['reused_row_ids'])} chunks of {reuse['pages_reused']} unchanged pages",
+            pages_reused=reuse["pages_reused"],
+            chunks_reused=len(reuse["reused_row_ids"]),
         )
-        end = min(doc_length, chunk_size * (chunk_number + 1))
-        response = await call_agent(runner, agent, SESSION_ID, query[start:end])
-        try:
-            chunk = json.loads(response)
-            knowledge_objects.append(chunk)
-            attempts = 0
-
-            yield make_event(
-                "chunking",
-                message=f"Chunking ({chunk_number}/{num_chunks})",
-                chunks_created=chunk_number,
-                chunks_to_create=num_chunks,
-            )
-
-        except json.JSONDecodeError as e:
-            # print(f"JSON decode error for chunk {chunk}: {e}")
-            if attempts < 2:
-                chunk_number -= 1  # Retry the same chunk
-        chunk_number += 1
-
-    documents = []
-    ids = []
-
-    # Convert knowledge objects to Langchain Documents
-    for item in knowledge_objects:
-        content = item["page_content"]["content_body"]
-        meta = item["metadata"]
-
-        _id = str(uuid.uuid4())
-        doc = Document(page_content=content, metadata=meta)
-        ids.append(_id)
-        documents.append(doc)
 
     yield {
         "type": "result",
-        "documents": documents,
-        "ids": ids,
+        "llm_calls_avoided": llm_calls_avoided,
+        "pages_reused": reuse["pages_reused"],
+        "reused_row_ids": reuse["reused_row_ids"],
+        "page_hashes": page_hashes,
     }
 
 
@@ -8,6 +8,7 @@ from starlette.responses import JSONResponse
 from pydantic import BaseModel
 from google.adk.cli.fast_api import get_fast_api_app
 from src.supabase_interface import get_supabase_client
+from src.file_cache import file_cache_stats
 from src.rag_pipeline.vector import (
     vectorize_and_store_supabase_file,
     delete_vector_from_vector_store,
@@ -83,6 +84,24 @@ class VectorizeRequest(BaseModel):
 AuthUser = Depends(verify_auth)
 
 
+@app.get("/api/cache-stats")
+async def cache_stats(user=AuthUser):
+    """Hit rates and memory or disk use of the downloaded file, spreadsheet and PDF caches."""
+    # Agent tools are imported as city_agent.* once ADK loads the agent from AGENTS_DIR,
+    # so their caches are only reachable under that name, and only after that.
+    try:
+        from city_agent.agent_tools.pdf_cache import get_pdf_cache_stats
+        from city_agent.agent_tools.spreadsheet_cache import get_spreadsheet_cache_stats
+    except ModuleNotFoundError:
+        # No agent has run yet, so no tool has cached anything.
+        return {"files": file_cache_stats(), "spreadsheets": None, "pdfs": None}
+    return {
+        "files": file_cache_stats(),
+        "spreadsheets": get_spreadsheet_cache_stats(),
+        "pdfs": get_pdf_cache_stats(),
+    }
+
+
 @app.post("/api/vectorize-file")
 async def vectorize_file_stream(request: VectorizeRequest, user=AuthUser):
     async def event_generator():
@@ -1,7 +1,7 @@
 import os
-import tempfile
 from pathlib import Path
 from supabase import create_client, Client
+from src import file_cache
 
 _supabase_client = None
 
@@ -26,22 +26,7 @@ def get_supabase_client() -> Client:
     return _supabase_client
 
 
-def download_supabase_file(storage_location: str, bucket="documents"):
-    file_path = storage_location.strip().lstrip("/")
-    extension = Path(file_path).suffix.lower()
-    if extension not in SUPPORTED_EXTENSIONS:
-        raise ValueError(
-            f"Unsupported file extension '{extension}'. "
-            f"Supported: {sorted(SUPPORTED_EXTENSIONS)}"
-        )
-
-    client = get_supabase_client()
-
-    file_bytes = client.storage.from_(bucket).download(file_path)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp_file:
-        tmp_file.write(file_bytes)
-        temp_path = tmp_file.name
-
+def _get_last_updated(client: Client, file_path: str, bucket: str):
     response = (
         client.table("documents")
         .select("last_updated")
@@ -52,9 +37,57 @@ def download_supabase_file(storage_location: str, bucket="documents"):
     )
 
     metadata = response.data[0] if response.data else None
-    last_updated = metadata.get("last_updated") if metadata else None
+    return metadata.get("last_updated") if metadata else None
+
+
+def download_supabase_file(
+    storage_location: str, bucket="documents", revalidate: bool = False
+):
+    """Return a local copy of a storage object, downloading it only when needed.
+
+    Files are kept in the local file cache keyed by (bucket, storage_path,
+    last_updated), or by content hash when the object has no last_updated.
+    A recently checked version is reused without any network I/O unless
+    `revalidate` is set, in which case the documents table is queried again.
+
+    Returns:
+        tuple: (local_path, bucket, storage_path, last_updated)
+    """
+    file_path = storage_location.strip().lstrip("/")
+    extension = Path(file_path).suffix.lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(
+            f"Unsupported file extension '{extension}'. "
+            f"Supported: {sorted(SUPPORTED_EXTENSIONS)}"
+        )
+
+    if not revalidate:
+        cached = file_cache.lookup_version(bucket, file_path)
+        if cached:
+            local_path, last_updated = cached
+            return local_path, bucket, file_path, last_updated
+
+    client = get_supabase_client()
+    last_updated = _get_last_updated(client, file_path, bucket)
+
+    if last_updated is not None:
+        cache_name = file_cache.version_cache_name(
+            bucket, file_path, str(last_updated), extension
+        )
+        local_path = file_cache.get_cached_file(cache_name)
+        if local_path is None:
+            file_bytes = client.storage.from_(bucket).download(file_path)
+            local_path = file_cache.store_file(cache_name, file_bytes)
+    else:
+        # Without a recorded version the object has to be fetched to tell if it changed.
+        file_bytes = client.storage.from_(bucket).download(file_path)
+        cache_name = file_cache.content_cache_name(file_bytes, extension)
+        local_path = file_cache.get_cached_file(cache_name) or file_cache.store_file(
+            cache_name, file_bytes
+        )
 
-    return temp_path, bucket, file_path, last_updated
+    file_cache.remember_version(bucket, file_path, local_path, last_updated)
+    return local_path, bucket, file_path, last_updated
 
 
 def list_supabase_documents(bucket: str = "documents"):
@@ -0,0 +1,442 @@
+import json
+
+import pytest
+
+try:
+    import pymupdf as fitz
+except Exception:
+    import fitz
+
+from city_agent.agent_tools import pdf_analysis_tools as pdf_tools
+from city_agent.agent_tools import pdf_cache
+from city_agent.agent_tools import spreadsheet_analysis_tools as sheet_tools
+from city_agent.agent_tools import spreadsheet_cache
+from src import file_cache, pdf_conversion, pdf_table_index, pdf_table_store, pdf_text_index
+
+
+def _draw_table(page, rows, top=80):
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            rect = fitz.Rect(72 + c * 120, top + r * 20, 192 + c * 120, top + (r + 1) * 20)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+            page.insert_text((rect.x0 + 3, rect.y1 - 6), str(value), fontsize=9)
+
+
+@pytest.fixture
+def stored_pdf(tmp_path, monkeypatch):
+    """Serve report.pdf from a tmp_path file cache: a table page and a text-only page."""
+    monkeypatch.setattr(file_cache, "FILE_CACHE_DIR", str(tmp_path))
+    pdf_cache.clear_pdf_cache()
+    path = tmp_path / "report.pdf"
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 60), "Table 1: Asset inventory")
+    _draw_table(page, [["Asset", "Count", "Cost"], ["Roads", "10", "500"], ["Bridges", "3", "900"]])
+    document.new_page().insert_text((72, 72), "Water mains are inspected every five years.")
+    document.save(path)
+    document.close()
+
+    monkeypatch.setattr(
+        pdf_tools,
+        "download_supabase_file",
+        lambda filename, bucket="documents": (str(path), bucket, filename, "v1"),
+    )
+    yield str(path)
+    pdf_cache.clear_pdf_cache()
+
+
+def _data(payload: str) -> dict:
+    decoded = json.loads(payload)
+    assert decoded["status"] == "success", decoded
+    return decoded["data"]
+
+
+class TestPdfTableIndex:
+    """Tests for the persisted table index behind get_pdf_info."""
+
+    def test_get_pdf_info_reports_tables(self, stored_pdf):
+        data = _data(pdf_tools.get_pdf_info_impl("report.pdf"))
+
+        assert data["page_count"] == 2
+        assert data["pages_with_tables"] == [1]
+        assert data["table_counts_by_page"] == {"1": 1}
+        (sample,) = data["table_content_samples"]["1"]
+        assert sample["headers"] == ["Asset", "Count", "Cost"]
+        assert sample["rows"] == [["Roads", "10", "500"], ["Bridges", "3", "900"]]
+
+    def test_index_is_persisted_per_file_version(self, stored_pdf, monkeypatch):
+        expected = _data(pdf_tools.get_pdf_info_impl("report.pdf"))
+        pdf_cache.clear_pdf_cache()
+        monkeypatch.setattr(
+            pdf_table_index,
+            "build_table_index",
+            lambda _: pytest.fail("tables detected twice"),
+        )
+
+        assert _data(pdf_tools.get_pdf_info_impl("report.pdf")) == expected
+        assert file_cache.load_artifact_json(stored_pdf, "tables.json")["page_count"] == 2
+
+    def test_non_pdf_is_rejected(self, stored_pdf):
+        payload = json.loads(pdf_tools.get_pdf_info_impl("roads.csv"))
+        assert payload["error"]["code"] == "UNSUPPORTED_FILE_TYPE"
+
+    def test_parallel_scan_matches_sequential_scan(self, tmp_path, monkeypatch):
+        path = tmp_path / "long.pdf"
+        document = fitz.open()
+        for page_num in range(1, 7):
+            page = document.new_page()
+            page.insert_text((72, 60), f"Section {page_num}")
+            if page_num % 2:
+                _draw_table(
+                    page,
+                    [["Asset", "Page", "Value"]]
+                    + [[f"Item{k}", str(page_num), str(page_num * 10 + k)] for k in range(4)],
+                )
+            else:
+                page.insert_text((72, 90), f"Narrative page {page_num}")
+        document.save(path)
+        document.close()
+
+        monkeypatch.setattr(pdf_table_index, "PDF_TABLE_WORKERS", 1)
+        sequential = pdf_table_index.build_table_index(str(path))
+        monkeypatch.setattr(pdf_table_index, "PDF_TABLE_WORKERS", 2)
+        monkeypatch.setattr(pdf_table_index, "PDF_TABLE_MIN_PAGES_PER_WORKER", 1)
+        try:
+            parallel = pdf_table_index.build_table_index(str(path))
+        finally:
+            pdf_table_index._reset_table_pool()
+
+        assert parallel == sequential
+        assert list(parallel["table_counts_by_page"]) == ["1", "3", "5"]
+        assert parallel["table_content_samples"]["5"][0]["rows"] == [
+            ["Item0", "5", "50"],
+            ["Item1", "5", "51"],
+        ]
+
+
+class TestPdfCache:
+    """Tests for the lazy, byte-bounded PDF artifact cache."""
+
+    def test_artifacts_are_built_on_first_use(self, stored_pdf):
+        _data(pdf_tools.get_pdf_info_impl("report.pdf"))
+        assert pdf_cache.get_pdf_cache_stats()["open_documents"] == 0
+
+        first = _data(pdf_tools.extract_pdf_tables_impl("report.pdf", 1))
+        second = _data(pdf_tools.extract_pdf_tables_impl("report.pdf", 1))
+
+        assert first == second
+        assert first["tables"][0]["rows"][1] == {"Asset": "Bridges", "Count": "3", "Cost": "900"}
+        stats = pdf_cache.get_pdf_cache_stats()
+        assert stats["entries"] == 1
+        assert stats["open_documents"] == 1
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+
+    def test_least_recently_used_entry_is_evicted_over_budget(self, stored_pdf, monkeypatch):
+        monkeypatch.setattr(pdf_cache, "PDF_CACHE_MAX_BYTES", 1)
+        with pdf_cache.open_pdf_document("report.pdf", "v1", stored_pdf) as document:
+            old_document = document
+        with pdf_cache.open_pdf_document("report.pdf", "v2", stored_pdf):
+            pass
+
+        stats = pdf_cache.get_pdf_cache_stats()
+        assert stats["entries"] == 1
+        assert stats["evictions"] == 1
+        assert old_document.is_closed
+
+
+class TestPdfConversion:
+    """Tests for the PDF-to-markdown conversion worker processes."""
+
+    @pytest.fixture
+    def one_worker(self, monkeypatch):
+        monkeypatch.setattr(pdf_conversion, "PDF_CONVERSION_WORKERS", 1)
+        monkeypatch.setattr(pdf_conversion, "_conversion_slots", None)
+        monkeypatch.setattr(pdf_conversion, "_conversion_slots_loop", None)
+        yield
+        pdf_conversion._reset_conversion_workers()
+
+    def test_pages_are_converted_in_a_worker(self, stored_pdf, one_worker):
+        import asyncio
+
+        async def convert_twice():
+            (page,) = await pdf_conversion.convert_pdf_pages_async(stored_pdf, [1])
+            first_worker = pdf_conversion._conversion_slots.get_nowait()
+            pdf_conversion._conversion_slots.put_nowait(first_worker)
+            pages = await pdf_conversion.convert_pdf_pages_async(stored_pdf)
+            return page, pages, first_worker
+
+        page, pages, first_worker = asyncio.run(convert_twice())
+
+        assert "Water mains" in page["text"]
+        assert [page["metadata"]["page_number"] for page in pages] == [1, 2]
+        # A page keeps its hash whichever pages it was converted with.
+        assert pages[1]["text_hash"] == page["text_hash"]
+        assert pages[0]["text_hash"] != page["text_hash"]
+        # The worker process is reused between conversions.
+        assert first_worker is not None
+        assert pdf_conversion._conversion_slots.get_nowait() is first_worker
+
+    def test_cancelled_conversion_terminates_its_worker(self, stored_pdf, one_worker):
+        import asyncio
+        import multiprocessing
+
+        async def cancel_conversion():
+            await pdf_conversion.convert_pdf_pages_async(stored_pdf, [0])
+            worker = pdf_conversion._conversion_slots.get_nowait()
+            pdf_conversion._conversion_slots.put_nowait(worker)
+            pid = worker[1]
+            task = asyncio.create_task(pdf_conversion.convert_pdf_pages_async(stored_pdf))
+            # Let the task hand the conversion to its worker.
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            for _ in range(100):
+                if pid not in {process.pid for process in multiprocessing.active_children()}:
+                    break
+                await asyncio.sleep(0.05)
+            else:
+                pytest.fail("worker process still running")
+            assert pdf_conversion._conversion_slots.get_nowait() is None
+            pdf_conversion._conversion_slots.put_nowait(None)
+            return len(await pdf_conversion.convert_pdf_pages_async(stored_pdf))
+
+        assert asyncio.run(cancel_conversion()) == 2
+
+    def test_dead_worker_fails_the_conversion_and_is_replaced(self, stored_pdf, one_worker):
+        import asyncio
+        import multiprocessing
+        from concurrent.futures.process import BrokenProcessPool
+
+        async def kill_worker_mid_conversion():
+            earlier = set(multiprocessing.active_children())
+            task = asyncio.create_task(pdf_conversion.convert_pdf_pages_async(stored_pdf))
+            while not (workers := set(multiprocessing.active_children()) - earlier):
+                await asyncio.sleep(0.05)
+            for process in workers:
+                process.kill()
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.wait_for(task, timeout=60)
+            assert pdf_conversion._conversion_slots.get_nowait() is None
+            pdf_conversion._conversion_slots.put_nowait(None)
+            return len(await pdf_conversion.convert_pdf_pages_async(stored_pdf))
+
+        assert asyncio.run(kill_worker_mid_conversion()) == 2
+
+
+class TestPdfHandlePool:
+    """Tests for pooled PyMuPDF document handles."""
+
+    def test_consecutive_checkouts_reuse_one_handle(self, stored_pdf):
+        for page_num in (1, 2, 1):
+            pdf_tools.extract_pdf_tables_impl("report.pdf", page_num)
+
+        stats = pdf_cache.get_pdf_cache_stats()
+        assert stats["handles_opened"] == 1
+        assert stats["handles_reused"] == 2
+        assert stats["idle_documents"] == 1
+
+    def test_concurrent_checkouts_get_separate_handles(self, stored_pdf):
+        first_entry, first = pdf_cache.checkout_pdf_document("report.pdf", "v1", stored_pdf)
+        second_entry, second = pdf_cache.checkout_pdf_document("report.pdf", "v1", stored_pdf)
+        assert first is not second
+        assert pdf_cache.get_pdf_cache_stats()["open_documents"] == 2
+
+        pdf_cache.checkin_pdf_document(first_entry, first)
+        pdf_cache.checkin_pdf_document(second_entry, second)
+        assert pdf_cache.get_pdf_cache_stats()["idle_documents"] == 2
+
+    def test_idle_handles_are_closed_after_timeout(self, stored_pdf, monkeypatch):
+        with pdf_cache.open_pdf_document("report.pdf", "v1", stored_pdf) as document:
+            idle_document = document
+        monkeypatch.setattr(pdf_cache, "PDF_HANDLE_IDLE_SECONDS", 0)
+        with pdf_cache.open_pdf_document("report.pdf", "v2", stored_pdf):
+            pass
+
+        assert idle_document.is_closed
+        assert pdf_cache.get_pdf_cache_stats()["handles_expired"] >= 1
+
+
+class TestExtractPdfTablePages:
+    """Tests for multi-page table extraction and stitching."""
+
+    HEADER = ["Asset", "Ward", "Cost"]
+
+    @pytest.fixture
+    def budget_pdf(self, stored_pdf, tmp_path, monkeypatch):
+        path = tmp_path / "budget.pdf"
+        document = fitz.open()
+        for page_num, first_row in ((1, 0), (2, 5)):
+            page = document.new_page()
+            page.insert_text((72, 60), f"Capital budget, page {page_num}")
+            _draw_table(
+                page,
+                [self.HEADER]
+                + [[f"Asset{k}", str(k % 3), str(100 * k)] for k in range(first_row, first_row + 5)],
+            )
+        page = document.new_page()
+        page.insert_text((72, 60), "Staffing")
+        _draw_table(page, [["Team", "Staff", "Vacancies"]] + [[f"Team{k}", str(k), "0"] for k in range(5)])
+        document.save(path)
+        document.close()
+        monkeypatch.setattr(
+            pdf_tools,
+            "download_supabase_file",
+            lambda filename, bucket="documents": (str(tmp_path / filename), bucket, filename, "v1"),
+        )
+
+    def test_tables_continuing_under_the_same_header_are_stitched(self, budget_pdf):
+        data = _data(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", "1-3"))
+
+        assert data["pages"] == [1, 2, 3]
+        assert data["table_count"] == 2
+        budget, staffing = data["tables"]
+        assert budget["page_nums"] == [1, 2]
+        assert [row["Asset"] for row in budget["rows"]] == [f"Asset{k}" for k in range(10)]
+        assert staffing["page_nums"] == [3]
+        assert staffing["table_index"] == 2
+
+    def test_without_stitching_every_page_table_is_separate(self, budget_pdf):
+        data = _data(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", [1, 2], stitch=False))
+
+        assert [table["page_nums"] for table in data["tables"]] == [[1], [2]]
+        single = _data(pdf_tools.extract_pdf_tables_impl("budget.pdf", 2))
+        assert data["tables"][1]["rows"] == single["tables"][0]["rows"]
+
+    def test_parallel_extraction_matches_inline_extraction(self, budget_pdf, monkeypatch):
+        monkeypatch.setattr(pdf_table_index, "load_page_tables", lambda *_: None)
+        monkeypatch.setattr(pdf_table_index, "PDF_TABLE_WORKERS", 1)
+        inline = _data(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", "1-3"))
+        monkeypatch.setattr(pdf_table_index, "PDF_TABLE_WORKERS", 2)
+        try:
+            parallel = _data(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", "3, 1-2"))
+        finally:
+            pdf_table_index._reset_table_pool()
+
+        assert parallel == inline
+
+    @pytest.mark.parametrize(
+        "pages, code",
+        [
+            ("3-1", "INVALID_ARGUMENT"),
+            ("x", "INVALID_ARGUMENT"),
+            ("0-2", "INVALID_ARGUMENT"),
+            ("0", "INVALID_ARGUMENT"),
+            ("2-9", "READ_FAILURE"),
+        ],
+    )
+    def test_invalid_pages_are_reported(self, budget_pdf, pages, code):
+        payload = json.loads(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", pages))
+        assert payload["error"]["code"] == code
+
+    @pytest.mark.parametrize("pages", ["1-100000000", ", ".join(str(k) for k in range(1, 100))])
+    def test_too_many_pages_are_rejected_while_parsing(self, pages, monkeypatch):
+        monkeypatch.setattr(pdf_tools, "PDF_MAX_PAGES_PER_CALL", 20)
+        with pytest.raises(ValueError):
+            pdf_tools._parse_pages(pages)
+        payload = json.loads(pdf_tools.extract_pdf_table_pages_impl("budget.pdf", pages))
+        assert payload["error"]["code"] == "INVALID_ARGUMENT"
+
+
+class TestPdfTableStore:
+    """Tests for the on-disk store of extracted PDF tables."""
+
+    def test_columns_round_trip_to_rows(self, stored_pdf):
+        tables = [
+            {"headers": ["Asset", "Cost"], "rows": [{"Asset": "Roads", "Cost": None}]},
+            {"headers": ["Empty"], "rows": []},
+        ]
+        pdf_table_store.save_page_tables(stored_pdf, 4, tables)
+
+        assert pdf_table_store.load_page_tables(stored_pdf, 4) == tables
+        assert pdf_table_store.load_page_tables(stored_pdf, 5) is None
+
+    def test_pages_are_extracted_once_per_file_version(self, stored_pdf, monkeypatch):
+        first = _data(pdf_tools.extract_pdf_tables_impl("report.pdf", 1))
+        monkeypatch.setattr(
+            pdf_table_index,
+            "extract_page_tables",
+            lambda _: pytest.fail("tables extracted twice"),
+        )
+
+        assert _data(pdf_tools.extract_pdf_tables_impl("report.pdf", 1)) == first
+        assert first["tables"][0]["sheet_name"] == "page_1_table_1"
+
+    def test_pages_without_tables_are_stored(self, stored_pdf):
+        pdf_table_index.extract_tables_on_pages(stored_pdf, [1])
+        assert pdf_table_store.load_page_tables(stored_pdf, 1) == []
+
+
+class TestPdfTablesInSpreadsheetTools:
+    """Tests for running spreadsheet tools on an extracted PDF table."""
+
+    @pytest.fixture
+    def pdf_sheet(self, stored_pdf, monkeypatch):
+        monkeypatch.setattr(
+            sheet_tools,
+            "download_supabase_file",
+            lambda filename, bucket="documents": (stored_pdf, bucket, filename, "v1"),
+        )
+        spreadsheet_cache.clear_spreadsheet_cache()
+        yield
+        spreadsheet_cache.clear_spreadsheet_cache()
+
+    def test_aggregate_reads_numeric_columns(self, pdf_sheet):
+        data = _data(
+            sheet_tools.aggregate_impl(
+                "report.pdf", ["Count", "Cost"], ["sum", "max"], sheet_name="page_1_table_1"
+            )
+        )
+
+        assert data["results"]["Count"]["sum"] == 13
+        assert data["results"]["Cost"]["max"] == 900
+
+    def test_text_columns_stay_text(self, pdf_sheet):
+        data = _data(
+            sheet_tools.count_values_impl("report.pdf", "Asset", sheet_name="page_1_table_1")
+        )
+        assert set(data["value_counts"]) == {"Roads", "Bridges"}
+
+    @pytest.mark.parametrize(
+        "sheet_name, code",
+        [(None, "INVALID_ARGUMENT"), ("table_1", "INVALID_ARGUMENT"), ("page_1_table_2", "READ_FAILURE")],
+    )
+    def test_unknown_tables_are_reported(self, pdf_sheet, sheet_name, code):
+        payload = json.loads(
+            sheet_tools.get_spreadsheet_info_impl("report.pdf", sheet_name=sheet_name)
+        )
+        assert payload["error"]["code"] == code
+
+
+class TestSearchPdf:
+    """Tests for the page text index behind search_pdf."""
+
+    def test_finds_pages_with_snippets(self, stored_pdf):
+        data = _data(pdf_tools.search_pdf_impl("report.pdf", "water MAINS"))
+
+        assert data["matching_page_count"] == 1
+        (match,) = data["matches"]
+        assert match["page_num"] == 2
+        assert match["phrase_match"] is True
+        assert "Water mains are inspected" in match["snippets"][0]
+
+    def test_phrase_matches_rank_first(self, stored_pdf):
+        data = _data(pdf_tools.search_pdf_impl("report.pdf", "bridges inventory"))
+        assert [match["page_num"] for match in data["matches"]] == [1]
+        assert data["matches"][0]["phrase_match"] is False
+
+        assert _data(pdf_tools.search_pdf_impl("report.pdf", "sewer"))["matches"] == []
+
+    def test_index_is_persisted_per_file_version(self, stored_pdf, monkeypatch):
+        expected = _data(pdf_tools.search_pdf_impl("report.pdf", "bridges"))
+        pdf_cache.clear_pdf_cache()
+        monkeypatch.setattr(
+            pdf_text_index, "build_text_index", lambda _: pytest.fail("text indexed twice")
+        )
+
+        assert _data(pdf_tools.search_pdf_impl("report.pdf", "bridges")) == expected
+
+    def test_query_without_words_is_rejected(self, stored_pdf):
+        payload = json.loads(pdf_tools.search_pdf_impl("report.pdf", " - "))
+        assert payload["error"]["code"] == "INVALID_ARGUMENT"
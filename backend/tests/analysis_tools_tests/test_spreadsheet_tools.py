@@ -0,0 +1,412 @@
+import json
+
+import pandas as pd
+import pytest
+
+from city_agent.agent_tools import spreadsheet_analysis_tools as tools
+from city_agent.agent_tools import spreadsheet_cache
+from src import csv_loader, file_cache
+from city_agent.agent_tools.spreadsheet_cache import (
+    clear_spreadsheet_cache,
+    get_spreadsheet_cache_stats,
+)
+
+ROADS = pd.DataFrame(
+    {
+        "Road Name": ["BANK ST", "PERCY ST", "BANK ST", "FERGUS CR"],
+        "Ward": ["14", "14", "17", "3"],
+        "PQI": [45.5, 80.0, 61.0, 30.0],
+        "Cost": [1000, 2500, 1500, 700],
+    }
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    clear_spreadsheet_cache()
+    yield
+    clear_spreadsheet_cache()
+
+
+@pytest.fixture
+def stored_files(tmp_path, monkeypatch):
+    """Serve spreadsheets from tmp_path instead of Supabase storage."""
+    versions = {}
+
+    def fake_download(filename, bucket="documents"):
+        return str(tmp_path / filename), bucket, filename, versions.get(filename, "v1")
+
+    monkeypatch.setattr(tools, "download_supabase_file", fake_download)
+    csv_path = tmp_path / "roads.csv"
+    ROADS.to_csv(csv_path, index=False)
+    with pd.ExcelWriter(tmp_path / "assets.xlsx") as writer:
+        ROADS.to_excel(writer, sheet_name="Roads", index=False)
+        pd.DataFrame({"Park": ["Major's Hill", "Strathcona"], "Acres": [12, 5]}).to_excel(
+            writer, sheet_name="Parks", index=False
+        )
+    return versions
+
+
+def _data(payload: str) -> dict:
+    decoded = json.loads(payload)
+    assert decoded["status"] == "success", decoded
+    return decoded["data"]
+
+
+class TestFrameCache:
+    """Tests for the parsed DataFrame cache behind _get_spreadsheet."""
+
+    def test_repeat_calls_reuse_parsed_frame(self, stored_files):
+        assert _data(tools.get_mean_impl("roads.csv", "PQI"))["mean"] == pytest.approx(54.125)
+        assert _data(tools.get_sum_in_column_impl("roads.csv", "Cost"))["sum"] == 5700
+
+        stats = get_spreadsheet_cache_stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_new_version_is_parsed_again(self, stored_files, tmp_path):
+        tools.get_sum_in_column_impl("roads.csv", "Cost")
+        ROADS.assign(Cost=1).to_csv(tmp_path / "roads.csv", index=False)
+        stored_files["roads.csv"] = "v2"
+
+        assert _data(tools.get_sum_in_column_impl("roads.csv", "Cost"))["sum"] == 4
+        assert get_spreadsheet_cache_stats()["misses"] == 2
+
+    def test_tool_code_cannot_mutate_cached_frame(self, stored_files):
+        df, error = tools._get_spreadsheet("roads.csv")
+        assert error is None
+        df["Cost"] = 0
+        df.attrs["sheet_info"] = {"tampered": True}
+
+        cached, _ = tools._get_spreadsheet("roads.csv")
+        assert cached["Cost"].sum() == 5700
+        assert "sheet_info" not in cached.attrs
+
+    def test_sheets_are_cached_independently(self, stored_files):
+        assert _data(tools.get_sum_in_column_impl("assets.xlsx", "Acres"))["sum"] == 17
+        assert _data(tools.get_sum_in_column_impl("assets.xlsx", "Acres", "Parks"))["sum"] == 17
+        assert _data(tools.get_max_in_column_impl("assets.xlsx", "PQI", "Roads"))["maximum"] == 80.0
+
+        info = _data(tools.get_spreadsheet_info_impl("assets.xlsx", "Parks"))
+        assert info["additional_info"] == {
+            "sheet_names": {"Roads": 4, "Parks": 2},
+            "selected_sheet": "Parks",
+        }
+
+    def test_cache_is_bounded_by_memory(self, stored_files, monkeypatch):
+        from city_agent.agent_tools import spreadsheet_cache
+
+        monkeypatch.setattr(spreadsheet_cache, "SPREADSHEET_CACHE_MAX_BYTES", 1)
+        tools.get_sum_in_column_impl("roads.csv", "Cost")
+        tools.get_sum_in_column_impl("assets.xlsx", "Acres", "Parks")
+
+        stats = get_spreadsheet_cache_stats()
+        assert stats["entries"] == 1
+        assert stats["evictions"] == 1
+
+
+class TestWorkbookManifest:
+    """Tests for the per-workbook manifest used for sheet info and column lookup."""
+
+    def test_manifest_matches_pandas_and_is_persisted(self, tmp_path):
+        from openpyxl import Workbook
+        from city_agent.agent_tools.workbook_manifest import (
+            build_workbook_manifest,
+            get_workbook_manifest,
+        )
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = "Messy"
+        for row in [
+            ["Cost", None, "Cost", 2024],
+            [1, 2, 3, 4, None],
+            [None],
+            [5, None, None, None, None, 9],
+            [],
+            [None, None],
+        ]:
+            sheet.append(row)
+        workbook.create_sheet("Empty")
+        path = str(tmp_path / "messy.xlsx")
+        workbook.save(path)
+
+        manifest = get_workbook_manifest(path)
+        for sheet_name in ["Messy", "Empty"]:
+            parsed = pd.read_excel(path, sheet_name=sheet_name)
+            assert manifest["row_counts"][sheet_name] == len(parsed)
+            assert manifest["headers"][sheet_name] == [str(c) for c in parsed.columns]
+        assert manifest["column_sheets"]["Cost.1"] == "Messy"
+        with open(path + ".manifest.json") as f:
+            assert json.load(f) == build_workbook_manifest(path)
+
+    def test_column_lookup_parses_only_the_matching_sheet(self, stored_files):
+        assert _data(tools.get_sum_in_column_impl("assets.xlsx", "Acres"))["sum"] == 17
+        info = _data(tools.get_spreadsheet_info_impl("assets.xlsx"))
+
+        assert info["additional_info"]["sheet_names"] == {"Roads": 4, "Parks": 2}
+        # Parks for the sum, Roads for the default info preview; nothing else parsed.
+        assert get_spreadsheet_cache_stats()["misses"] == 2
+
+    def test_unknown_column_reports_column_not_found(self, stored_files):
+        payload = json.loads(tools.get_mean_impl("assets.xlsx", "Missing"))
+        assert payload["error"]["code"] == "COLUMN_NOT_FOUND"
+
+
+class TestAggregate:
+    """Tests for the multi-column, multi-statistic aggregate tool."""
+
+    def test_computes_every_requested_stat_per_column(self, stored_files):
+        data = _data(
+            tools.aggregate_impl(
+                "roads.csv", ["PQI", "Cost"], ["count", "sum", "mean", "min", "max", "median", "p50", "p90"]
+            )
+        )
+
+        cost = data["results"]["Cost"]
+        assert cost["count"] == 4
+        assert cost["sum"] == 5700
+        assert cost["mean"] == pytest.approx(1425)
+        assert (cost["min"], cost["max"]) == (700, 2500)
+        assert cost["median"] == cost["p50"] == pytest.approx(1250)
+        assert cost["p90"] == pytest.approx(ROADS["Cost"].quantile(0.9))
+        assert data["results"]["PQI"]["max"] == 80.0
+        assert data["non_numeric_columns"] == []
+
+    def test_reports_text_columns_and_rejects_unknown_stats(self, stored_files):
+        data = _data(tools.aggregate_impl("roads.csv", ["Road Name"], ["count"]))
+        assert data["results"]["Road Name"]["count"] == 0
+        assert data["non_numeric_columns"] == ["Road Name"]
+
+        payload = json.loads(tools.aggregate_impl("roads.csv", ["Cost"], ["variance"]))
+        assert payload["error"]["code"] == "INVALID_ARGUMENT"
+
+
+class TestGroupAggregate:
+    """Tests for the group-by aggregation tool."""
+
+    def test_groups_are_sorted_and_truncated(self, stored_files):
+        data = _data(tools.group_aggregate_impl("roads.csv", "Road Name", "Cost", "sum", top_n=2))
+
+        assert data["group_count"] == 3
+        assert data["truncated"] is True
+        assert data["groups"] == [
+            {"group": "BANK ST", "value": 2500, "rows": 2},
+            {"group": "PERCY ST", "value": 2500, "rows": 1},
+        ]
+
+    def test_count_works_on_text_columns(self, stored_files):
+        data = _data(tools.group_aggregate_impl("roads.csv", "Ward", "Road Name", "count", top_n=0))
+        assert {g["group"]: g["value"] for g in data["groups"]} == {14: 2, 17: 1, 3: 1}
+        assert data["truncated"] is False
+
+
+class TestKeywordIndex:
+    """Tests for the per-column token index behind keyword filtering."""
+
+    @pytest.mark.parametrize("keyword", ["bank", "BANK ST", "st", "k s", "1", "14", "nan", "zzz", ""])
+    def test_index_matches_full_scan(self, keyword):
+        from city_agent.agent_tools.spreadsheet_cache import get_cached_frame, keyword_mask
+
+        # Blanks as pd.read_csv parses them; pandas 2 would print a None cell as "None".
+        source = ROADS.assign(Note=["Resurface", float("nan"), "bank repair", float("nan")])
+        df = get_cached_frame("roads.csv", None, "v1", lambda: source)
+        columns = list(df.columns)
+
+        expected = (
+            source.astype(str)
+            .apply(lambda col: col.str.contains(keyword, case=False, na=False, regex=False))
+            .any(axis=1)
+        )
+        assert keyword_mask(df, columns, keyword).tolist() == expected.tolist()
+
+    def test_index_is_built_once_and_skipped_for_filtered_frames(self, stored_files, monkeypatch):
+        from city_agent.agent_tools import spreadsheet_cache
+
+        built = []
+        original = spreadsheet_cache._build_column_index
+        monkeypatch.setattr(
+            spreadsheet_cache,
+            "_build_column_index",
+            lambda series: built.append(series.name) or original(series),
+        )
+
+        assert _data(tools.filter_values_impl("roads.csv", ["Road Name"], "bank"))["row_count"] == 2
+        assert _data(tools.filter_values_impl("roads.csv", ["Road Name"], "percy"))["row_count"] == 1
+        summed = _data(
+            tools.get_sum_of_filtered_values_impl("roads.csv", "Cost", "bank", "Road Name")
+        )
+        assert summed["sum"] == 2500
+        assert built == ["Road Name"]
+
+        df, _ = tools._get_spreadsheet("roads.csv")
+        subset = df[df["Cost"] > 800]
+        assert spreadsheet_cache.keyword_mask(subset, ["Road Name"], "bank").tolist() == [True, False, True]
+
+
+class TestCsvStreaming:
+    """Tests for the chunked streaming mode used for large CSV files."""
+
+    CALLS = [
+        (tools.get_mean_impl, ("roads.csv", "PQI")),
+        (tools.get_min_in_column_impl, ("roads.csv", "Cost")),
+        (tools.get_max_in_column_impl, ("roads.csv", "Road Name")),
+        (tools.get_sum_in_column_impl, ("roads.csv", "Cost")),
+        (tools.count_values_impl, ("roads.csv", "Road Name")),
+        (tools.get_sum_of_filtered_values_impl, ("roads.csv", "Cost", "bank", "Road Name")),
+        (tools.get_sum_of_filtered_values_impl, ("roads.csv", "Cost", "14")),
+        (tools.filter_values_in_range_impl, ("roads.csv", "PQI", 40, 90)),
+        (tools.filter_values_in_range_impl, ("roads.csv", "PQI", 100, 200)),
+    ]
+
+    @pytest.mark.parametrize("tool, args", CALLS)
+    def test_streamed_results_match_in_memory_results(self, stored_files, monkeypatch, tool, args):
+        expected = json.loads(tool(*args))
+        monkeypatch.setattr(tools, "SPREADSHEET_STREAMING_THRESHOLD_BYTES", 0)
+        monkeypatch.setattr(tools, "SPREADSHEET_STREAMING_CHUNK_ROWS", 3)
+        clear_spreadsheet_cache()
+
+        assert json.loads(tool(*args)) == expected
+        assert get_spreadsheet_cache_stats()["misses"] == 0
+
+    def test_streamed_range_filter_truncates_large_results(self, tmp_path, stored_files, monkeypatch):
+        pd.DataFrame({"Id": range(150), "Value": range(150)}).to_csv(tmp_path / "big.csv", index=False)
+        monkeypatch.setattr(tools, "SPREADSHEET_STREAMING_THRESHOLD_BYTES", 0)
+        monkeypatch.setattr(tools, "SPREADSHEET_STREAMING_CHUNK_ROWS", 7)
+
+        data = _data(tools.filter_values_in_range_impl("big.csv", "Value", 20, 139))
+        assert data["row_count"] == 120
+        assert data["truncated"] is True
+        assert data["result"].splitlines()[2].split()[0] == "22"
+
+    def test_streamed_missing_column_is_reported(self, stored_files, monkeypatch):
+        monkeypatch.setattr(tools, "SPREADSHEET_STREAMING_THRESHOLD_BYTES", 0)
+        payload = json.loads(tools.get_sum_in_column_impl("roads.csv", "Missing"))
+        assert payload["error"]["code"] == "COLUMN_NOT_FOUND"
+
+
+class TestCsvLoader:
+    """Tests for encoding detection and the persisted CSV schema."""
+
+    @pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp1252"])
+    def test_encoding_is_detected(self, tmp_path, encoding):
+        path = tmp_path / "parks.csv"
+        path.write_bytes("Park,Name\n1,Parc Jacques-Cartier – Été\n".encode(encoding))
+
+        assert csv_loader.detect_csv_encoding(str(path)) == encoding
+        frame = csv_loader.read_csv_file(str(path))
+        assert list(frame.columns) == ["Park", "Name"]
+        assert frame["Name"][0] == "Parc Jacques-Cartier – Été"
+
+    @pytest.mark.parametrize("use_pyarrow", [True, False])
+    def test_later_reads_use_persisted_schema(self, stored_files, tmp_path, monkeypatch, use_pyarrow):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_DIR", str(tmp_path))
+        path = str(tmp_path / "roads.csv")
+        first = csv_loader.read_csv_file(path)
+        with open(path + ".schema.json", encoding="utf-8") as schema_file:
+            schema = json.load(schema_file)
+        assert schema["encoding"] == "utf-8"
+        assert schema["dtypes"]["Cost"] == "int64"
+
+        csv_loader._SCHEMA_MEMO.clear()
+        monkeypatch.setattr(csv_loader, "CSV_PYARROW_ENGINE", use_pyarrow)
+        monkeypatch.setattr(
+            csv_loader, "detect_csv_encoding", lambda _: pytest.fail("encoding detected twice")
+        )
+        pd.testing.assert_frame_equal(csv_loader.read_csv_file(path), first)
+
+    def test_streamed_reads_persist_the_schema(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_DIR", str(tmp_path))
+        path = tmp_path / "roads.csv"
+        ROADS.assign(Ward=["14", "14", None, "3"]).to_csv(path, index=False)
+        detect = csv_loader.detect_csv_encoding
+        detections = []
+        monkeypatch.setattr(
+            csv_loader, "detect_csv_encoding", lambda p: detections.append(p) or detect(p)
+        )
+
+        chunks = list(csv_loader.iter_csv_chunks(str(path), ["Road Name", "Cost", "Ward"], 2))
+        with open(str(path) + ".schema.json", encoding="utf-8") as schema_file:
+            schema = json.load(schema_file)
+        assert len(detections) == 1
+        assert schema["encoding"] == "utf-8"
+        # Ward has a blank in only one chunk, so its chunks disagree and it is not stored.
+        assert schema["dtypes"] == {"Road Name": str(chunks[0]["Road Name"].dtype), "Cost": "int64"}
+
+        csv_loader._SCHEMA_MEMO.clear()
+        frame = csv_loader.read_csv_file(str(path))
+        assert len(detections) == 1
+        pd.testing.assert_frame_equal(frame, pd.read_csv(path))
+
+    def test_schema_of_a_changed_file_is_ignored(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_DIR", str(tmp_path))
+        path = tmp_path / "roads.csv"
+        ROADS.to_csv(path, index=False)
+        csv_loader.read_csv_file(str(path))
+        ROADS.assign(Cost="TBD").to_csv(path, index=False)
+
+        assert csv_loader.read_csv_file(str(path))["Cost"].tolist() == ["TBD"] * 4
+
+
+class TestCompactFrames:
+    """Tests for the compact dtypes of cached frames."""
+
+    CALLS = [
+        (tools.get_mean_impl, ("inventory.csv", "Length")),
+        (tools.get_min_in_column_impl, ("inventory.csv", "Class")),
+        (tools.get_max_in_column_impl, ("inventory.csv", "Length")),
+        (tools.get_sum_in_column_impl, ("inventory.csv", "Cost")),
+        (tools.get_unique_values_impl, ("inventory.csv", "Condition")),
+        (tools.get_unique_values_impl, ("inventory.csv", "Length")),
+        (tools.filter_values_impl, ("inventory.csv", ["Length"], "3.0")),
+        (tools.count_values_impl, ("inventory.csv", "Condition")),
+        (tools.filter_values_impl, ("inventory.csv", ["Class"], "arter")),
+        (tools.get_sum_of_filtered_values_impl, ("inventory.csv", "Cost", "poor", "Condition")),
+        (tools.aggregate_impl, ("inventory.csv", ["Cost", "Length", "Class"], ["sum", "max", "p50"])),
+        (tools.group_aggregate_impl, ("inventory.csv", "Class", "Cost", "sum", 0)),
+        (tools.group_aggregate_impl, ("inventory.csv", "Condition", "Length", "mean", 0)),
+    ]
+
+    @pytest.fixture
+    def inventory(self, stored_files, tmp_path):
+        rows = 60
+        pd.DataFrame(
+            {
+                "Class": ["Local", "Arterial", "Collector"] * (rows // 3),
+                "Condition": ["Good", "Poor", "Fair", "Good", "Poor", "Poor"] * (rows // 6),
+                "Cost": [70000 + i for i in range(rows)],
+                "Length": [None if i % 7 == 0 else i % 5 for i in range(rows)],
+            }
+        ).to_csv(tmp_path / "inventory.csv", index=False)
+
+    @pytest.mark.parametrize("tool, args", CALLS)
+    def test_results_match_uncompacted_frames(self, inventory, monkeypatch, tool, args):
+        compact = json.loads(tool(*args))
+        clear_spreadsheet_cache()
+        monkeypatch.setattr(spreadsheet_cache, "SPREADSHEET_COMPACT_DTYPES", False)
+
+        assert compact["status"] == "success"
+        assert compact == json.loads(tool(*args))
+
+    def test_memory_before_and_after_is_reported(self, inventory):
+        df, _ = tools._get_spreadsheet("inventory.csv")
+        assert isinstance(df["Class"].dtype, pd.CategoricalDtype)
+        assert str(df["Cost"].dtype) == "int32"
+        assert str(df["Length"].dtype) == "float64"
+
+        (report,) = get_spreadsheet_cache_stats()["files"]
+        assert report["filename"] == "inventory.csv"
+        assert report["compact_bytes"] < report["parsed_bytes"]
+
+    def test_booleans_with_blanks_are_not_categorized(self, stored_files, tmp_path):
+        pd.DataFrame(
+            {"Inspected": [True, False, None, True] * 5, "Cost": range(20)}
+        ).to_csv(tmp_path / "inspections.csv", index=False)
+
+        df, _ = tools._get_spreadsheet("inspections.csv")
+        assert not isinstance(df["Inspected"].dtype, pd.CategoricalDtype)
+        assert json.loads(tools.get_sum_in_column_impl("inspections.csv", "Inspected"))["status"] == "success"
+
+    def test_whole_number_floats_keep_their_text(self):
+        column = pd.Series([1e19, None, 2.0, 3.0])
+        pd.testing.assert_series_equal(spreadsheet_cache._compact_column(column), column)
@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import MagicMock
 from fastapi.testclient import TestClient
@@ -122,3 +126,42 @@ def test_search_run_sse_endpoint_allows_valid_token(monkeypatch):
     )
 
     assert response.status_code != 401
+
+
+def test_cache_stats_endpoint_rejects_missing_authorization_header():
+    response = client.get("/api/cache-stats")
+
+    assert response.status_code == 401
+
+
+def test_cache_stats_endpoint_reports_every_cache(monkeypatch):
+    mock_supabase = MagicMock()
+    mock_supabase.auth.get_user.return_value = SimpleNamespace(
+        user=SimpleNamespace(id="user-123")
+    )
+    monkeypatch.setattr(server, "get_supabase_client", lambda: mock_supabase)
+
+    response = client.get(
+        "/api/cache-stats",
+        headers={"Authorization": "Bearer valid-token"},
+    )
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert set(stats) == {"files", "spreadsheets", "pdfs"}
+    assert "hit_rate" in stats["pdfs"]
+
+
+def test_server_imports_with_only_the_backend_directory_on_the_path():
+    # Mirrors the Dockerfile's PYTHONPATH=/app, without the conftest's extra src/ entry.
+    backend_dir = Path(__file__).resolve().parents[2]
+    result = subprocess.run(
+        [sys.executable, "-c", "import src.server"],
+        cwd=backend_dir,
+        env={**os.environ, "PYTHONPATH": str(backend_dir)},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
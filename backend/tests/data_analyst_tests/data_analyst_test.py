@@ -24,7 +24,7 @@ async def test_data_analyst_logic():
     )
 
     def _mock_download_supabase_file(storage_location: str, bucket: str | None):
-        return str(fixture_csv), bucket or "documents", storage_location
+        return str(fixture_csv), bucket or "documents", storage_location, None
 
     with patch(
         "city_agent.agent_tools.spreadsheet_analysis_tools.download_supabase_file",
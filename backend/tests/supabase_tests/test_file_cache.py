@@ -0,0 +1,143 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from src import file_cache
+from src import supabase_interface
+
+
+def _mock_client(last_updated="2024-01-01T00:00:00", content=b"a,b\n1,2\n"):
+    client = MagicMock()
+    query = client.table.return_value.select.return_value.eq.return_value.eq.return_value
+    query.limit.return_value.execute.return_value = MagicMock(
+        data=[{"last_updated": last_updated}] if last_updated else []
+    )
+    client.storage.from_.return_value.download.return_value = content
+    return client
+
+
+@pytest.fixture(autouse=True)
+def isolated_file_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_cache, "FILE_CACHE_DIR", str(tmp_path / "cache"))
+    file_cache.clear_file_cache()
+    yield
+    file_cache.clear_file_cache()
+
+
+class TestDownloadSupabaseFile:
+    """Tests for the cached download path."""
+
+    def test_repeat_lookup_does_no_network_io(self, monkeypatch):
+        client = _mock_client()
+        monkeypatch.setattr(supabase_interface, "get_supabase_client", lambda: client)
+
+        first = supabase_interface.download_supabase_file("roads.csv")
+        client.reset_mock()
+        second = supabase_interface.download_supabase_file("roads.csv")
+
+        assert first == second
+        assert first[3] == "2024-01-01T00:00:00"
+        client.table.assert_not_called()
+        client.storage.from_.assert_not_called()
+        with open(second[0], "rb") as f:
+            assert f.read() == b"a,b\n1,2\n"
+
+    def test_revalidate_reuses_bytes_when_version_unchanged(self, monkeypatch):
+        client = _mock_client()
+        monkeypatch.setattr(supabase_interface, "get_supabase_client", lambda: client)
+
+        first = supabase_interface.download_supabase_file("roads.csv")
+        second = supabase_interface.download_supabase_file("roads.csv", revalidate=True)
+
+        assert first[0] == second[0]
+        assert client.storage.from_.return_value.download.call_count == 1
+
+    def test_new_version_is_downloaded_again(self, monkeypatch):
+        client = _mock_client()
+        monkeypatch.setattr(supabase_interface, "get_supabase_client", lambda: client)
+        first = supabase_interface.download_supabase_file("roads.csv")
+
+        updated = _mock_client(last_updated="2024-02-01T00:00:00", content=b"a,b\n3,4\n")
+        monkeypatch.setattr(supabase_interface, "get_supabase_client", lambda: updated)
+        second = supabase_interface.download_supabase_file("roads.csv", revalidate=True)
+
+        assert first[0] != second[0]
+        with open(second[0], "rb") as f:
+            assert f.read() == b"a,b\n3,4\n"
+
+    def test_unversioned_objects_are_keyed_by_content(self, monkeypatch):
+        client = _mock_client(last_updated=None)
+        monkeypatch.setattr(supabase_interface, "get_supabase_client", lambda: client)
+
+        first = supabase_interface.download_supabase_file("a.csv", revalidate=True)
+        second = supabase_interface.download_supabase_file("b.csv", revalidate=True)
+
+        assert first[0] == second[0]
+        assert file_cache.file_cache_stats()["entries"] == 1
+
+
+class TestFileCacheEviction:
+    """Tests for LRU eviction under the byte budget."""
+
+    @pytest.fixture(autouse=True)
+    def no_leases(self, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_LEASE_SECONDS", 0)
+
+    def test_evicts_least_recently_used_file_and_artifacts(self, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_MAX_BYTES", 10)
+        name_a, name_b, name_c = ("a" * 64 + ".csv", "b" * 64 + ".csv", "c" * 64 + ".csv")
+        path_a = file_cache.store_file(name_a, b"12345")
+        path_b = file_cache.store_file(name_b, b"12345")
+        with open(file_cache.artifact_path(path_b, "schema.json"), "w") as f:
+            f.write("{}")
+
+        # Touch the first file so the second becomes least recently used.
+        assert file_cache.get_cached_file(name_a) == path_a
+        file_cache.store_file(name_c, b"12345")
+
+        assert file_cache.get_cached_file(name_b) is None
+        assert not os.path.exists(path_b)
+        assert not os.path.exists(file_cache.artifact_path(path_b, "schema.json"))
+        assert file_cache.get_cached_file(name_a) == path_a
+        assert file_cache.file_cache_stats()["evictions"] == 1
+
+    def test_artifacts_count_towards_the_budget(self, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_MAX_BYTES", 12)
+        name_a, name_b = ("a" * 64 + ".csv", "b" * 64 + ".csv")
+        path_a = file_cache.store_file(name_a, b"12345")
+        path_b = file_cache.store_file(name_b, b"12345")
+        assert file_cache.file_cache_stats()["bytes"] == 10
+
+        file_cache.save_artifact_json(path_b, "schema.json", {"k": 1})
+
+        # The artifact pushed the cache over budget, so the older file was evicted.
+        assert not os.path.exists(path_a)
+        assert file_cache.file_cache_stats()["bytes"] == 5 + len('{"k": 1}')
+        assert os.path.exists(file_cache.artifact_path(path_b, "schema.json"))
+
+    def test_pinned_files_are_not_evicted(self, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_MAX_BYTES", 10)
+        name_a, name_b, name_c = ("a" * 64 + ".csv", "b" * 64 + ".csv", "c" * 64 + ".csv")
+        path_a = file_cache.store_file(name_a, b"12345")
+        path_b = file_cache.store_file(name_b, b"12345")
+
+        with file_cache.pinned(path_a):
+            file_cache.store_file(name_c, b"12345")
+            assert os.path.exists(path_a)
+            assert not os.path.exists(path_b)
+
+        file_cache.store_file("d" * 64 + ".csv", b"12345")
+        assert not os.path.exists(path_a)
+
+    def test_recently_handed_out_files_are_not_evicted(self, monkeypatch):
+        monkeypatch.setattr(file_cache, "FILE_CACHE_MAX_BYTES", 5)
+        monkeypatch.setattr(file_cache, "FILE_CACHE_LEASE_SECONDS", 300)
+        name_a, name_b = ("a" * 64 + ".csv", "b" * 64 + ".csv")
+        path_a = file_cache.store_file(name_a, b"12345")
+        path_b = file_cache.store_file(name_b, b"12345")
+
+        # Over budget, but the first file may still be read by the tool that fetched it.
+        assert os.path.exists(path_a)
+        assert os.path.exists(path_b)
+        assert file_cache.file_cache_stats()["evictions"] == 0
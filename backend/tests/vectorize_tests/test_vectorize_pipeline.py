@@ -13,11 +13,27 @@ from src.rag_pipeline.vectorize_excel import (
     _vectorize,
     vectorize_excel,
 )
+from src.rag_pipeline import vectorize_pdf as vectorize_pdf_module
 from src.rag_pipeline.vectorize_pdf import vectorize_pdf
+from src.rag_pipeline import excel_classification_cache, pdf_chunker, pdf_heuristics, vectorize_checkpoint
 from src.rag_pipeline.vector import add_documents_to_vector_store
 
 FIXTURES_DIR = Path(__file__).parent / "fixtures"
 
+
+def _page_batches(pages, batch_size=2):
+    """Stand in for iter_pdf_pages_async, converting `pages` from a fixed list."""
+    async def iter_pages(local_path):
+        for start in range(0, len(pages), batch_size):
+            yield [dict(page) for page in pages[start : start + batch_size]]
+
+    return iter_pages
+
+
+def _documents(events):
+    return [doc for event in events if event["type"] == "documents" for doc in event["documents"]]
+
+
 class TestIsEnglishHeader:
     """Tests for _is_english_header heuristic."""
 
@@ -48,6 +64,10 @@ class TestIsEnglishHeader:
 class TestVectorizeExcel:
     """Tests for vectorize_excel with mocked LLM agent."""
 
+    @pytest.fixture(autouse=True)
+    def classification_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(excel_classification_cache, "EXCEL_CLASSIFICATION_CACHE_DIR", str(tmp_path / "classifications"))
+
     @pytest.mark.asyncio
     async def test_vectorize_produces_documents_with_metadata(self):
         df = pd.DataFrame({
@@ -128,6 +148,95 @@ class TestVectorizeExcel:
         assert all(hasattr(d, "page_content") and hasattr(d, "metadata") for d in docs)
         assert any(d.metadata.get("filename") == "sample_roads.csv" for d in docs)
 
+    def test_row_documents_match_the_iterrows_output(self, tmp_path, monkeypatch):
+        """The columnar builder keeps the row loop's text, grouping and dtype quirks."""
+        from src.rag_pipeline import vectorize_excel as vectorize_excel_module
+
+        monkeypatch.setattr(vectorize_excel_module, "EXCEL_ROWS_PER_VECTOR", 2)
+        source = tmp_path / "roads.csv"
+        source.write_text("")
+        # In an all-numeric frame df.iterrows() reads int columns as float.
+        df = pd.DataFrame(
+            {"Name": [1.5, 2.5, None, 4.5], "Note": [None, 0.5, None, 2.0], "Ward": [3, 4, 5, 6]},
+            index=[10, 11, 12, 13],
+        )
+
+        docs, ids = vectorize_excel_module._build_row_documents(
+            df, ["Name", "Note", "Missing"], ["Ward"], str(source)
+        )
+
+        assert [doc.page_content for doc in docs] == ["[10: 1.5, 11: 2.5 0.5]", "[13: 4.5 2.0]"]
+        assert docs[0].metadata == {
+            "rowdata": {
+                "10": {"metadata": {"Name": "1.5", "Ward": "3.0"}},
+                "11": {"metadata": {"Name": "2.5", "Note": "0.5", "Ward": "4.0"}},
+            }
+        }
+        assert docs[1].metadata["rowdata"] == {"13": {"metadata": {"Name": "4.5", "Note": "2.0", "Ward": "6.0"}}}
+        assert docs[1].metadata["filename"] == "roads.csv"
+        assert len(ids) == 2
+
+
+
+class TestExcelClassificationCache:
+    """Tests for reusing column classifications of repeated spreadsheet schemas."""
+
+    RESPONSE = '{"page_content":{"1":"Road Name","0":"Comments"},"metadata":{"2":"Ward"}}'
+
+    @pytest.fixture(autouse=True)
+    def classification_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(excel_classification_cache, "EXCEL_CLASSIFICATION_CACHE_DIR", str(tmp_path / "classifications"))
+
+    async def _vectorize_sheets(self, tmp_path, *dfs):
+        source = tmp_path / "roads.csv"
+        source.write_text("")
+        call_agent = AsyncMock(return_value=self.RESPONSE)
+        with patch("src.rag_pipeline.vectorize_excel.call_agent", call_agent):
+            docs = [(await _vectorize(df, str(source)))[0] for df in dfs]
+        return call_agent, docs
+
+    @pytest.mark.asyncio
+    async def test_repeated_schema_skips_the_agent(self, tmp_path):
+        january = pd.DataFrame({"Comments": ["Paved"], "Road Name": ["FERGUS CR"], "Ward": [3]})
+        # Same headers, reordered and with different case and spacing.
+        february = pd.DataFrame({"ward": [4], "ROAD  NAME": ["KING ST"], "comments ": ["Sealed"]})
+
+        call_agent, (january_docs, february_docs) = await self._vectorize_sheets(tmp_path, january, february)
+
+        call_agent.assert_awaited_once()
+        # The agent's page content order is kept: Road Name before Comments.
+        assert january_docs[0].page_content == "[0: FERGUS CR Paved]"
+        assert february_docs[0].page_content == "[0: KING ST Sealed]"
+        assert february_docs[0].metadata["rowdata"]["0"]["metadata"]["ward"] == "4"
+
+    @pytest.mark.asyncio
+    async def test_invalidated_schema_is_classified_again(self, tmp_path, capsys):
+        df = pd.DataFrame({"Comments": ["Paved"], "Road Name": ["FERGUS CR"], "Ward": [3]})
+        await self._vectorize_sheets(tmp_path, df)
+        signature = excel_classification_cache.header_signature(list(df.columns))
+
+        excel_classification_cache.main(["list"])
+        assert signature in capsys.readouterr().out
+        excel_classification_cache.main(["invalidate", signature])
+        assert excel_classification_cache.load_classification(signature, list(df.columns)) is None
+
+        call_agent, _ = await self._vectorize_sheets(tmp_path, df)
+        call_agent.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_dtypes_are_part_of_the_key_when_enabled(self, tmp_path, monkeypatch):
+        from src.rag_pipeline import vectorize_excel as vectorize_excel_module
+
+        monkeypatch.setattr(vectorize_excel_module, "EXCEL_CLASSIFICATION_CACHE_DTYPES", True)
+        numeric_ward = pd.DataFrame({"Comments": ["Paved"], "Road Name": ["FERGUS CR"], "Ward": [3]})
+        text_ward = pd.DataFrame({"Comments": ["Paved"], "Road Name": ["FERGUS CR"], "Ward": ["Three"]})
+
+        call_agent, _ = await self._vectorize_sheets(tmp_path, numeric_ward, text_ward, numeric_ward)
+
+        assert call_agent.await_count == 2
+
+    def test_headers_that_normalize_alike_are_not_cached(self):
+        assert excel_classification_cache.header_signature(["Ward", "ward "]) is None
 
 
 class TestVectorizePdf:
@@ -137,12 +246,12 @@ class TestVectorizePdf:
     async def test_vectorize_pdf_raises_for_non_pdf(self):
         """vectorize_pdf raises ValueError for non-.pdf paths."""
         with pytest.raises(ValueError, match="not a PDF"):
-            await vectorize_pdf("/path/to/file.txt")
+            [event async for event in vectorize_pdf("/path/to/file.txt")]
 
     @pytest.mark.asyncio
     async def test_vectorize_pdf_produces_documents_when_mocked(self):
         """With mocked call_agent and pymupdf4llm, returns (documents, ids)."""
-        mock_markdown = "## Section 1\nSome content here."
+        mock_markdown = [{"text": "## Section 1\nSome content here.", "metadata": {"page_number": 1}}]
         mock_agent_response = json.dumps({
             "metadata": {"source_file": "test.pdf", "service_area": "Transport", "topic": "Roads", "data_type": "Condition"},
             "page_content": {"context_header": "Section 1", "content_body": "Some content here.", "key_metrics": []},
@@ -154,12 +263,14 @@ class TestVectorizePdf:
             pdf_path = tmp.name
 
         try:
-            with patch("src.rag_pipeline.vectorize_pdf.pymupdf4llm.to_markdown", return_value=mock_markdown), patch(
+            with patch("src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(mock_markdown)), patch(
                 "src.rag_pipeline.vectorize_pdf.call_agent",
                 new_callable=AsyncMock,
                 return_value=mock_agent_response,
             ), patch("src.rag_pipeline.vectorize_pdf.get_agent_ctx_window_size", return_value=4096):
-                docs, ids = await vectorize_pdf(pdf_path)
+                events = [event async for event in vectorize_pdf(pdf_path)]
+            docs = _documents(events)
+            ids = [_id for event in events if event["type"] == "documents" for _id in event["ids"]]
 
             assert len(docs) >= 1
             assert len(ids) >= 1
@@ -168,6 +279,216 @@ class TestVectorizePdf:
         finally:
             os.unlink(pdf_path)
 
+    @staticmethod
+    def _chunk_response(text):
+        return json.dumps({
+            "metadata": {"source_file": "test.pdf", "service_area": "Citywide", "topic": "T", "data_type": "D"},
+            "page_content": {"context_header": "", "content_body": text, "key_metrics": []},
+        })
+
+    async def _run_chunks(self, fake_call_agent, concurrency=3):
+        # A 10-token budget fits one of these pages per chunk: 4 chunks.
+        markdown = [
+            {"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 5)
+        ]
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            pdf_path = tmp.name
+        try:
+            with patch("src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(markdown)), patch(
+                "src.rag_pipeline.vectorize_pdf.call_agent", side_effect=fake_call_agent
+            ), patch("src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10), patch.object(
+                vectorize_pdf_module, "PDF_VECTORIZE_CONCURRENCY", concurrency
+            ):
+                return [event async for event in vectorize_pdf(pdf_path)]
+        finally:
+            os.unlink(pdf_path)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_chunks_keep_chunk_order(self):
+        """Chunks finishing out of order still produce documents in chunk order."""
+        import asyncio
+
+        in_flight = 0
+        peak = 0
+
+        async def fake_call_agent(runner, agent, session_id, query):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            # Later chunks answer first.
+            await asyncio.sleep(0.01 * (5 - int(query.split()[2])))
+            in_flight -= 1
+            return self._chunk_response(query)
+
+        concurrent = await self._run_chunks(fake_call_agent)
+        assert peak == 3
+        sequential = await self._run_chunks(fake_call_agent, concurrency=1)
+
+        progress = [event["chunks_created"] for event in concurrent if event["type"] == "chunking"]
+        assert progress == sorted(set(progress)) and progress[-1] == 4
+        expected = [f"Chunk number {d} text." for d in range(1, 5)]
+        assert [doc.page_content for doc in _documents(concurrent)] == expected
+        assert [doc.page_content for doc in _documents(sequential)] == expected
+
+    @pytest.mark.asyncio
+    async def test_failed_chunk_is_retried_on_its_own(self):
+        """Only failing chunks are re-sent; a chunk without valid JSON after every attempt is skipped."""
+        from collections import Counter
+
+        calls = Counter()
+
+        async def fake_call_agent(runner, agent, session_id, query):
+            calls[query] += 1
+            if query == "Chunk number 1 text." and calls[query] == 1:
+                raise RuntimeError("rate limited")
+            if query == "Chunk number 2 text." and calls[query] == 1:
+                return "not json"
+            if query == "Chunk number 3 text.":
+                return "not json"
+            return self._chunk_response(query)
+
+        events = await self._run_chunks(fake_call_agent)
+
+        assert [doc.page_content for doc in _documents(events)] == [
+            "Chunk number 1 text.",
+            "Chunk number 2 text.",
+            "Chunk number 4 text.",
+        ]
+        assert calls == {
+            "Chunk number 1 text.": 2,
+            "Chunk number 2 text.": 2,
+            "Chunk number 3 text.": 2,
+            "Chunk number 4 text.": 1,
+        }
+
+    @pytest.mark.asyncio
+    async def test_chunk_failing_every_attempt_raises(self):
+        async def fake_call_agent(runner, agent, session_id, query):
+            raise RuntimeError("provider down")
+
+        with pytest.raises(RuntimeError, match="provider down"):
+            await self._run_chunks(fake_call_agent)
+
+class TestPdfChunker:
+    """Tests for token- and structure-aware chunking of PDF page markdown."""
+
+    @pytest.fixture(autouse=True)
+    def word_tokens(self, monkeypatch):
+        # One token per word keeps budgets readable and independent of the tokenizer.
+        monkeypatch.setattr(pdf_chunker, "count_tokens", lambda text: len(text.split()))
+
+    TABLE = "|Asset|Cost|\n|---|---|\n|Roads|10|\n|Bridges|20|\n|Culverts|30|"
+
+    def test_small_pages_are_packed_together(self):
+        pages = [{"text": f"Page {n} words.", "metadata": {"page_number": n}} for n in range(1, 5)]
+
+        chunks = pdf_chunker.chunk_markdown_pages(pages, target_tokens=6)
+
+        assert [chunk["pages"] for chunk in chunks] == [[1, 2], [3, 4]]
+        assert chunks[0]["text"] == "Page 1 words.\n\nPage 2 words."
+
+    def test_tables_are_not_cut_mid_row(self):
+        pages = [{"text": f"Intro text here.\n\n{self.TABLE}", "metadata": {"page_number": 1}}]
+
+        chunks = pdf_chunker.chunk_markdown_pages(pages, target_tokens=6)
+
+        assert [chunk["text"] for chunk in chunks] == ["Intro text here.", self.TABLE]
+
+    def test_oversized_table_repeats_its_header(self):
+        pages = [{"text": self.TABLE, "metadata": {"page_number": 1}}]
+
+        chunks = pdf_chunker.chunk_markdown_pages(pages, target_tokens=3)
+
+        assert [chunk["text"].split("\n") for chunk in chunks] == [
+            ["|Asset|Cost|", "|---|---|", "|Roads|10|"],
+            ["|Asset|Cost|", "|---|---|", "|Bridges|20|"],
+            ["|Asset|Cost|", "|---|---|", "|Culverts|30|"],
+        ]
+
+    def test_headings_start_chunks_and_prefix_continuations(self):
+        text = "# Roads\n\nOne two three four.\n\n# Water\n\nFive six seven eight.\n\nNine ten eleven twelve."
+        chunks = pdf_chunker.chunk_markdown_pages([{"text": text}], target_tokens=9)
+
+        assert [chunk["text"] for chunk in chunks] == [
+            "# Roads\n\nOne two three four.",
+            "# Water\n\nFive six seven eight.",
+            "# Water\n\nNine ten eleven twelve.",
+        ]
+
+    def test_long_text_is_split_between_sentences(self):
+        text = "First short sentence. Second short sentence. Third short sentence."
+        chunks = pdf_chunker.chunk_markdown_pages([{"text": text}], target_tokens=6)
+
+        assert [chunk["text"] for chunk in chunks] == [
+            "First short sentence. Second short sentence.",
+            "Third short sentence.",
+        ]
+
+
+class TestHybridPdfVectorization:
+    """Tests for the LLM-free path for text-only PDF pages."""
+
+    PAGES = [
+        {
+            "text": "# Road Network\n\nThe road network is reviewed yearly.",
+            "metadata": {"page_number": 1},
+            "page_boxes": [{"class": "section-header"}, {"class": "text"}],
+        },
+        {
+            "text": "|Asset|Cost|\n|---|---|\n|Roads|10|",
+            "metadata": {"page_number": 2},
+            "page_boxes": [{"class": "table"}],
+        },
+        {
+            "text": "Closing remarks on the plan.",
+            "metadata": {"page_number": 3},
+            "page_boxes": [{"class": "text"}],
+        },
+    ]
+
+    def test_pages_with_tables_or_pictures_need_the_llm(self):
+        assert pdf_heuristics.is_text_only_page(self.PAGES[0]) is True
+        assert pdf_heuristics.is_text_only_page(self.PAGES[1]) is False
+        assert pdf_heuristics.is_text_only_page({"text": "![chart](chart.png)"}) is False
+        assert pdf_heuristics.is_text_only_page({"text": "|a|b|\n|---|---|"}) is False
+
+    def test_metadata_comes_from_headings_and_filename(self):
+        metadata = pdf_heuristics.heuristic_metadata(
+            "# Bridge Condition\n\nMost bridges are in good condition.", "/cache/asset_plan_2024.pdf"
+        )
+        assert metadata == {
+            "source_file": "asset_plan_2024.pdf",
+            "service_area": "Transportation",
+            "topic": "Bridge Condition",
+            "data_type": "Condition",
+        }
+        assert pdf_heuristics.heuristic_metadata("Some words.", "plan.pdf")["topic"] == "plan"
+
+    @pytest.mark.asyncio
+    async def test_only_complex_pages_are_sent_to_the_llm(self):
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(self.PAGES)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=1000
+        ), patch.object(vectorize_pdf_module, "PDF_VECTORIZE_MODE", "hybrid"):
+            events = [event async for event in vectorize_pdf(tmp.name)]
+
+        call_agent.assert_awaited_once()
+        assert call_agent.await_args.args[3] == self.PAGES[1]["text"]
+        result = events[-1]
+        assert result["llm_calls_avoided"] == 2
+        assert [doc.page_content for doc in _documents(events)] == [
+            self.PAGES[0]["text"],
+            self.PAGES[1]["text"],
+            self.PAGES[2]["text"],
+        ]
+        assert _documents(events)[0].metadata["topic"] == "Road Network"
+        assert _documents(events)[0].metadata["service_area"] == "Transportation"
+
+
 class TestAddDocumentsToVectorStore:
     """Tests for add_documents_to_vector_store batching logic."""
 
@@ -194,3 +515,372 @@ class TestAddDocumentsToVectorStore:
         assert len(first_rows) == 3
         assert len(second_rows) == 3
         assert len(third_rows) == 1
+
+
+class TestVectorizeCheckpoint:
+    """Tests for resuming vectorization jobs from their checkpoint."""
+
+    @pytest.fixture(autouse=True)
+    def checkpoint_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vectorize_checkpoint, "VECTORIZE_CHECKPOINT_DIR", str(tmp_path))
+
+    def test_records_survive_reopening(self):
+        checkpoint = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v1")
+        checkpoint.record_chunk(0, "digest", {"page_content": {}})
+        checkpoint.record_documents([Document(page_content="text", metadata={"k": 1}, id="id-0")], ["id-0"])
+        checkpoint.record_embeddings(["id-0"], [[0.5, 1.5]])
+        checkpoint.record_inserted(["id-0"])
+
+        reopened = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v1")
+
+        assert reopened.get_chunk(0, "digest") == (True, {"page_content": {}})
+        assert reopened.get_chunk(0, "other") == (False, None)
+        documents, ids = reopened.documents
+        assert (documents[0].page_content, documents[0].metadata, ids) == ("text", {"k": 1}, ["id-0"])
+        assert reopened.embeddings == {"id-0": [0.5, 1.5]}
+        assert reopened.inserted == {"id-0"}
+
+    def test_new_version_discards_old_checkpoint(self):
+        old = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v1")
+        old.record_inserted(["id-0"])
+
+        new = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v2")
+
+        assert new.inserted == set()
+        assert not os.path.exists(old.path)
+        new.complete()
+        assert not os.path.exists(new.path)
+
+    @pytest.mark.asyncio
+    async def test_failed_insert_resumes_after_last_completed_batch(self):
+        docs = [Document(page_content=f"row-{i}", metadata={}) for i in range(5)]
+        ids = [f"id-{i}" for i in range(5)]
+        embed = MagicMock(side_effect=lambda texts: [[float(len(text))] for text in texts])
+        inserted = []
+        # Fails the batch holding id-3 and then its row-by-row retry.
+        failures = {"left": 2}
+
+        def insert(client, table_name, rows, start_idx, size):
+            if any(row["id"] == "id-3" for row in rows) and failures["left"]:
+                failures["left"] -= 1
+                raise RuntimeError("connection lost")
+            inserted.extend(row["id"] for row in rows)
+
+        async def run():
+            checkpoint = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.csv", "v1")
+            return [event async for event in add_documents_to_vector_store(docs, ids, checkpoint)]
+
+        with patch.dict(os.environ, {"SUPABASE_INSERT_BATCH_SIZE": "2"}, clear=False), patch(
+            "src.rag_pipeline.vector.get_supabase_client", return_value=MagicMock()
+        ), patch("src.rag_pipeline.vector._insert_rows_with_retry", side_effect=insert), patch(
+            "src.rag_pipeline.vector._embed_documents_with_retry", embed
+        ):
+            with pytest.raises(RuntimeError):
+                await run()
+            assert inserted == ["id-0", "id-1", "id-2"]
+            assert embed.call_count == 2
+
+            events = await run()
+
+        assert inserted == ["id-0", "id-1", "id-2", "id-3", "id-4"]
+        # The failed batch reuses its recorded embeddings; only the last batch is embedded.
+        assert embed.call_count == 3
+        assert [event["chunks_embedded"] for event in events] == [2, 4, 5]
+
+    @pytest.mark.asyncio
+    async def test_vectorize_pdf_skips_recorded_chunks(self):
+        checkpoint = vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v1")
+        pages = [{"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 4)]
+        recorded = json.loads(TestVectorizePdf._chunk_response("from checkpoint"))
+        checkpoint.record_chunk(0, vectorize_checkpoint.chunk_digest("Chunk number 1 text."), recorded)
+        # A chunk whose text changed is structured again.
+        checkpoint.record_chunk(1, vectorize_checkpoint.chunk_digest("old text"), recorded)
+        call_agent = AsyncMock(side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query))
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(pages)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ):
+            events = [event async for event in vectorize_pdf(tmp.name, checkpoint)]
+
+        assert call_agent.await_count == 2
+        assert [doc.page_content for doc in _documents(events)] == [
+            "from checkpoint",
+            "Chunk number 2 text.",
+            "Chunk number 3 text.",
+        ]
+        assert vectorize_checkpoint.VectorizeCheckpoint("documents", "a.pdf", "v1").get_chunk(
+            2, vectorize_checkpoint.chunk_digest("Chunk number 3 text.")
+        )[0]
+
+
+class TestIncrementalPdfVectorization:
+    """Tests for keeping vector rows of unchanged PDF pages across versions."""
+
+    PAGES = [
+        {"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 4)
+    ]
+
+    @staticmethod
+    def _hash(text):
+        return pdf_chunker.page_content_hash({"text": text})
+
+    @pytest.mark.asyncio
+    async def test_unchanged_pages_keep_their_rows(self):
+        existing_rows = {
+            "kept": [self._hash("Chunk number 1 text.")],
+            "changed": [self._hash("Chunk number 2 old text.")],
+            "legacy": None,
+        }
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        pages = [dict(page, metadata=dict(page["metadata"])) for page in self.PAGES]
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(pages)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ):
+            events = [event async for event in vectorize_pdf(tmp.name, existing_rows=existing_rows)]
+
+        reuse_event = next(event for event in events if event.get("pages_reused"))
+        assert reuse_event["chunks_reused"] == 1
+        result = events[-1]
+        assert result["reused_row_ids"] == ["kept"]
+        assert result["pages_reused"] == 1
+        assert call_agent.await_count == 2
+        assert [doc.metadata["page_numbers"] for doc in _documents(events)] == [[2], [3]]
+        assert _documents(events)[0].metadata["page_hashes"] == [self._hash("Chunk number 2 text.")]
+
+    @pytest.mark.asyncio
+    async def test_stale_rows_are_deleted_after_insert(self, tmp_path, monkeypatch):
+        from src.rag_pipeline import vector
+
+        monkeypatch.setattr(vectorize_checkpoint, "VECTORIZE_CHECKPOINT_DIR", str(tmp_path))
+        new_doc = Document(page_content="new", metadata={"page_hashes": ["h2"]})
+
+        async def fake_vectorize_pdf(local_path, checkpoint, existing_rows):
+            assert existing_rows == {"kept": ["h1"], "changed": ["old"]}
+            yield {"type": "documents", "documents": [new_doc], "ids": ["new-id"]}
+            yield {
+                "type": "result",
+                "llm_calls_avoided": 0,
+                "pages_reused": 1,
+                "reused_row_ids": ["kept"],
+                "page_hashes": {1: "h2", 2: "h1"},
+            }
+
+        with patch.object(vector, "download_supabase_file", return_value=("/tmp/plan.pdf", "documents", "plan.pdf", "v2")), patch.object(
+            vector, "get_table_index"
+        ), patch.object(
+            vector, "_fetch_existing_page_hashes", return_value={"kept": ["h1"], "changed": ["old"]}
+        ), patch.object(vector, "vectorize_pdf", fake_vectorize_pdf), patch.object(
+            vector, "get_supabase_client", return_value=MagicMock()
+        ), patch.object(vector, "_insert_rows_with_retry") as insert, patch.object(
+            vector, "_delete_rows"
+        ) as delete_rows, patch.object(vector, "_refresh_reused_rows") as refresh, patch.dict(
+            os.environ, {"SUPABASE_WRITE_EMBEDDINGS": "false"}, clear=False
+        ):
+            events = [event async for event in vector.vectorize_and_store_supabase_file("plan.pdf", "documents")]
+
+        assert insert.call_args.args[2][0]["id"] == "new-id"
+        refresh.assert_called_once_with(["kept"], {1: "h2", 2: "h1"}, "v2")
+        delete_rows.assert_called_once_with(["changed"])
+        success = events[-1]
+        assert success["type"] == "success"
+        assert (success["pages_reused"], success["chunks_reused"]) == (1, 1)
+
+
+    def test_reused_rows_move_to_their_new_pages(self):
+        from src.rag_pipeline import vector
+
+        client = MagicMock()
+        client.table.return_value.select.return_value.in_.return_value.execute.return_value.data = [
+            {
+                "id": "kept",
+                "metadata": {
+                    "page_numbers": [1, 2],
+                    "page_hashes": ["h1", "h2"],
+                    "source_last_updated": "v1",
+                    "title": "Roads",
+                },
+            }
+        ]
+        # A page was inserted before the row's pages, and h2 also appears earlier.
+        page_hashes = {1: "h2", 2: "new", 3: "h1", 4: "h2"}
+
+        with patch.object(vector, "get_supabase_client", return_value=client):
+            vector._refresh_reused_rows(["kept"], page_hashes, "v2")
+
+        client.table.return_value.update.assert_called_once_with(
+            {
+                "metadata": {
+                    "page_numbers": [3, 4],
+                    "page_hashes": ["h1", "h2"],
+                    "source_last_updated": "v2",
+                    "title": "Roads",
+                },
+                "source_last_updated": "v2",
+            }
+        )
+        client.table.return_value.update.return_value.eq.assert_called_once_with("id", "kept")
+
+
+class TestStreamingPdfVectorization:
+    """Tests for storing PDF chunks while later pages are still being structured."""
+
+    PAGES = [
+        {"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 5)
+    ]
+
+    @pytest.fixture(autouse=True)
+    def checkpoint_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vectorize_checkpoint, "VECTORIZE_CHECKPOINT_DIR", str(tmp_path))
+
+    async def _store(self, call_agent, insert, existing_rows=None, delete_rows=None):
+        from src.rag_pipeline import vector
+
+        with patch.object(vector, "download_supabase_file", return_value=("/tmp/plan.pdf", "documents", "plan.pdf", "v1")), patch.object(
+            vector, "get_table_index"
+        ), patch.object(
+            vector, "_fetch_existing_page_hashes", return_value=existing_rows or {}
+        ), patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(self.PAGES)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ), patch.object(vector, "get_supabase_client", return_value=MagicMock()), patch.object(
+            vector, "_insert_rows_with_retry", side_effect=insert
+        ), patch.object(vector, "_delete_rows", delete_rows or MagicMock()), patch.dict(
+            os.environ, {"SUPABASE_WRITE_EMBEDDINGS": "false", "SUPABASE_INSERT_BATCH_SIZE": "2"}, clear=False
+        ):
+            return [event async for event in vector.vectorize_and_store_supabase_file("plan.pdf", "documents")]
+
+    @pytest.mark.asyncio
+    async def test_first_chunks_are_inserted_before_the_last_is_structured(self):
+        import asyncio
+
+        steps = []
+
+        async def call_agent(runner, agent, session_id, query):
+            if query == "Chunk number 4 text.":
+                await asyncio.sleep(0.2)
+            steps.append(("structured", query))
+            return TestVectorizePdf._chunk_response(query)
+
+        def insert(client, table_name, rows, start_idx, size):
+            steps.append(("inserted", [row["content"] for row in rows]))
+
+        events = await self._store(AsyncMock(side_effect=call_agent), insert)
+
+        assert steps.index(("inserted", ["Chunk number 1 text.", "Chunk number 2 text."])) < steps.index(
+            ("structured", "Chunk number 4 text.")
+        )
+        assert steps[-1] == ("inserted", ["Chunk number 3 text.", "Chunk number 4 text."])
+        assert events[-1]["type"] == "success" and events[-1]["total_chunks"] == 4
+
+    @pytest.mark.asyncio
+    async def test_resumed_job_keeps_the_rows_it_inserted(self):
+        inserted = {}
+        fail = {"on": True}
+
+        def insert(client, table_name, rows, start_idx, size):
+            if fail["on"] and any(row["content"] == "Chunk number 3 text." for row in rows):
+                raise RuntimeError("connection lost")
+            inserted.update((row["id"], row["metadata"]["page_hashes"]) for row in rows)
+
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        with pytest.raises(RuntimeError, match="connection lost"):
+            await self._store(call_agent, insert)
+        assert call_agent.await_count == 4
+        first_ids = set(inserted)
+
+        fail["on"] = False
+        delete_rows = MagicMock()
+        events = await self._store(call_agent, insert, existing_rows=dict(inserted), delete_rows=delete_rows)
+
+        # Every chunk comes from the checkpoint, and only the failed batch is inserted.
+        assert call_agent.await_count == 4
+        assert len(inserted) == 4 and first_ids < set(inserted)
+        delete_rows.assert_not_called()
+        assert events[-1]["type"] == "success" and events[-1].get("chunks_reused") == 0
+
+    @pytest.mark.asyncio
+    async def test_held_back_page_is_chunked_when_its_row_is_dropped(self):
+        pages = self.PAGES[:3]
+        existing_rows = {
+            "spans-changed-page": [
+                pdf_chunker.page_content_hash(pages[0]),
+                pdf_chunker.page_content_hash({"text": "Old page 2."}),
+            ],
+        }
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(pages)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ):
+            events = [event async for event in vectorize_pdf(tmp.name, existing_rows=existing_rows)]
+
+        # Page 1 waits while the row might be kept, and pages stay in order once it is dropped.
+        assert [doc.metadata["page_numbers"] for doc in _documents(events)] == [[1], [2], [3]]
+        assert (events[-1]["reused_row_ids"], events[-1]["pages_reused"]) == ([], 0)
+
+    @pytest.mark.asyncio
+    async def test_rows_sharing_a_split_page_are_dropped_together(self):
+        pages = [
+            {"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 5)
+        ]
+        # Page 2 was split between two chunks, and the page after it has changed since.
+        existing_rows = {
+            "head": [pdf_chunker.page_content_hash(pages[0]), pdf_chunker.page_content_hash(pages[1])],
+            "tail": [
+                pdf_chunker.page_content_hash(pages[1]),
+                pdf_chunker.page_content_hash({"text": "Old page 3."}),
+            ],
+            "other": [pdf_chunker.page_content_hash(pages[3])],
+        }
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(pages)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ):
+            events = [event async for event in vectorize_pdf(tmp.name, existing_rows=existing_rows)]
+
+        # Keeping "head" would lose the part of page 2 that only "tail" held.
+        assert [doc.metadata["page_numbers"] for doc in _documents(events)] == [[1], [2], [3]]
+        assert (events[-1]["reused_row_ids"], events[-1]["pages_reused"]) == (["other"], 1)
+
+    @pytest.mark.asyncio
+    async def test_page_order_is_kept_after_partial_reuse(self):
+        pages = [
+            {"text": f"Chunk number {d} text.", "metadata": {"page_number": d}} for d in range(1, 5)
+        ]
+        existing_rows = {
+            "dropped": [
+                pdf_chunker.page_content_hash(pages[0]),
+                pdf_chunker.page_content_hash({"text": "Removed page."}),
+            ],
+            "kept": [pdf_chunker.page_content_hash(pages[2])],
+        }
+        call_agent = AsyncMock(
+            side_effect=lambda runner, agent, session_id, query: TestVectorizePdf._chunk_response(query)
+        )
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp, patch(
+            "src.rag_pipeline.vectorize_pdf.iter_pdf_pages_async", _page_batches(pages)
+        ), patch("src.rag_pipeline.vectorize_pdf.call_agent", call_agent), patch(
+            "src.rag_pipeline.vectorize_pdf.get_chunk_target_tokens", return_value=10
+        ):
+            events = [event async for event in vectorize_pdf(tmp.name, existing_rows=existing_rows)]
+
+        page_numbers = [doc.metadata["page_numbers"] for doc in _documents(events)]
+        assert page_numbers == [[1], [2], [4]]
+        assert (events[-1]["reused_row_ids"], events[-1]["pages_reused"]) == (["kept"], 1)